@@ -1,8 +1,10 @@
+import json
 import streamlit as st
 import requests
 import uuid
 
 API_URL = "http://192.168.43.86:8080/chat/chatDomain"  # Your actual backend endpoint
+STREAM_API_URL = "http://192.168.43.86:8080/chat/chatDomainStream"
 
 # Generate new room_id on load or after clear
 if "room_id" not in st.session_state:
@@ -31,11 +33,23 @@ if prompt := st.chat_input("Ask something..."):
         }
 
         try:
-            res = requests.post(API_URL, json=payload)
-            if res.status_code == 200:
-                response = res.json().get("response", "No response.")
-            else:
-                response = f"Error {res.status_code}: {res.text}"
+            response = ""
+            with requests.post(STREAM_API_URL, json=payload, stream=True) as res:
+                if res.status_code == 200:
+                    for line in res.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if "error" in event:
+                            response = f"Error: {event['error']}"
+                            break
+                        if event.get("done"):
+                            response = event.get("response") or "No response."
+                            break
+                        response += event.get("delta", "")
+                        placeholder.markdown(response)
+                else:
+                    response = f"Error {res.status_code}: {res.text}"
         except Exception as e:
             response = f"Request failed: {e}"
 
@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration for the multi-worker deployment.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The master loads the read-only models (joblib classifiers, fastText language
+identifier, tonemark model) before forking, then freezes the garbage collector
+so the workers share those pages copy-on-write. Each worker builds its own
+Mongo/Weaviate/LLM clients in the application lifespan, after the fork.
+"""
+
+import os
+from dotenv import load_dotenv
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+# Forked workers must not reuse the Rust thread pool of the HF tokenizers.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+GUNICORN_PRELOAD = convert_value(os.getenv("GUNICORN_PRELOAD", "true"))
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8080")
+workers = convert_value(os.getenv("WEB_CONCURRENCY", "2"))
+# Read by the per-worker caches that must expire entries other workers can change.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = convert_value(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = convert_value(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+preload_app = GUNICORN_PRELOAD
+
+
+def on_starting(server):
+    """
+    Load the shared models in the master process, before any worker is forked.
+    """
+    if not GUNICORN_PRELOAD:
+        return
+
+    from src.services.model_loader import model_loader
+
+    server.log.info("Loading the shared models in the master process")
+    model_loader.load()
+    model_loader.freeze()
+
+
+def child_exit(server, worker):
+    """
+    Drop the Prometheus samples of a dead worker in multiprocess mode.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
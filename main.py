@@ -2,6 +2,7 @@
 Run the code in this file
 """
 
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,14 +11,32 @@ from src.api.routers import chat_router
 from src.api.routers import file_router
 from src.api.routers import suggestion_router
 from src.api.routers import manually_file_router
+from src.api.routers import health_router
+from src.api.routers import metrics_router
+from src.services.tracing import TracingMiddleware
+from src.api.dependencies.dependency import init_service
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    Build the service, start its background tasks and drain them on shutdown.
+    """
+    service = init_service()
+    await service.start()
+    yield
+    await service.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # app.include_router(root_router)
 app.include_router(chat_router)
 app.include_router(file_router)
 app.include_router(suggestion_router)
 app.include_router(manually_file_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
 
 # CORS middleware
 app.add_middleware(
@@ -27,6 +46,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so a request is timed until its last byte is sent.
+app.add_middleware(TracingMiddleware)
 
 # Run the server
 if __name__ == "__main__":
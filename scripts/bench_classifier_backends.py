@@ -0,0 +1,160 @@
+"""
+Parity check and benchmark of the compact classifiers against the joblib ones.
+
+For each classifier, runs the joblib pipeline and its `.npz` export (written by
+`scripts.export_classifiers`) on the sample queries and the handbook lines,
+none of which the classifiers were fitted on, and checks that every text gets
+the same decision at the threshold the backend uses. Then loads each format in
+a fresh process and reports the load time, the resident memory of that process
+(VmRSS of `/proc/self/status`, imports included) and the latency of one
+`predict_proba` call:
+
+    python -m scripts.bench_classifier_backends
+
+The script exits with a non-zero status when a decision differs.
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import (
+    Dict,
+    List
+)
+
+import numpy as np
+
+from scripts.check_preprocess_parity import load_corpus
+
+# Column of `predict_proba` and threshold of each decision, as in the backend.
+DECISIONS = {
+    "domain_clf_model": (1, 0.6),
+    "prompt_injection_model": (0, 0.5),
+    "rag_classifier_model": (1, 0.5)
+}
+
+
+def read_rss() -> int:
+    """
+    Reads the resident memory of the current process, in KiB.
+    """
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+    return 0
+
+
+def load(model_format: str, path: str):
+    """
+    Loads a classifier in one format, importing only what that format needs.
+    """
+    if model_format == "compact":
+        from src.engines.classifier_engine import CompactClassifier, compact_path
+        return CompactClassifier.load(compact_path(path))
+
+    import joblib
+    from src.engines.classifier_engine import restore_idf
+    return restore_idf(joblib.load(path))
+
+
+def measure(model_format: str, path: str, repeat: int) -> Dict:
+    """
+    Loads a classifier and times its calls; run in a fresh process by `main`.
+    """
+    start = time.perf_counter()
+    model = load(model_format, path)
+    load_seconds = time.perf_counter() - start
+
+    texts = load_corpus(synthetic=0, seed=0)[:repeat]
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model.predict_proba([text])
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "load_seconds": load_seconds,
+        "rss_kib": read_rss(),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000)
+    }
+
+
+def measure_in_subprocess(model_format: str, path: str, repeat: int) -> Dict:
+    """
+    Runs `measure` in a new interpreter, so nothing is imported or cached yet.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "scripts.bench_classifier_backends",
+         "--child", model_format, path, "--repeat", str(repeat)],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def check_parity(name: str, path: str, texts: List[str]) -> int:
+    """
+    Compares the decisions of both formats of a classifier, returns the mismatches.
+    """
+    column, threshold = DECISIONS[name]
+    expected = load("joblib", path).predict_proba(texts)[:, column]
+    actual = load("compact", path).predict_proba(texts)[:, column]
+    mismatches = int(np.sum((expected >= threshold) != (actual >= threshold)))
+
+    print(f"{name}: {len(texts)} texts, {mismatches} different decisions, "
+          f"max probability difference {np.abs(expected - actual).max():.1e}")
+    for index in np.flatnonzero((expected >= threshold) != (actual >= threshold))[:10]:
+        print(f"  {texts[index]!r}: {expected[index]:.6f} vs {actual[index]:.6f}")
+
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=500,
+                        help="number of timed predict_proba calls")
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "PATH"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child, args.repeat)))
+        return
+
+    from src.services.model_loader import (
+        DOMAIN_CLF_MODEL,
+        PROMPT_INJECTION_MODEL,
+        RAG_CLASSIFIER_MODEL
+    )
+    paths = {
+        "domain_clf_model": DOMAIN_CLF_MODEL,
+        "prompt_injection_model": PROMPT_INJECTION_MODEL,
+        "rag_classifier_model": RAG_CLASSIFIER_MODEL
+    }
+    texts = load_corpus(synthetic=0, seed=0)
+
+    mismatches = sum(check_parity(name, path, texts) for name, path in paths.items())
+
+    print(f"{'':<24}{'format':<9}{'load':>9}{'rss':>11}{'p50':>10}{'p99':>10}")
+    for name, path in paths.items():
+        for model_format in ("joblib", "compact"):
+            result = measure_in_subprocess(model_format, path, args.repeat)
+            print(f"{name:<24}{model_format:<9}"
+                  f"{result['load_seconds'] * 1000:>7.0f}ms"
+                  f"{result['rss_kib'] / 1024:>8.1f}MiB"
+                  f"{result['p50_ms']:>8.3f}ms"
+                  f"{result['p99_ms']:>8.3f}ms")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
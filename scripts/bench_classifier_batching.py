@@ -0,0 +1,84 @@
+"""
+Preprocessing throughput with and without classifier micro-batching.
+
+Sends the sample queries through `PreprocessQuestion.preprocess_text` with
+`--concurrency` requests in flight, once with the classifiers called per
+request and once through the micro-batchers, checks that every query gets the
+same decision and reports throughput and latency percentiles:
+
+    python -m scripts.bench_classifier_batching --concurrency 64 --rounds 10
+"""
+
+import time
+import asyncio
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.engines.preprocess_engine import PreprocessQuestion
+from src.services.model_loader import model_loader
+
+SAMPLE_QUERIES = "scripts/data/sample_queries.txt"
+
+
+async def replay(preprocessor: PreprocessQuestion, queries: List[str], concurrency: int):
+    """
+    Preprocesses every query with `concurrency` requests in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(queries)
+
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await preprocessor.preprocess_text(queries[index])
+            latencies[index] = time.perf_counter() - start
+            return result
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(index) for index in range(len(queries))])
+
+    return results, latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10,
+                        help="passes over the sample queries")
+    args = parser.parse_args()
+
+    with open(SAMPLE_QUERIES, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()] * args.rounds
+    models = model_loader.load()
+
+    decisions = {}
+    for batching in (False, True):
+        preprocessor = PreprocessQuestion(
+            domain_clf_model=models.domain_clf_model,
+            lang_detect_model=models.lang_detector,
+            tonemark_model=None,
+            tonemark_tokenizer=None,
+            prompt_injection_model=models.prompt_injection_model,
+            device_type=models.device,
+            label_list=[],
+            batching=batching
+        )
+        results, latencies, elapsed = asyncio.run(
+            replay(preprocessor, queries, args.concurrency)
+        )
+        decisions[batching] = [result.model_dump(exclude={"stage_timings"}) for result in results]
+        label = "batched" if batching else "per request"
+        print(f"{label:<12} {len(queries) / elapsed:>8.0f} queries/s, "
+              f"p50 {np.percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p99 {np.percentile(latencies, 99) * 1000:.1f} ms")
+        if batching:
+            print(f"  domain batches: {preprocessor.domain_batcher.stats}")
+
+    mismatches = sum(a != b for a, b in zip(decisions[False], decisions[True]))
+    print(f"{mismatches} queries with a different decision")
+
+
+if __name__ == "__main__":
+    main()
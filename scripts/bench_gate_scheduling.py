@@ -0,0 +1,88 @@
+"""
+Preprocessing latency under the gate speculation policies.
+
+Sends the sample queries through `PreprocessQuestion.preprocess_text` with
+`--concurrency` requests in flight, once per policy of PREPROCESS_GATE_SPECULATION:
+"never" (the gates run one after the other), "always" (every gate starts at
+once) and "adaptive". Checks that every query gets the same decision and
+reports the latency percentiles and how many gate runs were wasted:
+
+    python -m scripts.bench_gate_scheduling --concurrency 16 --rounds 20
+"""
+
+import time
+import asyncio
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.engines.preprocess_engine import PreprocessQuestion
+from src.services.model_loader import model_loader
+
+SAMPLE_QUERIES = "scripts/data/sample_queries.txt"
+POLICIES = ("never", "always", "adaptive")
+
+
+async def replay(preprocessor: PreprocessQuestion, queries: List[str], concurrency: int):
+    """
+    Preprocesses every query with `concurrency` requests in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(queries)
+
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await preprocessor.preprocess_text(queries[index])
+            latencies[index] = time.perf_counter() - start
+            return result
+
+    results = await asyncio.gather(*[one(index) for index in range(len(queries))])
+
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=20,
+                        help="passes over the sample queries")
+    args = parser.parse_args()
+
+    with open(SAMPLE_QUERIES, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()] * args.rounds
+    models = model_loader.load()
+
+    decisions = {}
+    for policy in POLICIES:
+        preprocessor = PreprocessQuestion(
+            domain_clf_model=models.domain_clf_model,
+            lang_detect_model=models.lang_detector,
+            tonemark_model=None,
+            tonemark_tokenizer=None,
+            prompt_injection_model=models.prompt_injection_model,
+            device_type=models.device,
+            label_list=[],
+            gate_speculation=policy
+        )
+        results, latencies = asyncio.run(replay(preprocessor, queries, args.concurrency))
+        decisions[policy] = [result.model_dump(exclude={"stage_timings"}) for result in results]
+        stats = preprocessor.gate_scheduler.stats
+        wasted = sum(value for name, value in stats.items() if name.endswith("_wasted"))
+        print(f"{policy:<9} mean {np.mean(latencies) * 1000:.2f} ms, "
+              f"p50 {np.percentile(latencies, 50) * 1000:.2f} ms, "
+              f"p99 {np.percentile(latencies, 99) * 1000:.2f} ms, "
+              f"{wasted} wasted gate runs")
+        for gate in ("language", "prompt_injection", "domain"):
+            print(f"  {gate:<17} {stats[f'{gate}_cost_ms']:>7.3f} ms, "
+                  f"rejects {stats[f'{gate}_rejection_rate']:>6.1%}, "
+                  f"started early {stats[f'{gate}_speculative']}")
+
+    for policy in POLICIES[1:]:
+        mismatches = sum(a != b for a, b in zip(decisions[POLICIES[0]], decisions[policy]))
+        print(f"{policy}: {mismatches} queries with a different decision")
+
+
+if __name__ == "__main__":
+    main()
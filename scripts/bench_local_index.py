@@ -0,0 +1,97 @@
+"""
+Parity check and benchmark of the local index against Weaviate.
+
+Loads the knowledge base collection into a `LocalVectorIndex`, runs the sample
+queries through the Weaviate hybrid retriever and the local one with the same
+top k and alpha, and reports the overlap of their results and the latency of
+each (the query embeddings are computed once, beforehand, and not timed):
+
+    python -m scripts.bench_local_index --alpha 0.65 --top-k 10
+
+Needs the Weaviate instance of WEAVIATE_HOST/WEAVIATE_PORT and an OpenAI key.
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import weaviate
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.schema import QueryBundle
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.vector_stores.weaviate import WeaviateVectorStore
+
+from src.engines.retriever_engine import LocalHybridRetriever
+from src.storage.local_index import LocalVectorIndex
+from src.storage.weaviatedb import (
+    OPENAI_EMBED_MODEL,
+    WEAVIATE_HOST,
+    WEAVIATE_NAME,
+    WEAVIATE_PORT
+)
+
+SAMPLE_QUERIES = "scripts/data/sample_queries.txt"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--alpha", type=float, default=0.65)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=200,
+                        help="number of sample queries")
+    args = parser.parse_args()
+
+    Settings.embed_model = OpenAIEmbedding(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model=OPENAI_EMBED_MODEL
+    )
+    client = weaviate.connect_to_local(host=WEAVIATE_HOST, port=WEAVIATE_PORT)
+    try:
+        start = time.perf_counter()
+        local_index = LocalVectorIndex()
+        local_index.load_from_weaviate(client, WEAVIATE_NAME)
+        print(f"loaded {len(local_index)} nodes in {time.perf_counter() - start:.1f}s")
+
+        weaviate_retriever = VectorStoreIndex.from_vector_store(
+            vector_store=WeaviateVectorStore(weaviate_client=client, index_name=WEAVIATE_NAME)
+        ).as_retriever(
+            vector_store_query_mode="hybrid",
+            similarity_top_k=args.top_k,
+            alpha=args.alpha
+        )
+        local_retriever = LocalHybridRetriever(
+            local_index=local_index,
+            similarity_top_k=args.top_k,
+            alpha=args.alpha
+        )
+
+        with open(SAMPLE_QUERIES, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()][:args.limit]
+        embeddings = Settings.embed_model.get_text_embedding_batch(queries)
+
+        overlaps, top_matches = [], 0
+        latencies = {"weaviate": [], "local": []}
+        for query, embedding in zip(queries, embeddings):
+            results = {}
+            for name, retriever in (("weaviate", weaviate_retriever), ("local", local_retriever)):
+                bundle = QueryBundle(query_str=query, embedding=embedding)
+                start = time.perf_counter()
+                results[name] = [result.node.node_id for result in retriever.retrieve(bundle)]
+                latencies[name].append(time.perf_counter() - start)
+            expected, actual = results["weaviate"], results["local"]
+            if expected:
+                overlaps.append(len(set(expected) & set(actual)) / len(expected))
+                top_matches += bool(actual) and expected[0] == actual[0]
+    finally:
+        client.close()
+
+    print(f"{len(queries)} queries, overlap@{args.top_k} {np.mean(overlaps):.3f}, "
+          f"same first result {top_matches / max(len(overlaps), 1):.3f}")
+    for name, values in latencies.items():
+        print(f"{name:<9}p50 {np.percentile(values, 50) * 1000:8.3f}ms"
+              f"  p99 {np.percentile(values, 99) * 1000:8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Logging overhead benchmark on the event loop.
+
+Runs many concurrent coroutines that each log a record per simulated request,
+like the chat pipeline did with `print(processed_query)`, and measures the
+per-call latency seen by the coroutine in two modes:
+
+    print   a synchronous write to the process stream
+    queue   DSCLogger, which only enqueues the record for the listener thread
+
+Redirect stderr and stdout to a slow sink (a pipe, a file on a busy disk) to see
+the contention the background listener takes off the loop:
+
+    python -m scripts.bench_logging --tasks 200 --records 50 2>/dev/null >/tmp/out.txt
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.services.logger import (
+    DSCLogger,
+    pipeline
+)
+
+RECORD = {
+    "query": "điểm chuẩn ngành khoa học máy tính năm 2024",
+    "language": True,
+    "is_prompt_injection": False,
+    "is_outdomain": False,
+    "stage_timings": {"clean_text": 0.4, "language": 1.2, "domain": 2.3}
+}
+
+
+async def run_task(mode: str, log: DSCLogger, records: int, latencies: List[float]) -> None:
+    """
+    Logs `records` records, yielding to the loop between them.
+    """
+    for _ in range(records):
+        start = time.perf_counter()
+        if mode == "print":
+            print(RECORD, file=sys.stderr)
+        else:
+            log.info("Processed query", **RECORD)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+async def run_mode(mode: str, tasks: int, records: int) -> dict:
+    """
+    Runs every task concurrently in one mode and summarizes the latencies.
+    """
+    log = DSCLogger(file_name="bench_logging", file_log="bench")
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_task(mode, log, records, latencies) for _ in range(tasks)
+    ])
+    elapsed = time.perf_counter() - start
+    values = np.array(latencies) * 1e6
+
+    return {
+        "mode": mode,
+        "calls": len(latencies),
+        "p50_us": float(np.percentile(values, 50)),
+        "p99_us": float(np.percentile(values, 99)),
+        "elapsed_s": elapsed
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Runs both modes and prints a summary table on stdout.
+    """
+    results = []
+    for mode in ("print", "queue"):
+        results.append(await run_mode(mode, args.tasks, args.records))
+    pipeline.stop()
+
+    for result in results:
+        print(
+            f"{result['mode']:>6}: {result['calls']} calls, "
+            f"p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us, "
+            f"loop busy {result['elapsed_s']:.2f} s"
+        )
+    print(f"records dropped by the queue: {pipeline.dropped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--records", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
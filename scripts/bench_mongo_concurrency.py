@@ -0,0 +1,142 @@
+"""
+Concurrency benchmark for the chat storage path.
+
+Simulates many chat rooms hitting Mongo at the same time, each turn doing what
+`/chat/chatDomain` does against storage: read the last five chats of the room,
+then insert the new record. Two modes are compared:
+
+    blocking  pymongo called directly on the event loop (the previous behaviour)
+    executor  the thread-pool backed async methods of CRUDDocuments
+
+Usage (from the repository root, with MONGODB_URL / MONGODB_NAME set):
+
+    python -m scripts.bench_mongo_concurrency --rooms 100 --turns 20
+"""
+
+import time
+import asyncio
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.storage.mongodb import CRUDDocuments
+from src.utils.utility import (
+    create_new_id,
+    get_datetime
+)
+
+
+class CRUDBenchCollection(CRUDDocuments):
+    """
+    A throwaway collection used only by this benchmark.
+    """
+
+    def __init__(self):
+        CRUDDocuments.__init__(self)
+        self.collection = CRUDDocuments.connection.db.bench_chat_collection
+
+
+def make_record(room_id: str, turn: int) -> dict:
+    """
+    Builds a chat record shaped like the ones written by ChatRepository.
+    """
+    return {
+        "Id": create_new_id(prefix="chatdomain"),
+        "room_id": room_id,
+        "query": f"điểm chuẩn ngành khoa học máy tính năm 2024 {turn}",
+        "answer": "Điểm chuẩn ngành Khoa học Máy tính năm 2024 là 27.3 điểm." * 4,
+        "retrieved_nodes": [],
+        "time": get_datetime(),
+        "is_outdomain": False
+    }
+
+
+async def blocking_turn(crud: CRUDBenchCollection, room_id: str, turn: int) -> None:
+    """
+    One chat turn calling pymongo on the event loop thread.
+    """
+    cursor = crud.collection.find(filter={"room_id": room_id})
+    list(cursor.sort("time", -1).limit(5))
+    crud.insert_one_doc(make_record(room_id, turn))
+
+
+async def executor_turn(crud: CRUDBenchCollection, room_id: str, turn: int) -> None:
+    """
+    One chat turn through the async storage layer.
+    """
+    await crud.find_with_filter(
+        filter_obj={"room_id": room_id},
+        sort_by=("time", -1),
+        limit=5
+    )
+    await crud.ainsert_one_doc(make_record(room_id, turn))
+
+
+async def run_room(
+    crud: CRUDBenchCollection,
+    mode: str,
+    room_id: str,
+    turns: int,
+    latencies: List[float]
+) -> None:
+    """
+    Runs the turns of a single room sequentially, recording per-turn latency.
+    """
+    turn_fn = blocking_turn if mode == "blocking" else executor_turn
+
+    for turn in range(turns):
+        start = time.perf_counter()
+        # The request is queued on the loop like an incoming HTTP request would be,
+        # so time spent waiting behind other rooms counts towards its latency.
+        await asyncio.sleep(0)
+        await turn_fn(crud, room_id, turn)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_mode(crud: CRUDBenchCollection, mode: str, rooms: int, turns: int) -> dict:
+    """
+    Runs all rooms concurrently in one mode and summarizes the latencies.
+    """
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_room(crud, mode, f"bench-{mode}-{idx}", turns, latencies)
+        for idx in range(rooms)
+    ])
+    elapsed = time.perf_counter() - start
+    values = np.array(latencies) * 1000
+
+    return {
+        "mode": mode,
+        "turns": len(latencies),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "throughput": len(latencies) / elapsed
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark in both modes and prints a summary table.
+    """
+    crud = CRUDBenchCollection()
+    crud.collection.create_index([("room_id", 1), ("time", -1)])
+
+    try:
+        for mode in ("blocking", "executor"):
+            result = await run_mode(crud, mode, args.rooms, args.turns)
+            print(
+                f"{result['mode']:>9}: {result['turns']} turns, "
+                f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"{result['throughput']:.0f} turns/s"
+            )
+    finally:
+        crud.collection.drop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
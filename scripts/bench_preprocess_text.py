@@ -0,0 +1,83 @@
+"""
+Microbenchmark of the text preprocessing steps on typical query lengths.
+
+Takes the sample queries and the handbook lines between 20 and 200 characters,
+groups them by length and reports the mean per-call cost of the original and
+the precompiled version of each step:
+
+    python -m scripts.bench_preprocess_text
+    python -m scripts.bench_preprocess_text --repeat 50
+"""
+
+import time
+import argparse
+from typing import (
+    Callable,
+    Dict,
+    List
+)
+
+from src.prompt.preprocessing_prompt import (
+    FILLTER_WORDS,
+    TERMS_DICT
+)
+from src.utils.text_patterns import (
+    FillerWordRemover,
+    SynonymMatcher
+)
+from scripts.check_preprocess_parity import (
+    legacy_remove_filler_words,
+    legacy_replace_synonyms,
+    load_corpus
+)
+
+BUCKETS = [(20, 50), (50, 100), (100, 200)]
+
+
+def per_call(function: Callable, texts: List[str], repeat: int) -> float:
+    """
+    Returns the mean cost of one call, in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            function(text)
+
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="passes over the texts of each bucket")
+    args = parser.parse_args()
+
+    corpus = load_corpus(synthetic=0, seed=0)
+    synonym_matcher = SynonymMatcher(TERMS_DICT)
+    filler_remover = FillerWordRemover(FILLTER_WORDS)
+    steps: Dict[str, tuple] = {
+        "remove_filler_words": (
+            lambda text: legacy_remove_filler_words(text, FILLTER_WORDS),
+            lambda text: " ".join(filler_remover.remove(text.lower()).split())
+        ),
+        "replace_synonyms": (
+            lambda text: legacy_replace_synonyms(text, TERMS_DICT),
+            lambda text: synonym_matcher.replace(text.lower())
+        )
+    }
+
+    print(f"{'step':<22}{'chars':>10}{'texts':>8}{'legacy us':>12}{'compiled us':>13}{'speedup':>9}")
+    for name, (legacy, compiled) in steps.items():
+        for low, high in BUCKETS:
+            texts = [text for text in corpus if low <= len(text) < high]
+            if not texts:
+                continue
+            legacy_cost = per_call(legacy, texts, args.repeat)
+            compiled_cost = per_call(compiled, texts, args.repeat)
+            print(f"{name:<22}{f'{low}-{high}':>10}{len(texts):>8}"
+                  f"{legacy_cost:>12.1f}{compiled_cost:>13.1f}"
+                  f"{legacy_cost / compiled_cost:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
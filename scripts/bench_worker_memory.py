@@ -0,0 +1,248 @@
+"""
+Memory-per-worker benchmark for the gunicorn deployment.
+
+Starts `gunicorn main:app -c gunicorn.conf.py` with a given number of workers,
+once with the models preloaded in the master (GUNICORN_PRELOAD=true) and once
+with every worker loading its own copy (GUNICORN_PRELOAD=false), waits until
+the workers serve requests, then reads /proc/<pid>/smaps_rollup of the master
+and of each worker. Linux only.
+
+    Rss      resident memory of the process, shared pages included
+    Pss      shared pages divided by the number of processes mapping them,
+             so the sum over processes is the real footprint
+    Shared   pages also mapped by another process (the copy-on-write models)
+    Private  pages only this process holds
+
+Usage (from the repository root, with the .env of the backend in place):
+
+    python -m scripts.bench_worker_memory --workers 4
+
+With --classifiers-only, no server is started: the script forks the workers
+itself, loading the joblib classifiers in the parent before the fork or in each
+worker after it, with the same `joblib.load(mmap_mode=...)` call as
+`ModelLoader`. It needs neither the backend services nor the other models:
+
+    python -m scripts.bench_worker_memory --classifiers-only --workers 4 --mmap-mode none
+"""
+
+import os
+import sys
+import time
+import signal
+import glob
+import argparse
+import subprocess
+from typing import (
+    Dict,
+    List
+)
+
+import joblib
+import requests
+
+FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private"
+}
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """
+    Reads the memory counters of a process, in KiB.
+    """
+    memory = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in FIELDS:
+                memory[FIELDS[name]] += int(value.split()[0])
+
+    return memory
+
+
+def children_of(pid: int) -> List[int]:
+    """
+    Lists the direct children of a process, i.e. the gunicorn workers.
+    """
+    with open(f"/proc/{pid}/task/{pid}/children", encoding="utf-8") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_ready(url: str, master: subprocess.Popen, workers: int, timeout: float) -> None:
+    """
+    Waits until every worker is forked and the app answers HTTP requests.
+    """
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {master.returncode}")
+        try:
+            if (len(children_of(master.pid)) >= workers
+                    and requests.get(url, timeout=2).ok):
+                return
+        except (requests.RequestException, FileNotFoundError):
+            pass
+        time.sleep(1)
+
+    raise TimeoutError(f"gunicorn was not ready after {timeout:.0f}s")
+
+
+def run_mode(args: argparse.Namespace, preload: bool) -> Dict:
+    """
+    Launches gunicorn in one mode and measures the master and its workers.
+    """
+    env = {
+        **os.environ,
+        "GUNICORN_PRELOAD": "true" if preload else "false",
+        "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+        "WEB_CONCURRENCY": str(args.workers)
+    }
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+        env=env
+    )
+
+    try:
+        wait_until_ready(
+            f"http://127.0.0.1:{args.port}/openapi.json",
+            master,
+            args.workers,
+            args.timeout
+        )
+        # Let the workers settle (lazy imports, first GC passes) before measuring.
+        time.sleep(args.settle)
+        workers = [read_memory(pid) for pid in children_of(master.pid)]
+        master_memory = read_memory(master.pid)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+    return {
+        "mode": "preload" if preload else "per-worker",
+        "master": master_memory,
+        "workers": workers,
+        "total_pss": master_memory["pss"] + sum(w["pss"] for w in workers)
+    }
+
+
+def load_classifiers(paths: List[str], mmap_mode: str) -> None:
+    """
+    Loads the classifiers and runs one prediction, touching the pages a request touches.
+    """
+    for path in paths:
+        joblib.load(filename=path, mmap_mode=None if mmap_mode == "none" else mmap_mode) \
+            .predict(["Học phí ngành khoa học máy tính là bao nhiêu?"])
+
+
+def run_classifiers_mode(args: argparse.Namespace, preload: bool) -> Dict:
+    """
+    Forks the workers around the loading of the classifiers and measures them.
+    """
+    paths = args.classifiers or sorted(glob.glob("AIModel/*.joblib"))
+    if preload:
+        load_classifiers(paths, args.mmap_mode)
+
+    workers = []
+    for _ in range(args.workers):
+        ready, notify = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready)
+            if not preload:
+                load_classifiers(paths, args.mmap_mode)
+            os.write(notify, b"1")
+            signal.pause()
+            os._exit(0)
+        os.close(notify)
+        os.read(ready, 1)
+        os.close(ready)
+        workers.append(pid)
+
+    try:
+        memory = [read_memory(pid) for pid in workers]
+        master_memory = read_memory(os.getpid())
+    finally:
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+    return {
+        "mode": "preload" if preload else "per-worker",
+        "master": master_memory,
+        "workers": memory,
+        "total_pss": master_memory["pss"] + sum(w["pss"] for w in memory)
+    }
+
+
+def mib(kib: float) -> str:
+    """
+    Formats KiB as MiB.
+    """
+    return f"{kib / 1024:8.1f}"
+
+
+def run_in_child(function, args: argparse.Namespace, preload: bool) -> Dict:
+    """
+    Runs a measurement in a forked process and returns its result.
+    """
+    ready, notify = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(ready)
+        os.write(notify, repr(function(args, preload)).encode())
+        os._exit(0)
+
+    os.close(notify)
+    with os.fdopen(ready) as f:
+        result = f.read()
+    os.waitpid(pid, 0)
+
+    return eval(result)
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Runs both modes and prints the per-worker averages.
+    """
+    print(f"{'mode':>10} {'workers':>7} {'Rss/w':>8} {'Pss/w':>8} "
+          f"{'Shared/w':>8} {'Priv/w':>8} {'master':>8} {'total':>8}   (MiB)")
+
+    for preload in (False, True):
+        if args.classifiers_only:
+            # A fresh parent per mode, so the first run does not leave the models loaded.
+            result = run_in_child(run_classifiers_mode, args, preload)
+        else:
+            result = run_mode(args, preload)
+        workers = result["workers"]
+        count = len(workers)
+        average = {
+            key: sum(w[key] for w in workers) / count
+            for key in ("rss", "pss", "shared", "private")
+        }
+        print(
+            f"{result['mode']:>10} {count:>7} {mib(average['rss'])} "
+            f"{mib(average['pss'])} {mib(average['shared'])} "
+            f"{mib(average['private'])} {mib(result['master']['pss'])} "
+            f"{mib(result['total_pss'])}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--settle", type=float, default=10)
+    parser.add_argument("--classifiers-only", action="store_true",
+                        help="fork the workers here around the joblib classifiers only")
+    parser.add_argument("--classifiers", nargs="*",
+                        help="joblib files, the AIModel/*.joblib files by default")
+    parser.add_argument("--mmap-mode", default=os.getenv("MODEL_MMAP_MODE", "r"),
+                        help="joblib memory-map mode of the classifiers, or none")
+    main(parser.parse_args())
@@ -0,0 +1,337 @@
+"""
+Parity check of the optimized text preprocessing against the original code.
+
+The original implementations are kept below, verbatim, as the reference. Every
+step is run on a corpus of real queries (`scripts/data/sample_queries.txt`), on
+the lines of the admission handbooks in the repository root, and on synthetic
+queries embedding the dictionary entries, and the outputs must be byte-identical:
+
+    python -m scripts.check_preprocess_parity
+    python -m scripts.check_preprocess_parity --synthetic 20000 --bench
+
+The script exits with a non-zero status on the first mismatching step.
+"""
+
+import re
+import sys
+import glob
+import time
+import random
+import argparse
+from difflib import SequenceMatcher
+from typing import (
+    Callable,
+    Dict,
+    List
+)
+
+from src.prompt.preprocessing_prompt import (
+    FILLTER_WORDS,
+    TERMS_DICT,
+    SHORT_CHAT,
+    RESPONSE_DICT
+)
+from src.utils.text_patterns import (
+    EMOJI_PATTERN,
+    NON_VIETNAMESE_PATTERN,
+    SYMBOL_REPLACEMENTS,
+    FillerWordRemover,
+    ShortChatMatcher,
+    SynonymMatcher
+)
+
+SAMPLE_QUERIES = "scripts/data/sample_queries.txt"
+HANDBOOKS = "Cam*nang*.md"
+TEMPLATES = [
+    "{}",
+    "cho em hỏi {} là gì ạ",
+    "điểm chuẩn {} năm 2024",
+    "{} và {} khác nhau thế nào?",
+    "học phí ({}) bao nhiêu, {} có học bổng không",
+    "{}-{} {}"
+]
+SEPARATORS = [" ", " ", " ", "  ", ", ", ",", ".", "-", "?", "\n", ""]
+# Emojis, symbols and brackets mixed into the synthetic queries.
+NOISE = ["😀", "🤔", "👍🏻", "✅", "❤️", "🎓", ":)", ">", "<=", "$", "#", "^", "/", "!",
+         "[", "]", " ]", "@ ]", "(x)", "\t", "…", "“", "&"]
+
+
+def legacy_replace_synonyms(text, synonym_dict):
+    """
+    The original `PreprocessQuestion.replace_synonyms`.
+    """
+    text = text.lower()
+
+    for keyword, synonyms in synonym_dict.items():
+        keyword = keyword.lower()
+        for synonym in synonyms:
+            synonym = synonym.strip().lower()
+            text = re.sub(r'\b{}\b'.format(
+                re.escape(synonym)), keyword, text)
+
+    return text
+
+
+def legacy_remove_filler_words(text, filler_words):
+    """
+    The original `PreprocessQuestion.remove_filler_words`.
+    """
+    text = text.lower()
+
+    for word in filler_words:
+        pattern = r'\b{}\b'.format(
+            re.escape(word.strip().lower())
+        )
+        text = re.sub(pattern, '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    return text
+
+
+def legacy_remove_emojis(text):
+    """
+    The original `PreprocessQuestion.remove_emojis`.
+    """
+    emoji_pattern = re.compile(
+        "["
+        u"\U0001F600-\U0001F64F"
+        u"\U0001F300-\U0001F5FF"
+        u"\U0001F680-\U0001F6FF"
+        u"\U0001F700-\U0001F77F"
+        u"\U0001F780-\U0001F7FF"
+        u"\U0001F800-\U0001F8FF"
+        u"\U0001F900-\U0001F9FF"
+        u"\U0001FA00-\U0001FA6F"
+        u"\U0001FA70-\U0001FAFF"
+        u"\U00002702-\U000027B0"
+        u"\U000024C2-\U0001F251"
+        "]+",
+        flags=re.UNICODE
+    )
+    return emoji_pattern.sub(r'', text)
+
+
+def legacy_delete_non_vietnamese_characters(text):
+    """
+    The original `PreprocessQuestion.delete_non_vietnamese_characters`.
+    """
+    pattern = r"[0-9a-zA-ZaăâbcdđeêghiklmnoôơpqrstuưvxyàằầbcdđèềghìklmnòồờpqrstùừvxỳáắấbcdđéếghíklmnóốớpqrstúứvxýảẳẩbcdđẻểghỉklmnỏổởpqrstủửvxỷạặậbcdđẹệghịklmnọộợpqrstụựvxỵãẵẫbcdđẽễghĩklmnõỗỡpqrstũữvxỹAĂÂBCDĐEÊGHIKLMNOÔƠPQRSTUƯVXYÀẰẦBCDĐÈỀGHÌKLMNÒỒỜPQRSTÙỪVXỲÁẮẤBCDĐÉẾGHÍKLMNÓỐỚPQRSTÚỨVXÝẠẶẬBCDĐẸỆGHỊKLMNỌỘỢPQRSTỤỰVXỴẢẲẨBCDĐẺỂGHỈKLMNỎỔỞPQRSTỦỬVXỶÃẴẪBCDĐẼỄGHĨKLMNÕỖỠPQRSTŨỮVXỸ,._]"
+
+    return re.sub(rf'[^{pattern}\s]', '', text).strip()
+
+
+def legacy_replace_symbols(text):
+    """
+    The original `PreprocessQuestion.replace_symbols`.
+    """
+    replacements = {
+        ">": " lớn hơn ",
+        "<": " bé hơn ",
+        "=": " bằng ",
+        "$": " ",
+        "#": " ",
+        "^": " ",
+        "/": " ",
+        "!": " "
+    }
+
+    for symbol, replacement in replacements.items():
+        text = text.replace(symbol, replacement)
+
+    return " ".join(text.split())
+
+
+def delete_non_vietnamese_characters(text):
+    """
+    `PreprocessQuestion.delete_non_vietnamese_characters`, without the engine imports.
+    """
+    if "]" not in text:
+        return text.strip()
+
+    return NON_VIETNAMESE_PATTERN.sub('', text).strip()
+
+
+def replace_symbols(text):
+    """
+    `PreprocessQuestion.replace_symbols`, without the engine imports.
+    """
+    for symbol, replacement in SYMBOL_REPLACEMENTS:
+        text = text.replace(symbol, replacement)
+
+    return " ".join(text.split())
+
+
+def legacy_short_chat(text):
+    """
+    The original `detect_short_chat`, followed by `get_response` when it matched.
+    """
+    normalized_text = text.lower().strip()
+    if not any(SequenceMatcher(None, normalized_text, pattern).ratio() >= 0.85
+               for pattern in SHORT_CHAT):
+        return None
+
+    best_match = None
+    best_ratio = 0.0
+    for chat in SHORT_CHAT:
+        ratio = SequenceMatcher(None, normalized_text, chat).ratio()
+        if ratio > best_ratio and ratio >= 0.9:
+            best_ratio = ratio
+            best_match = chat
+
+    if best_match and best_match in RESPONSE_DICT:
+        return RESPONSE_DICT[best_match]
+
+    return "Mình chưa hiểu rõ ý bạn lắm."
+
+
+def short_chat(matcher, text):
+    """
+    `PreprocessQuestion.detect_short_chat`, without the engine imports.
+    """
+    best_match, best_ratio = matcher.match(text.lower().strip(), threshold=0.85)
+    if best_match is None:
+        return None
+
+    if best_ratio >= 0.9 and best_match in RESPONSE_DICT:
+        return RESPONSE_DICT[best_match]
+
+    return "Mình chưa hiểu rõ ý bạn lắm."
+
+
+def typo(text, rng):
+    """
+    Drops, doubles or swaps a character of a text.
+    """
+    if not text:
+        return text
+    position = rng.randrange(len(text))
+    edit = rng.randrange(3)
+    if edit == 0:
+        return text[:position] + text[position + 1:]
+    if edit == 1:
+        return text[:position] + text[position] + text[position:]
+    return text[:position] + rng.choice("aeiouđơư ") + text[position + 1:]
+
+
+def load_corpus(synthetic: int, seed: int) -> List[str]:
+    """
+    Returns the sample queries, the handbook lines and synthetic queries.
+    """
+    with open(SAMPLE_QUERIES, encoding="utf-8") as f:
+        corpus = [line.rstrip("\n") for line in f if line.strip()]
+
+    for path in sorted(glob.glob(HANDBOOKS)):
+        with open(path, encoding="utf-8") as f:
+            corpus.extend(line.rstrip("\n") for line in f if line.strip())
+
+    terms = [keyword for keyword in TERMS_DICT]
+    terms += [synonym for synonyms in TERMS_DICT.values() for synonym in synonyms]
+    terms += FILLTER_WORDS
+    rng = random.Random(seed)
+    for _ in range(synthetic):
+        template = rng.choice(TEMPLATES)
+        words = [rng.choice(terms) for _ in range(template.count("{}"))]
+        query = template.format(*words)
+        if rng.random() < 0.3:
+            position = rng.randint(0, len(query))
+            query = query[:position] + rng.choice(NOISE) + query[position:]
+        if rng.random() < 0.3:
+            query = query.upper()
+        corpus.append(query)
+
+    # Runs of filler words with mixed separators, where removing one word
+    # changes what the next one can match.
+    for _ in range(synthetic):
+        words = [rng.choice(FILLTER_WORDS + terms[:20]) for _ in range(rng.randint(1, 6))]
+        query = ""
+        for word in words:
+            query += word + rng.choice(SEPARATORS)
+        corpus.append(query)
+
+    # Short chats with a few typos, around the similarity thresholds.
+    for _ in range(synthetic):
+        query = rng.choice(SHORT_CHAT)
+        for _ in range(rng.randint(0, 3)):
+            query = typo(query, rng)
+        corpus.append(query)
+
+    return corpus
+
+
+def check(name: str, legacy: Callable, optimized: Callable, corpus: List[str], bench: bool) -> bool:
+    """
+    Compares a step on every text of the corpus, optionally timing both versions.
+    """
+    for text in corpus:
+        expected = legacy(text)
+        actual = optimized(text)
+        if actual != expected:
+            print(f"{name}: MISMATCH")
+            print(f"  input:     {text!r}")
+            print(f"  legacy:    {expected!r}")
+            print(f"  optimized: {actual!r}")
+            return False
+
+    line = f"{name}: {len(corpus)} texts identical"
+    if bench:
+        timings = {}
+        for label, function in (("legacy", legacy), ("optimized", optimized)):
+            start = time.perf_counter()
+            for text in corpus:
+                function(text)
+            timings[label] = (time.perf_counter() - start) / len(corpus) * 1e6
+        line += (f", legacy {timings['legacy']:.1f} us/text,"
+                 f" optimized {timings['optimized']:.1f} us/text,"
+                 f" x{timings['legacy'] / timings['optimized']:.1f}")
+    print(line)
+
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--synthetic", type=int, default=5000,
+                        help="number of synthetic queries added to the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench", action="store_true",
+                        help="also time the legacy and optimized versions")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.synthetic, args.seed)
+    synonym_matcher = SynonymMatcher(TERMS_DICT)
+    filler_remover = FillerWordRemover(FILLTER_WORDS)
+    short_chat_matcher = ShortChatMatcher(SHORT_CHAT)
+    steps: Dict[str, tuple] = {
+        "replace_synonyms": (
+            lambda text: legacy_replace_synonyms(text, TERMS_DICT),
+            lambda text: synonym_matcher.replace(text.lower())
+        ),
+        "remove_filler_words": (
+            lambda text: legacy_remove_filler_words(text, FILLTER_WORDS),
+            lambda text: " ".join(filler_remover.remove(text.lower()).split())
+        ),
+        "remove_emojis": (
+            legacy_remove_emojis,
+            lambda text: EMOJI_PATTERN.sub(r'', text)
+        ),
+        "delete_non_vietnamese_characters": (
+            legacy_delete_non_vietnamese_characters,
+            delete_non_vietnamese_characters
+        ),
+        "replace_symbols": (
+            legacy_replace_symbols,
+            replace_symbols
+        ),
+        "short_chat": (
+            legacy_short_chat,
+            lambda text: short_chat(short_chat_matcher, text)
+        )
+    }
+
+    for name, (legacy, optimized) in steps.items():
+        if not check(name, legacy, optimized, corpus, args.bench):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
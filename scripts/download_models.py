@@ -0,0 +1,31 @@
+"""
+Fills the local model cache so that the backend starts without network access.
+
+Downloads the fastText language identifier, the tonemark model and, when
+RERANK_MODEL is set, the reranking cross-encoder into MODEL_CACHE_DIR (default
+AIModel/hf_cache) and checks that the joblib classifiers load. Run it once
+after cloning, or while building the image, then start the backend with
+MODEL_OFFLINE=true.
+
+    python -m scripts.download_models
+"""
+
+from src.services.model_loader import (
+    MODEL_CACHE_DIR,
+    ModelLoader
+)
+
+
+def main() -> None:
+    """
+    Loads every model, downloading what is missing, and prints the timings.
+    """
+    loader = ModelLoader(offline=False).preload_all()
+
+    print(f"Models cached in {MODEL_CACHE_DIR}")
+    for name, seconds in loader.timings.items():
+        print(f"{name:>24}: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Evaluates a language identifier and the Vietnamese fast path against the current model.
+
+Cleans the logged queries like the backend does before the language gate, then
+compares the "is Vietnamese" decision of the Hugging Face model (the reference)
+with those of the `--candidate` model (e.g. the `.ftz` written by
+`scripts.quantize_lang_detector`) and of both models behind the fast path of
+`PreprocessQuestion.is_vietnamese`, for each `--ratio`. Reports the agreement,
+the queries accepted or rejected by mistake, the share of queries the fast path
+answers and the time per query. Each model is then loaded in a fresh process to
+report its load time and resident memory:
+
+    python -m scripts.eval_lang_detector --input logs/queries.jsonl --candidate AIModel/lid218e.ftz
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import (
+    Callable,
+    Dict,
+    List
+)
+
+from src.engines.preprocess_engine import PreprocessQuestion
+from src.prompt.preprocessing_prompt import TERMS_DICT
+from src.services.model_loader import ModelLoader
+from src.utils.text_patterns import vietnamese_word_ratio
+from scripts.replay_preprocess import read_queries
+
+
+def read_rss() -> int:
+    """
+    Reads the resident memory of the current process, in KiB.
+    """
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+    return 0
+
+
+def measure_in_subprocess(path: str) -> Dict:
+    """
+    Loads a fastText model in a new interpreter and reports its cost.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "scripts.eval_lang_detector", "--child", path],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def child(path: str) -> None:
+    """
+    Loads a fastText model and prints the load time and the process RSS.
+    """
+    import fasttext
+
+    start = time.perf_counter()
+    fasttext.load_model(path)
+    print(json.dumps({
+        "load_seconds": time.perf_counter() - start,
+        "rss_kib": read_rss()
+    }))
+
+
+def detector(model) -> Callable[[str], bool]:
+    """
+    The "is Vietnamese" decision of a model alone.
+    """
+    def is_vietnamese(text: str) -> bool:
+        labels, scores = model.predict(text)
+        return PreprocessQuestion._most_likely_language(labels, scores)[0] == "vie_Latn"
+
+    return is_vietnamese
+
+
+def with_fast_path(is_vietnamese: Callable[[str], bool], ratio: float) -> Callable[[str], bool]:
+    """
+    The decision of a model behind the Vietnamese fast path.
+    """
+    def decide(text: str) -> bool:
+        return vietnamese_word_ratio(text) >= ratio or is_vietnamese(text)
+
+    return decide
+
+
+def evaluate(name: str, decide: Callable[[str], bool], texts: List[str], expected: List[bool]) -> None:
+    """
+    Prints how the decisions of `decide` compare to the reference.
+    """
+    start = time.perf_counter()
+    decisions = [decide(text) for text in texts]
+    elapsed = time.perf_counter() - start
+
+    false_accepts = sum(d and not e for d, e in zip(decisions, expected))
+    false_rejects = sum(e and not d for d, e in zip(decisions, expected))
+    agreement = 1 - (false_accepts + false_rejects) / len(texts)
+    print(f"{name:<32}{agreement:>9.3%}{false_accepts:>8}{false_rejects:>8}"
+          f"{elapsed / len(texts) * 1e6:>10.1f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", default="scripts/data/sample_queries.txt",
+                        help="JSON lines or plain text file of queries")
+    parser.add_argument("--field", default="query",
+                        help="field holding the query in JSON lines")
+    parser.add_argument("--limit", type=int, default=0,
+                        help="number of queries evaluated, 0 for all")
+    parser.add_argument("--candidate", help="fastText model compared to the reference")
+    parser.add_argument("--ratio", type=float, nargs="+", default=[0.3],
+                        help="fast path thresholds evaluated")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    import fasttext
+
+    preprocessor = PreprocessQuestion(None, None, None, None, None, "cpu", [])
+    texts = [
+        text for text in (
+            preprocessor.clean_text(query, TERMS_DICT)
+            for query in read_queries(args.input, args.field, args.limit)
+        ) if text
+    ]
+
+    reference_path = ModelLoader(lang_detect_path=None).lang_detector_path()
+    reference = detector(fasttext.load_model(reference_path))
+    expected = [reference(text) for text in texts]
+    print(f"{len(texts)} queries, {sum(expected) / len(texts):.1%} Vietnamese for the reference")
+
+    deciders = {"reference": reference}
+    paths = {"reference": reference_path}
+    if args.candidate:
+        deciders["candidate"] = detector(fasttext.load_model(args.candidate))
+        paths["candidate"] = args.candidate
+    for ratio in args.ratio:
+        covered = sum(vietnamese_word_ratio(text) >= ratio for text in texts)
+        print(f"fast path at {ratio}: {covered / len(texts):.1%} of the queries")
+        for name in list(deciders):
+            if name in paths:
+                deciders[f"{name} + fast path {ratio}"] = with_fast_path(deciders[name], ratio)
+
+    print(f"{'':<32}{'agreement':>9}{'+vie':>8}{'-vie':>8}{'per query':>13}")
+    for name, decide in deciders.items():
+        evaluate(name, decide, texts, expected)
+
+    for name, path in paths.items():
+        result = measure_in_subprocess(path)
+        print(f"{name}: loads in {result['load_seconds']:.2f}s, "
+              f"RSS {result['rss_kib'] / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Offline evaluation of the rerankers on labelled queries.
+
+Each line of the input is a JSON object with a query and the nodes that answer
+it, given by node ID or by a passage of their text:
+
+    {"query": "Học phí thạc sĩ là bao nhiêu?", "relevant": ["học phí", "a1b2-..."]}
+
+For every query, the hybrid retriever of `HybridRetriever` (Weaviate, or the
+local index with --local) returns its candidates once, then each reranker
+orders them. The script reports, per reranker, the recall at 1, 3, 5 and 10
+(the share of the relevant nodes found in the first k), the tokens of the
+context built from the kept nodes, and the latency of retrieval plus reranking:
+
+    python -m scripts.eval_reranker --input labelled.jsonl --budget-ms 150
+
+The cross-encoder is evaluated when RERANK_MODEL is set.
+"""
+
+import os
+import json
+import time
+import argparse
+from typing import (
+    Dict,
+    List
+)
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.schema import (
+    NodeWithScore,
+    QueryBundle
+)
+from llama_index.embeddings.openai import OpenAIEmbedding
+
+from src.engines.embedding_engine import CachedEmbedding
+from src.engines.rerank_engine import (
+    RERANK_TOP_N,
+    build_reranker
+)
+from src.engines.retriever_engine import build_hybrid_retriever
+from src.services.model_loader import (
+    RERANK_MODEL,
+    ModelLoader
+)
+from src.storage.weaviatedb import (
+    OPENAI_EMBED_MODEL,
+    WeaviateDB
+)
+from src.utils.token_budget import node_token_count
+
+CUTOFFS = (1, 3, 5, 10)
+
+
+def is_relevant(node: NodeWithScore, relevant: List[str]) -> bool:
+    """
+    Whether a node is one of the labelled ones, by ID or by a passage of its text.
+    """
+    return any(label == node.node.node_id or label in node.node.text for label in relevant)
+
+
+def recall(nodes: List[NodeWithScore], relevant: List[str], cutoff: int) -> float:
+    """
+    Share of the labels matched by one of the first `cutoff` nodes.
+    """
+    found = [
+        label for label in relevant
+        if any(is_relevant(node, [label]) for node in nodes[:cutoff])
+    ]
+
+    return len(found) / len(relevant)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", required=True, help="JSONL file of labelled queries")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="time budget of the rerankers, RERANK_TIME_BUDGET_MS by default")
+    parser.add_argument("--top-k", type=int, default=10, help="candidates retrieved")
+    parser.add_argument("--local", action="store_true", help="retrieve from the local index")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    Settings.embed_model = CachedEmbedding(
+        OpenAIEmbedding(api_key=os.getenv("OPENAI_API_KEY"), model=OPENAI_EMBED_MODEL)
+    )
+    database = WeaviateDB(local_index_mode="primary" if args.local else "off")
+    retriever = build_hybrid_retriever(
+        index=database.index,
+        similarity_top_k=args.top_k,
+        alpha=0.65,
+        local_index=database.local_index,
+        mode="primary" if args.local else "off",
+        cache=None
+    )
+    rerankers = {"none": None, "fusion": build_reranker("fusion", database.local_index)}
+    if RERANK_MODEL:
+        rerankers["cross_encoder"] = build_reranker(
+            "cross_encoder", model_loader=ModelLoader(rerank_model_name=RERANK_MODEL)
+        )
+    for reranker in rerankers.values():
+        if reranker is not None and args.budget_ms is not None:
+            reranker.time_budget_ms = args.budget_ms
+
+    results: Dict[str, Dict[str, List[float]]] = {
+        name: {"latency": [], "tokens": [], **{f"recall@{k}": [] for k in CUTOFFS}}
+        for name in rerankers
+    }
+    for sample in samples:
+        start = time.perf_counter()
+        candidates = retriever.retrieve(QueryBundle(sample["query"]))
+        retrieval_seconds = time.perf_counter() - start
+
+        for name, reranker in rerankers.items():
+            start = time.perf_counter()
+            if reranker is None:
+                ranked, kept = candidates, candidates
+            else:
+                # Rerank everything for the recall, keep the top n for the context.
+                reranker.top_n = len(candidates)
+                ranked = reranker.postprocess_nodes(candidates, query_str=sample["query"])
+                kept = ranked[:RERANK_TOP_N]
+            results[name]["latency"].append(retrieval_seconds + time.perf_counter() - start)
+            results[name]["tokens"].append(sum(node_token_count(node.node) for node in kept))
+            for cutoff in CUTOFFS:
+                results[name][f"recall@{cutoff}"].append(recall(ranked, sample["relevant"], cutoff))
+
+    database.client.close()
+
+    print(f"{len(samples)} queries, {args.top_k} candidates, context of the first "
+          f"{RERANK_TOP_N} reranked nodes")
+    print(f"{'reranker':<15}" + "".join(f"{f'recall@{k}':>11}" for k in CUTOFFS)
+          + f"{'tokens':>9}{'p50':>11}{'p99':>11}")
+    for name, values in results.items():
+        print(f"{name:<15}"
+              + "".join(f"{np.mean(values[f'recall@{k}']):>11.3f}" for k in CUTOFFS)
+              + f"{np.mean(values['tokens']):>9.0f}"
+              + f"{np.percentile(values['latency'], 50) * 1000:>9.1f}ms"
+              + f"{np.percentile(values['latency'], 99) * 1000:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Exports the joblib classifiers to the compact format of `CompactClassifier`.
+
+Writes `<name>.npz` next to each pipeline (DOMAIN_CLF_MODEL,
+PROMPT_INJECTION_MODEL and RAG_CLASSIFIER_MODEL, from `.env`), then start the
+backend with MODEL_FORMAT=compact. Run it again whenever a classifier is
+retrained, and check the export with `scripts.bench_classifier_backends`:
+
+    python -m scripts.export_classifiers
+"""
+
+import os
+import argparse
+
+import joblib
+
+from src.engines.classifier_engine import (
+    CompactClassifier,
+    compact_path
+)
+from src.services.model_loader import (
+    DOMAIN_CLF_MODEL,
+    PROMPT_INJECTION_MODEL,
+    RAG_CLASSIFIER_MODEL
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*",
+                        default=[DOMAIN_CLF_MODEL, PROMPT_INJECTION_MODEL, RAG_CLASSIFIER_MODEL],
+                        help="joblib pipelines to export, the backend's by default")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        output = compact_path(path)
+        CompactClassifier.export(joblib.load(path), output)
+        print(f"{path} ({os.path.getsize(path) / 1024:.0f} KiB) -> "
+              f"{output} ({os.path.getsize(output) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
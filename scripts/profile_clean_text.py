@@ -0,0 +1,135 @@
+"""
+Profiling harness of `PreprocessQuestion.clean_text`.
+
+Runs the original `clean_text` (rebuilt from the reference steps of
+`scripts.check_preprocess_parity`) and the current one on the sample queries and
+the handbook lines, checks that both return the same text, and reports the
+total cost per call and the share of each step:
+
+    python -m scripts.profile_clean_text
+    python -m scripts.profile_clean_text --cprofile 15
+
+`--cprofile` also prints the top functions of the current version by
+cumulative time. No model is loaded: `clean_text` only uses the text steps.
+"""
+
+import re
+import sys
+import time
+import cProfile
+import pstats
+import argparse
+from typing import (
+    Callable,
+    Dict,
+    List
+)
+
+from src.engines.preprocess_engine import PreprocessQuestion
+from src.prompt.preprocessing_prompt import (
+    FILLTER_WORDS,
+    TERMS_DICT
+)
+from scripts.check_preprocess_parity import (
+    legacy_delete_non_vietnamese_characters,
+    legacy_remove_emojis,
+    legacy_remove_filler_words,
+    legacy_replace_symbols,
+    legacy_replace_synonyms,
+    load_corpus
+)
+
+
+def legacy_clean_text(text, term_dict):
+    """
+    The original `PreprocessQuestion.clean_text`.
+    """
+    text = re.sub(r'\s+', ' ', text)
+    text = legacy_delete_non_vietnamese_characters(text.lower())
+    text = legacy_remove_filler_words(text, FILLTER_WORDS)
+    text = legacy_remove_emojis(text)
+    text = legacy_replace_synonyms(text, term_dict)
+    text = legacy_replace_symbols(text)
+    text = PreprocessQuestion.normalize_elonge_word(text)
+
+    return text
+
+
+def stages(preprocessor: PreprocessQuestion) -> Dict[str, Callable]:
+    """
+    The steps of the current `clean_text`, in order.
+    """
+    return {
+        "lower": lambda text: text.lower(),
+        "delete_non_vietnamese_characters": preprocessor.delete_non_vietnamese_characters,
+        "remove_filler_words": lambda text: preprocessor.remove_filler_words(text, FILLTER_WORDS),
+        "remove_emojis": preprocessor.remove_emojis,
+        "replace_synonyms": lambda text: preprocessor.replace_synonyms(text, TERMS_DICT),
+        "replace_symbols": preprocessor.replace_symbols,
+        "normalize_elonge_word": preprocessor.normalize_elonge_word
+    }
+
+
+def per_call(function: Callable, texts: List[str], repeat: int) -> float:
+    """
+    Returns the mean cost of one call, in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            function(text)
+
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="passes over the corpus")
+    parser.add_argument("--max-length", type=int, default=200,
+                        help="longest text kept from the corpus")
+    parser.add_argument("--cprofile", type=int, default=0,
+                        help="number of functions printed by cProfile, 0 to skip")
+    args = parser.parse_args()
+
+    texts = [text for text in load_corpus(synthetic=0, seed=0)
+             if len(text) <= args.max_length]
+    preprocessor = PreprocessQuestion(None, None, None, None, None, "cpu", [])
+
+    def current(text):
+        return preprocessor.clean_text(text, TERMS_DICT)
+
+    def legacy(text):
+        return legacy_clean_text(text, TERMS_DICT)
+
+    for text in texts:
+        if current(text) != legacy(text):
+            print(f"MISMATCH on {text!r}")
+            sys.exit(1)
+
+    legacy_cost = per_call(legacy, texts, args.repeat)
+    current_cost = per_call(current, texts, args.repeat)
+    print(f"clean_text on {len(texts)} texts of at most {args.max_length} characters, identical output")
+    print(f"  legacy  {legacy_cost:>9.1f} us/call")
+    print(f"  current {current_cost:>9.1f} us/call  x{legacy_cost / current_cost:.1f}")
+
+    # Feeds each step the output of the previous one, like clean_text does.
+    inputs = [" ".join(text.split()) for text in texts]
+    print("current steps:")
+    for name, step in stages(preprocessor).items():
+        cost = per_call(step, inputs, args.repeat)
+        print(f"  {name:<34}{cost:>9.1f} us/call {cost / current_cost:>6.1%}")
+        inputs = [step(text) for text in inputs]
+
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for _ in range(args.repeat):
+            for text in texts:
+                current(text)
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.cprofile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Writes a quantized copy of the fastText language identifier.
+
+Loads `facebook/fasttext-language-identification` from MODEL_CACHE_DIR
+(downloading it unless MODEL_OFFLINE=true), keeps the `--cutoff` words and
+n-grams with the largest embeddings, product-quantizes the matrices and saves
+the result as a `.ftz` file. Point LANG_DETECT_MODEL at it to serve it, after
+checking its decisions with `scripts.eval_lang_detector`:
+
+    python -m scripts.quantize_lang_detector --output AIModel/lid218e.ftz
+"""
+
+import os
+import time
+import argparse
+
+from src.services.model_loader import ModelLoader
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", default="AIModel/lid218e.ftz")
+    parser.add_argument("--cutoff", type=int, default=200000,
+                        help="number of words and n-grams kept, 0 for all")
+    parser.add_argument("--dsub", type=int, default=2,
+                        help="size of the quantized sub-vectors")
+    parser.add_argument("--qout", action="store_true",
+                        help="also quantize the output matrix")
+    args = parser.parse_args()
+
+    loader = ModelLoader(lang_detect_path=None)
+    path = loader.lang_detector_path()
+    model = loader.lang_detector
+
+    start = time.perf_counter()
+    model.quantize(cutoff=args.cutoff, dsub=args.dsub, qnorm=True, qout=args.qout, retrain=False)
+    model.save_model(args.output)
+
+    print(f"{path} ({os.path.getsize(path) / 2 ** 20:.0f} MiB) -> "
+          f"{args.output} ({os.path.getsize(args.output) / 2 ** 20:.1f} MiB) "
+          f"in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Replays logged queries through the preprocessing pipeline in batches.
+
+Reads one query per line, either as a JSON object (the query is taken from
+`--field`) or as plain text, runs `PreprocessQuestion.preprocess_batch` on
+batches of `--batch-size` queries and prints how many queries each gate
+rejected and the throughput. Useful to evaluate a classifier change on real
+traffic before deploying it:
+
+    python -m scripts.replay_preprocess --input logs/queries.jsonl --field query
+    python -m scripts.replay_preprocess --input scripts/data/sample_queries.txt --compare
+
+`--output` writes one JSON line per query with the processed result, and
+`--compare` also runs `preprocess_text` on every query and reports the queries
+where both disagree. The models are loaded like in the backend, from `.env`.
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import List
+
+from src.engines.preprocess_engine import PreprocessQuestion
+from src.models.preprocess import ProcessedData
+from src.services.model_loader import model_loader
+
+DECISIONS = [
+    ("is_only_icon", "icon"),
+    ("is_short_chat", "short_chat"),
+    ("language", "unsupported_language"),
+    ("is_prompt_injection", "prompt_injection"),
+    ("is_outdomain", "outdomain")
+]
+
+
+def read_queries(path: str, field: str, limit: int) -> List[str]:
+    """
+    Reads the queries of a JSON lines or plain text file.
+    """
+    queries = []
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            query = record.get(field) if isinstance(record, dict) else record
+            if isinstance(query, str) and query.strip():
+                queries.append(query)
+            if limit and len(queries) >= limit:
+                break
+
+    return queries
+
+
+def decision(result: ProcessedData) -> str:
+    """
+    Names the gate that decided a processed query, or "accepted".
+    """
+    for attribute, name in DECISIONS:
+        value = getattr(result, attribute)
+        if (not value) if attribute == "language" else value:
+            return name
+
+    return "accepted"
+
+
+def as_dict(result: ProcessedData) -> dict:
+    """
+    The fields of a processed query, without its timings.
+    """
+    fields = result.model_dump()
+    fields.pop("stage_timings")
+
+    return fields
+
+
+async def preprocess_one_by_one(preprocessor: PreprocessQuestion, queries: List[str]) -> List[ProcessedData]:
+    """
+    Runs `preprocess_text` on every query, one after the other.
+    """
+    return [await preprocessor.preprocess_text(query) for query in queries]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", required=True,
+                        help="JSON lines or plain text file of queries")
+    parser.add_argument("--field", default="query",
+                        help="field holding the query in JSON lines")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--limit", type=int, default=0,
+                        help="number of queries replayed, 0 for all")
+    parser.add_argument("--output", help="JSON lines file of the processed queries")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run preprocess_text on every query and compare")
+    args = parser.parse_args()
+
+    queries = read_queries(args.input, args.field, args.limit)
+    models = model_loader.load()
+    preprocessor = PreprocessQuestion(
+        domain_clf_model=models.domain_clf_model,
+        lang_detect_model=models.lang_detector,
+        tonemark_model=None,
+        tonemark_tokenizer=None,
+        prompt_injection_model=models.prompt_injection_model,
+        device_type=models.device,
+        label_list=[],
+        model_loader=models
+    )
+
+    start = time.perf_counter()
+    results: List[ProcessedData] = []
+    for offset in range(0, len(queries), args.batch_size):
+        results.extend(preprocessor.preprocess_batch(
+            queries[offset:offset + args.batch_size]
+        ))
+    elapsed = time.perf_counter() - start
+
+    counts = Counter(decision(result) for result in results)
+    print(f"{len(queries)} queries in {elapsed:.2f}s, "
+          f"{len(queries) / max(elapsed, 1e-9):.0f} queries/s")
+    for name, count in counts.most_common():
+        print(f"  {name:<22}{count:>8} {count / len(queries):>7.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for query, result in zip(queries, results):
+                f.write(json.dumps({
+                    "input": query,
+                    "decision": decision(result),
+                    **as_dict(result)
+                }, ensure_ascii=False) + "\n")
+
+    if args.compare:
+        start = time.perf_counter()
+        expected = asyncio.run(preprocess_one_by_one(preprocessor, queries))
+        single_elapsed = time.perf_counter() - start
+        mismatches = [
+            (query, as_dict(single), as_dict(batched))
+            for query, single, batched in zip(queries, expected, results)
+            if as_dict(single) != as_dict(batched)
+        ]
+        print(f"preprocess_text: {single_elapsed:.2f}s, "
+              f"x{single_elapsed / max(elapsed, 1e-9):.1f} slower, "
+              f"{len(mismatches)} mismatches")
+        for query, single, batched in mismatches[:10]:
+            print(f"  {query!r}\n    single:  {single}\n    batched: {batched}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,32 @@
 """
 This module provides the inference service.
-It imports the Service class from the src.services.service module and 
-initializes an instance of it.
+It imports the Service class from the src.services.service module and
+initializes an instance of it when the application starts.
+
+The instance is created lazily, in the application lifespan, so that under
+gunicorn every worker builds its own clients after the fork while sharing the
+models preloaded by the master.
 """
 
 from src.services.service import Service
 
-service = Service()
+service: Service = None
+
+
+def init_service() -> Service:
+    """
+    Create the inference service instance of this process, once.
+    """
+    global service
+
+    if service is None:
+        service = Service()
+
+    return service
 
 
 async def get_service() -> Service:
     """
     Get the inference service instance.
     """
-    return service
+    return init_service()
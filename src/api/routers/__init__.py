@@ -5,3 +5,5 @@ from .chat import chat_router
 from .file import file_router
 from .suggestion import suggestion_router
 from .manually import manually_file_router
+from .health import health_router
+from .metrics import metrics_router
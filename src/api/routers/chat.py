@@ -1,6 +1,8 @@
 """
 This module defines FastAPI endpoints for chat.
 """
+import json
+from typing import AsyncGenerator
 from fastapi import (
     status,
     Depends,
@@ -8,12 +10,14 @@ from fastapi import (
     HTTPException,
     Response
 )
+from fastapi.responses import StreamingResponse
 
 from src.services.service import Service
 from src.api.dependencies.dependency import get_service
 from src.api.schemas.chat import (
     RequestChat,
-    ResponseChat
+    ResponseChat,
+    ResponseCacheStats
 )
 
 
@@ -74,6 +78,76 @@ async def chat_domain(
             detail=str(e)) from e
 
 
+@chat_router.post(
+    '/chatDomainStream',
+    status_code=status.HTTP_200_OK
+)
+async def chat_domain_stream(
+    request_chat: RequestChat,
+    service: Service = Depends(get_service)
+) -> StreamingResponse:
+    """
+    Endpoint to handle chat queries, streaming the response as NDJSON.
+
+    Every line is a JSON object: `{"delta": ...}` while the answer is generated,
+    then `{"done": true, "response": ..., "is_outdomain": ...}` once the chat
+    record has been persisted, or `{"error": ...}` if generation failed.
+
+    Args:
+        request_chat (RequestChat): An object containing the chat query.
+        service (Service, optional): Dependency injection for the service layer.
+                                     Defaults to Depends(get_service).
+
+    Returns:
+        StreamingResponse: The chunked NDJSON response.
+    """
+    if not request_chat.query:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query is required"
+        )
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        deltas = []
+        is_outdomain = False
+
+        try:
+            async for chunk in service.retrieve_chat_engine.stream_preprocess_query(
+                query=request_chat.query,
+                room_id=request_chat.room_id
+            ):
+                deltas.append(chunk.delta)
+                is_outdomain = chunk.is_outdomain
+                yield json.dumps({"delta": chunk.delta}, ensure_ascii=False) + "\n"
+
+            response = "".join(deltas)
+            await service.chat_repository.add_chat_domains(
+                room_id=request_chat.room_id,
+                query=request_chat.query,
+                answer=response,
+                retrieved_nodes=[],
+                is_out_of_domain=is_outdomain
+            )
+
+        except Exception as e:
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+            return
+
+        yield json.dumps(
+            {
+                "done": True,
+                "response": response,
+                "is_outdomain": is_outdomain
+            },
+            ensure_ascii=False
+        ) + "\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson"
+    )
+
+
 @chat_router.delete(
     "/deleteChat",
     status_code=status.HTTP_200_OK
@@ -125,3 +199,23 @@ async def history_chat_deletion(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         ) from e
+
+
+@chat_router.get(
+    "/cacheStats",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseCacheStats
+)
+async def cache_stats(
+    service: Service = Depends(get_service)
+) -> ResponseCacheStats:
+    """
+    Report the hit/miss counters of the answer cache.
+
+    Args:
+        service (Service): Dependency-injected service for accessing the answer cache.
+
+    Returns:
+        ResponseCacheStats: The counters of the answer cache.
+    """
+    return ResponseCacheStats(**service.answer_cache.stats)
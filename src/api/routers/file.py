@@ -43,7 +43,7 @@ async def get_all_files_upload(
         AllFiles: A list of all files in the file repository.
     """
     try:
-        file_records = service.file_repository.load_all_data()
+        file_records = await service.file_repository.aload_all_data()
 
         return AllFiles(
             data=[File(**record) for record in file_records]
@@ -79,7 +79,7 @@ async def get_file_upload(
         File: The details of the requested file if found.
     """
     try:
-        file_record = service.file_repository.get_specific_file(
+        file_record = await service.file_repository.get_specific_file(
             public_id=public_id
         )
 
@@ -164,7 +164,7 @@ async def file_delete(
         Response: Success message if the file is deleted successfully.
     """
     try:
-        record = service.file_repository.get_specific_file(
+        record = await service.file_repository.get_specific_file(
             public_id=public_id
         )
 
@@ -174,7 +174,7 @@ async def file_delete(
                 detail="File not found"
             )
 
-        service.file_management.delete_file(
+        await service.file_management.delete_file(
             public_id=public_id
         )
 
@@ -0,0 +1,46 @@
+"""
+This module defines FastAPI endpoints for health checks.
+"""
+
+from fastapi import (
+    status,
+    Depends,
+    APIRouter
+)
+
+from src.services.service import Service
+from src.api.dependencies.dependency import get_service
+from src.api.schemas.health import (
+    ResponseHealth,
+    StartupTimings
+)
+
+health_router = APIRouter(
+    tags=["Health"],
+    prefix="/health",
+)
+
+
+@health_router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_model=ResponseHealth
+)
+async def health(
+    service: Service = Depends(get_service)
+) -> ResponseHealth:
+    """
+    Report that the service is up, with the breakdown of its startup time.
+
+    Args:
+        service (Service, optional): Dependency injection for the service layer.
+                                     Defaults to Depends(get_service).
+
+    Returns:
+        ResponseHealth: The status and the seconds spent in each startup phase
+                        and loading each model.
+    """
+    return ResponseHealth(
+        status="ok",
+        startup=StartupTimings(**service.startup_timings)
+    )
@@ -0,0 +1,31 @@
+"""
+This module defines the Prometheus metrics endpoint.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    generate_latest
+)
+
+from src.services.tracing import metrics_registry
+
+metrics_router = APIRouter(
+    tags=["Metrics"],
+    prefix="/metrics",
+)
+
+
+@metrics_router.get("")
+async def metrics() -> Response:
+    """
+    Expose the request, span, LLM token and cache metrics in the Prometheus format.
+
+    Returns:
+        Response: The metrics in the Prometheus text exposition format.
+    """
+    return Response(
+        content=generate_latest(metrics_registry()),
+        media_type=CONTENT_TYPE_LATEST
+    )
@@ -45,7 +45,7 @@ async def get_all_suggestion(
         HTTPException: If an internal server error occurs, a 500 status code is returned.
     """
     try:
-        suggestion_records = service.suggestion_repository.load_data()
+        suggestion_records = await service.suggestion_repository.aload_data()
 
         if not suggestion_records:
             raise HTTPException(
@@ -88,7 +88,7 @@ async def get_suggestion(
         500 status code if an internal server error occurs.
     """
     try:
-        suggestion_record = service.suggestion_repository.get_suggestion_by_question(
+        suggestion_record = await service.suggestion_repository.get_suggestion_by_question(
             suggestion_question=suggestion_question
         )
 
@@ -140,7 +140,7 @@ async def upload_suggestion(
         await service.vector_database.insert_suggestion_nodes(
             nodes=node
         )
-        service.suggestion_repository.add_suggestion(
+        await service.suggestion_repository.add_suggestion(
             question=question,
             answer=response
         )
@@ -184,7 +184,7 @@ async def delete_suggestion(
         )
 
     try:
-        service.suggestion_repository.delete_suggestion(
+        await service.suggestion_repository.delete_suggestion(
             identifier=field
         )
 
@@ -35,3 +35,18 @@ class ResponseChatSuggestion(BaseModel):
     """
     response: str
     suggestion: List[str]
+
+
+class ResponseCacheStats(BaseModel):
+    """
+    A model for representing the counters of the answer cache.
+    """
+    exact_hits: int
+    semantic_hits: int
+    hits: int
+    misses: int
+    stores: int
+    evictions: int
+    invalidations: int
+    size: int
+    hit_rate: float
@@ -0,0 +1,23 @@
+"""
+This schemas is used for health
+"""
+
+from typing import Dict
+from pydantic import BaseModel
+
+
+class StartupTimings(BaseModel):
+    """
+    A model for representing where the startup time went, in seconds.
+    """
+    phases: Dict[str, float]
+    models: Dict[str, float]
+    model_status: Dict[str, str]
+
+
+class ResponseHealth(BaseModel):
+    """
+    A model for representing the health of the service.
+    """
+    status: str
+    startup: StartupTimings
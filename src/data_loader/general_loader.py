@@ -4,9 +4,11 @@ from various sources including URLs, Excel files, and PDF files. It supports
 converting data into markdown format for easy parsing and readability.
 """
 
+import os
 from typing import List
 from pathlib import Path
 from urllib.parse import urlparse
+from dotenv import load_dotenv
 from tqdm import tqdm
 from llama_index.core.schema import Document
 
@@ -15,6 +17,20 @@ from src.data_loader.pdf_loader import PDFLoader
 from src.data_loader.excel_loader import ExcelLoader
 from src.data_loader.url_loader import URLLoader
 from src.data_loader.image_loader import ImageLoader
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class GeneralLoader(BaseLoader):
@@ -123,7 +139,7 @@ class GeneralLoader(BaseLoader):
                     self.image_loader.load_data([source])
                 )
             else:
-                print("Source type is not supported:", source_type)
+                log.warning(f"Source type is not supported: {source_type}")
 
         return documents
 
@@ -161,6 +177,6 @@ class GeneralLoader(BaseLoader):
                     await self.image_loader.aload_data([source])
                 )
             else:
-                print("Source type is not supported:", source_type)
+                log.warning(f"Source type is not supported: {source_type}")
 
         return documents
@@ -13,6 +13,7 @@ from llama_index.core.schema import Document
 
 from src.data_loader.base_loader import BaseLoader
 from src.utils.utility import convert_value
+from src.services.logger import DSCLogger
 
 # nest_asyncio.apply()
 
@@ -20,6 +21,16 @@ load_dotenv()
 
 PARSING_INSTRUCTION = convert_value(os.getenv("PARSING_INSTRUCTION"))
 
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
 
 class PDFLoader(BaseLoader):
     """
@@ -93,7 +104,7 @@ class PDFLoader(BaseLoader):
             ).load_data()
 
         except ValueError as e:
-            print("Use default PDF, return text instead of markdown:", str(e))
+            log.warning(f"Use default PDF, return text instead of markdown: {e}")
             del self.file_extractor[".pdf"]
             documents = SimpleDirectoryReader(
                 input_files=sources, file_extractor=self.file_extractor
@@ -115,19 +126,18 @@ class PDFLoader(BaseLoader):
             List[Document]: A list of Document objects containing the loaded data.
         """
         try:
-            print("Loading data from PDF files...")
+            log.info("Loading data from PDF files...")
             documents = await SimpleDirectoryReader(
                 input_files=["./data/cam_nang_sau_dai_hoc_thac_si_truong_uit.pdf"], file_extractor=self.file_extractor
             ).aload_data()
-            print("Data loaded successfully.")
-            print("Documents:", documents[0])
+            log.info("Data loaded successfully.", documents=len(documents))
 
         except ValueError as e:
-            print("Use default PDF, return text instead of markdown:", str(e))
+            log.warning(f"Use default PDF, return text instead of markdown: {e}")
             del self.file_extractor[".pdf"]
             documents = await SimpleDirectoryReader(
                 input_files=sources, file_extractor=self.file_extractor
             ).aload_data()
-        print(documents)
+        log.debug("Loaded PDF documents", document_ids=[doc.id_ for doc in documents])
 
         return documents
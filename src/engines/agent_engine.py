@@ -4,7 +4,10 @@ for handling user queries and performing operations like retrieval and score com
 """
 
 import os
-from typing import List
+from typing import (
+    List,
+    AsyncGenerator
+)
 from dotenv import load_dotenv
 from llama_index.core.retrievers import BaseRetriever
 from llama_index.core import VectorStoreIndex
@@ -30,6 +33,8 @@ load_dotenv()
 
 TOOL_SIMILARITY = convert_value(os.getenv("TOOL_SIMILARITY"))
 MAX_ITERATIONS = convert_value(os.getenv("MAX_ITERATIONS"))
+# The ReAct trace is printed to stdout synchronously, keep it for debugging only.
+AGENT_VERBOSE = convert_value(os.getenv("AGENT_VERBOSE", "false"))
 
 
 class AgentEngine:
@@ -87,7 +92,7 @@ class AgentEngine:
             # tool_retriever = self._retriever_tool,
             tools=[self._retriever_tool],
             llm=llm,
-            verbose=True,
+            verbose=AGENT_VERBOSE,
             max_iterations=MAX_ITERATIONS,
             system_prompt=AGENT_INSTRUCTION_PROMPT
         )
@@ -113,3 +118,26 @@ class AgentEngine:
         )
 
         return response.response
+
+    async def stream_reasoning_agent(
+        self,
+        chat: str = None,
+        chat_history: List[ChatMessage] = List[None]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Process a query using the ReAct agent, streaming the final answer.
+
+        Args:
+            chat (str): The current user query.
+            chat_history (List[ChatMessage]): List of past chat messages.
+
+        Yields:
+            str: Tokens of the final answer as they are generated.
+        """
+        response = await self._agent.astream_chat(
+            message=chat,
+            chat_history=chat_history
+        )
+
+        async for token in response.async_response_gen():
+            yield token
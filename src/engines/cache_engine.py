@@ -0,0 +1,298 @@
+"""
+This module provides a semantic answer cache placed in front of the agent pipeline.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import (
+    Dict,
+    List,
+    Optional
+)
+from dotenv import load_dotenv
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from src.storage.retrieval_cache import (
+    RetrievalCache,
+    retrieval_cache
+)
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = convert_value(os.getenv("ANSWER_CACHE_ENABLED", "true"))
+ANSWER_CACHE_THRESHOLD = convert_value(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = convert_value(os.getenv("ANSWER_CACHE_TTL", "300"))
+ANSWER_CACHE_MAX_SIZE = convert_value(os.getenv("ANSWER_CACHE_MAX_SIZE", "1024"))
+
+
+class AnswerCache:
+    """
+    An in-process LRU cache of agent answers keyed on the normalized query,
+    with an embedding-similarity fallback for near-identical questions.
+
+    Answers are tied to the knowledge base version of `knowledge_base`, which
+    `WeaviateDB` bumps on every change, including those made by another
+    worker: the first lookup or store at a new version drops every answer.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding = None,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_size: int = ANSWER_CACHE_MAX_SIZE,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+        knowledge_base: RetrievalCache = retrieval_cache
+    ) -> None:
+        """
+        Initializes the AnswerCache.
+
+        Args:
+            embed_model (BaseEmbedding): The model used to embed queries for the
+                                         similarity lookup. Exact matching only if None.
+            threshold (float): Minimum cosine similarity for a semantic hit.
+            ttl (float): Time to live of an entry, in seconds.
+            max_size (int): Maximum number of cached answers.
+            enabled (bool): Whether the cache is consulted at all.
+            knowledge_base (RetrievalCache): Holds the knowledge base version
+                                             the answers are tied to.
+        """
+        self._knowledge_base = knowledge_base
+        self._knowledge_version = knowledge_base.version
+        self._embed_model = embed_model
+        self._threshold = threshold
+        self._ttl = ttl
+        self._max_size = max_size
+        self._enabled = enabled
+        self._entries: OrderedDict = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._free_slots: List[int] = list(range(max_size))
+        self._pending_vectors: OrderedDict = OrderedDict()
+        self._generation = 0
+        self._counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether the cache is consulted at all.
+        """
+        return self._enabled
+
+    @property
+    def generation(self) -> int:
+        """
+        The knowledge base generation; bumped on every invalidation.
+        """
+        return self._generation
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters of the cache.
+
+        Returns:
+            Dict: The counters, the current size and the hit rate.
+        """
+        hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+        lookups = hits + self._counters["misses"]
+
+        return {
+            **self._counters,
+            "hits": hits,
+            "size": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+    def _check_version(self) -> None:
+        """
+        Drops every answer if the knowledge base changed since they were stored.
+        """
+        if self._knowledge_base.version != self._knowledge_version:
+            self._knowledge_version = self._knowledge_base.version
+            self.invalidate()
+
+    def _is_expired(
+        self,
+        entry: Dict
+    ) -> bool:
+        """
+        Checks whether a cache entry has outlived the TTL.
+        """
+        return time.monotonic() - entry["created_at"] > self._ttl
+
+    def _remove(
+        self,
+        key: str
+    ) -> None:
+        """
+        Removes an entry and releases its embedding slot.
+        """
+        entry = self._entries.pop(key)
+
+        if entry["slot"] is not None:
+            self._free_slots.append(entry["slot"])
+
+    async def _embed(
+        self,
+        query: str
+    ) -> np.ndarray:
+        """
+        Embeds a query and normalizes it to unit length.
+        """
+        if query in self._pending_vectors:
+            return self._pending_vectors[query]
+
+        embedding = np.asarray(
+            await self._embed_model.aget_query_embedding(query),
+            dtype=np.float32
+        )
+        norm = np.linalg.norm(embedding)
+
+        if norm > 0:
+            embedding = embedding / norm
+
+        self._pending_vectors[query] = embedding
+        while len(self._pending_vectors) > 128:
+            self._pending_vectors.popitem(last=False)
+
+        return embedding
+
+    def _semantic_match(
+        self,
+        embedding: np.ndarray
+    ) -> Optional[str]:
+        """
+        Finds the live entry whose query embedding is most similar to the given one.
+        """
+        if self._vectors is None:
+            return None
+
+        keys = [key for key, entry in self._entries.items()
+                if entry["slot"] is not None]
+        if not keys:
+            return None
+
+        slots = [self._entries[key]["slot"] for key in keys]
+        scores = self._vectors[slots] @ embedding
+        best = int(np.argmax(scores))
+
+        if scores[best] >= self._threshold:
+            return keys[best]
+
+        return None
+
+    async def lookup(
+        self,
+        query: str
+    ) -> Optional[str]:
+        """
+        Looks up a cached answer for the query.
+
+        Args:
+            query (str): The normalized query produced by `PreprocessQuestion.clean_text`.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        if not self._enabled or not query:
+            return None
+
+        self._check_version()
+        entry = self._entries.get(query)
+        if entry is not None and self._is_expired(entry):
+            self._remove(query)
+            entry = None
+
+        if entry is not None:
+            self._entries.move_to_end(query)
+            self._counters["exact_hits"] += 1
+            return entry["answer"]
+
+        if self._embed_model is not None and self._entries:
+            key = self._semantic_match(await self._embed(query))
+            if key is not None:
+                if self._is_expired(self._entries[key]):
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self._counters["semantic_hits"] += 1
+                    return self._entries[key]["answer"]
+
+        self._counters["misses"] += 1
+
+        return None
+
+    async def store(
+        self,
+        query: str,
+        answer: str,
+        generation: int = None
+    ) -> None:
+        """
+        Stores an answer for the query.
+
+        Args:
+            query (str): The normalized query.
+            answer (str): The answer produced by the agent.
+            generation (int, optional): The generation observed before the answer
+                                        was computed; stale answers are dropped.
+        """
+        if not self._enabled or not query or not answer:
+            return
+
+        self._check_version()
+        if generation is not None and generation != self._generation:
+            return
+
+        embedding = None
+        if self._embed_model is not None:
+            embedding = await self._embed(query)
+            self._check_version()
+            if generation is not None and generation != self._generation:
+                return
+
+        if query in self._entries:
+            self._remove(query)
+
+        while len(self._entries) >= self._max_size:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._counters["evictions"] += 1
+
+        slot = None
+        if embedding is not None:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self._max_size, embedding.shape[0]),
+                    dtype=np.float32
+                )
+            slot = self._free_slots.pop()
+            self._vectors[slot] = embedding
+
+        self._entries[query] = {
+            "answer": answer,
+            "slot": slot,
+            "created_at": time.monotonic()
+        }
+        self._pending_vectors.pop(query, None)
+        self._counters["stores"] += 1
+
+    def invalidate(self) -> None:
+        """
+        Drops every cached answer, e.g. after the knowledge base changed.
+        """
+        self._entries.clear()
+        self._pending_vectors.clear()
+        self._free_slots = list(range(self._max_size))
+        self._generation += 1
+        self._counters["invalidations"] += 1
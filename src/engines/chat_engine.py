@@ -2,12 +2,15 @@
 ChatEngine: A class designed to facilitate conversation using a language model.
 """
 
+import os
 import re
 import json
 from typing import (
     List,
-    Dict
+    Dict,
+    AsyncGenerator
 )
+from dotenv import load_dotenv
 from llama_index.llms.openai import OpenAI
 from llama_index.core.base.llms.types import ChatMessage
 
@@ -24,6 +27,20 @@ from src.prompt.funny_chat_prompt import (
 )
 from src.storage.weaviatedb import WeaviateDB
 from src.repositories.suggestion_repository import SuggestionRepository
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class ChatEngine:
@@ -100,7 +117,7 @@ class ChatEngine:
             answer=response.text
         )
         await self._weaviate_dbs.insert_suggestion_nodes(nodes=nodes)
-        self._suggestion_repository.add_suggestion(
+        await self._suggestion_repository.add_suggestion(
             question=query,
             answer=response.text
         )
@@ -134,7 +151,7 @@ class ChatEngine:
             string_processed = re.sub(r"```json|```", "", response.text)
             query_processed = json.loads(string_processed)
         except json.JSONDecodeError as e:
-            print("JSON Error:", e)
+            log.error(f"JSON Error: {e}")
             query_processed = query
 
         return query_processed
@@ -184,6 +201,26 @@ class ChatEngine:
 
         return response.text
 
+    async def stream_chat(
+        self,
+        text: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streams a response based on the provided text input.
+
+        Args:
+            text (str): Input text for generating a response.
+
+        Yields:
+            str: Tokens of the generated response as they arrive.
+        """
+        answer = EMOJI_PROMPT.format(emoji=text)
+        response = await self._language_model.astream_complete(answer)
+
+        async for chunk in response:
+            if chunk.delta:
+                yield chunk.delta
+
     async def direct_entry(
         self,
         history: List[ChatMessage],
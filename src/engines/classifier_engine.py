@@ -0,0 +1,434 @@
+"""
+This module provides the runtime of the preprocessing classifiers.
+
+A TF-IDF + SVC pipeline called with one text spends most of its time in the
+per-call overhead of the vectorizer and the model. Requests arriving within a
+few milliseconds of each other are collected by `BatchedClassifier` and
+classified with a single `predict_proba` call; each request gets back its own
+row, which is the same as predicting it alone.
+
+`CompactClassifier` runs the same pipelines from a plain `.npz` export (see
+`scripts.export_classifiers`) with numpy and scipy only, so a worker neither
+unpickles the sklearn objects nor imports sklearn.
+"""
+
+import os
+import re
+import math
+import asyncio
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple
+)
+from dotenv import load_dotenv
+import numpy as np
+from scipy import sparse
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+CLASSIFIER_BATCHING = convert_value(os.getenv("CLASSIFIER_BATCHING", "true"))
+CLASSIFIER_BATCH_WINDOW_MS = convert_value(os.getenv("CLASSIFIER_BATCH_WINDOW_MS", "2"))
+CLASSIFIER_MAX_BATCH_SIZE = convert_value(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "32"))
+# Constants of libsvm's probability estimates.
+_MIN_PROBABILITY = 1e-7
+_COUPLING_EPS = 0.005 / 2
+
+
+def compact_path(path: str) -> str:
+    """
+    The path of the compact export of a joblib classifier: the same name with `.npz`.
+    """
+    return os.path.splitext(path)[0] + ".npz"
+
+
+def restore_idf(pipeline: Any) -> Any:
+    """
+    Gives back its trained idf to a pipeline pickled by scikit-learn < 1.3.
+
+    Those releases keep the idf as a sparse diagonal `_idf_diag`, which later
+    releases ignore: the vectorizer then silently predicts with an idf of ones.
+
+    Args:
+        pipeline (Any): A Pipeline starting with a TfidfVectorizer.
+
+    Returns:
+        Any: The same pipeline, fixed in place.
+    """
+    transformer = pipeline.steps[0][1]._tfidf
+    idf_diag = getattr(transformer, "_idf_diag", None)
+    if idf_diag is not None:
+        transformer.idf_ = np.asarray(idf_diag.diagonal(), dtype=np.float64)
+        del transformer._idf_diag
+
+    return pipeline
+
+
+class BatchedClassifier:
+    """
+    Collects concurrent `predict_proba` calls on one model and runs them as a batch,
+    every `window_ms` milliseconds or as soon as `max_batch_size` texts are waiting.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        executor: Executor = None,
+        window_ms: float = CLASSIFIER_BATCH_WINDOW_MS,
+        max_batch_size: int = CLASSIFIER_MAX_BATCH_SIZE
+    ) -> None:
+        """
+        Initializes the BatchedClassifier.
+
+        Args:
+            model (Any): A fitted model or pipeline with `predict_proba`.
+            executor (Executor): Runs the batches off the event loop; the loop's
+                                 default executor if None.
+            window_ms (float): How long the first request of a batch waits for others.
+            max_batch_size (int): Maximum number of texts per `predict_proba` call.
+        """
+        self._model = model
+        self._executor = executor
+        self._window = window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle = None
+        self._counters = {
+            "requests": 0,
+            "batches": 0,
+            "full_batches": 0,
+            "failed_batches": 0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Counters of the batcher.
+        """
+        batches = self._counters["batches"]
+
+        return {
+            **self._counters,
+            "pending": len(self._pending),
+            "mean_batch_size": self._counters["requests"] / batches if batches else 0.0
+        }
+
+    async def predict_proba(self, text: Any) -> np.ndarray:
+        """
+        Predicts the class probabilities of one text, batched with concurrent calls.
+
+        Args:
+            text (Any): One input of the model, e.g. a cleaned query.
+
+        Returns:
+            np.ndarray: The probabilities of the text, one per class.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self._counters["requests"] += 1
+
+        if len(self._pending) >= self._max_batch_size:
+            self._counters["full_batches"] += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """
+        Sends the waiting texts to the model as one batch.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            self._counters["batches"] += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """
+        Runs `predict_proba` on a batch and hands each caller its row.
+        """
+        loop = asyncio.get_running_loop()
+
+        try:
+            probabilities = await loop.run_in_executor(
+                self._executor,
+                self._model.predict_proba,
+                [text for text, _ in batch]
+            )
+        except Exception as e:
+            self._counters["failed_batches"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), row in zip(batch, probabilities):
+            # A caller whose request was short-circuited has cancelled its future.
+            if not future.done():
+                future.set_result(row)
+
+
+class CompactClassifier:
+    """
+    A TF-IDF + binary SVC pipeline evaluated from its exported weights.
+
+    Only what `predict_proba` needs is kept: the vocabulary and the idf of the
+    vectorizer, and the support vectors, dual coefficients, intercept and Platt
+    scaling of the SVC. With a linear kernel the support vectors are folded into
+    a single sparse weight vector.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Initializes the CompactClassifier from the arrays of an export.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): The arrays written by `export`.
+        """
+        terms = bytes(arrays["terms"]).decode("utf-8")
+        self.vocabulary_ = {
+            term: index for index, term in enumerate(terms.split("\n"))
+        } if terms else {}
+        self._idf = arrays["idf"]
+        self._token_pattern = re.compile(str(arrays["token_pattern"]))
+        self._lowercase = bool(arrays["lowercase"])
+        self._min_n, self._max_n = (int(n) for n in arrays["ngram_range"])
+        self._kernel = str(arrays["kernel"])
+        self._gamma = float(arrays["gamma"])
+        self._coef0 = float(arrays["coef0"])
+        self._intercept = float(arrays["intercept"])
+        self._prob_a = float(arrays["prob_a"])
+        self._prob_b = float(arrays["prob_b"])
+        self.classes_ = arrays["classes"]
+        self._vectors = sparse.csr_matrix(
+            (arrays["sv_data"], arrays["sv_indices"], arrays["sv_indptr"]),
+            shape=tuple(arrays["sv_shape"])
+        )
+        self._vectors_t = self._vectors.T.tocsr()
+        self._dual_coef = arrays["dual_coef"]
+        self._vector_norms = _squared_norms(self._vectors)
+
+    @staticmethod
+    def export(pipeline: Any, path: str) -> None:
+        """
+        Writes the weights of a fitted sklearn TF-IDF + SVC pipeline to a `.npz` file.
+
+        Args:
+            pipeline (Any): A Pipeline of a TfidfVectorizer and a binary SVC
+                            trained with `probability=True`.
+            path (str): The file written.
+        """
+        vectorizer, svc = pipeline.steps[0][1], pipeline.steps[-1][1]
+
+        if len(pipeline.steps) != 2 or vectorizer.analyzer != "word" \
+                or vectorizer.tokenizer or vectorizer.preprocessor \
+                or vectorizer.stop_words or vectorizer.strip_accents \
+                or vectorizer.binary or vectorizer.sublinear_tf \
+                or vectorizer.norm != "l2" or not vectorizer.use_idf:
+            raise ValueError("Only default word TF-IDF vectorizers can be exported")
+        if len(svc.classes_) != 2 or not svc.probability \
+                or svc.kernel not in ("linear", "rbf", "sigmoid"):
+            raise ValueError("Only binary SVCs with probability estimates can be exported")
+
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        idf = restore_idf(pipeline).steps[0][1].idf_
+        # libsvm's own signs; sklearn flips those of `dual_coef_` for binary SVCs.
+        dual_coef = svc._dual_coef_
+        if sparse.issparse(dual_coef):
+            dual_coef = dual_coef.toarray()
+        dual_coef = np.asarray(dual_coef, dtype=np.float64)
+        vectors = sparse.csr_matrix(svc.support_vectors_, dtype=np.float64)
+        if svc.kernel == "linear":
+            vectors = sparse.csr_matrix(dual_coef @ vectors)
+            dual_coef = np.ones((1, 1))
+
+        np.savez(
+            path,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            idf=np.asarray(idf, dtype=np.float64),
+            token_pattern=np.array(vectorizer.token_pattern),
+            lowercase=np.array(vectorizer.lowercase),
+            ngram_range=np.array(vectorizer.ngram_range),
+            kernel=np.array(svc.kernel),
+            gamma=np.array(svc._gamma),
+            coef0=np.array(svc.coef0),
+            intercept=np.array(svc._intercept_[0]),
+            prob_a=np.array(svc.probA_[0]),
+            prob_b=np.array(svc.probB_[0]),
+            classes=svc.classes_,
+            sv_data=vectors.data,
+            sv_indices=vectors.indices,
+            sv_indptr=vectors.indptr,
+            sv_shape=np.array(vectors.shape),
+            dual_coef=dual_coef
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CompactClassifier":
+        """
+        Loads an export written by `export`.
+
+        Args:
+            path (str): The `.npz` file.
+
+        Returns:
+            CompactClassifier: The classifier.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(dict(arrays))
+
+    def _ngrams(self, text: str) -> List[str]:
+        """
+        Splits a text into the word n-grams of the vectorizer.
+        """
+        if self._lowercase:
+            text = text.lower()
+        tokens = self._token_pattern.findall(text)
+
+        if self._max_n == 1:
+            return tokens
+
+        ngrams = list(tokens) if self._min_n == 1 else []
+        for n in range(max(self._min_n, 2), min(self._max_n, len(tokens)) + 1):
+            for start in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[start:start + n]))
+
+        return ngrams
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """
+        Computes the l2-normalized TF-IDF vectors of a list of texts.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            sparse.csr_matrix: One row per text.
+        """
+        indices = []
+        indptr = [0]
+
+        for text in texts:
+            for ngram in self._ngrams(text):
+                index = self.vocabulary_.get(ngram)
+                if index is not None:
+                    indices.append(index)
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices)), np.asarray(indices, dtype=np.int32), indptr),
+            shape=(len(texts), len(self.vocabulary_))
+        )
+        matrix.sum_duplicates()
+        # Scales the arrays of the matrix in place: scipy's elementwise operations
+        # cost more than the computation itself on a handful of short texts.
+        matrix.data *= self._idf[matrix.indices]
+        matrix.data /= np.repeat(np.sqrt(_squared_norms(matrix)), np.diff(matrix.indptr))
+
+        return matrix
+
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        """
+        Computes the libsvm decision value of each text.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            np.ndarray: One decision value per text.
+        """
+        matrix = self.transform(texts)
+        products = (matrix @ self._vectors_t).toarray()
+
+        if self._kernel == "linear":
+            kernel = products
+        elif self._kernel == "sigmoid":
+            kernel = np.tanh(self._gamma * products + self._coef0)
+        else:
+            norms = _squared_norms(matrix)[:, None]
+            kernel = np.exp(-self._gamma * (norms + self._vector_norms[None, :] - 2 * products))
+
+        return kernel @ self._dual_coef[0] + self._intercept
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """
+        Predicts the class probabilities of a list of texts, like the sklearn pipeline.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            np.ndarray: One row per text, one column per class.
+        """
+        probabilities = np.empty((len(texts), 2))
+
+        for row, value in enumerate(self.decision_function(texts)):
+            first = _two_class_probability(
+                _sigmoid_predict(float(value), self._prob_a, self._prob_b)
+            )
+            probabilities[row] = first, 1.0 - first
+
+        return probabilities
+
+
+def _squared_norms(matrix: sparse.csr_matrix) -> np.ndarray:
+    """
+    The squared l2 norm of each row of a CSR matrix.
+    """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+    return np.bincount(rows, weights=matrix.data ** 2, minlength=matrix.shape[0])
+
+
+def _sigmoid_predict(value: float, prob_a: float, prob_b: float) -> float:
+    """
+    libsvm's Platt scaling of a decision value, clipped like in `svm_predict_probability`.
+    """
+    scaled = value * prob_a + prob_b
+    if scaled >= 0:
+        probability = math.exp(-scaled) / (1.0 + math.exp(-scaled))
+    else:
+        probability = 1.0 / (1 + math.exp(scaled))
+
+    return min(max(probability, _MIN_PROBABILITY), 1 - _MIN_PROBABILITY)
+
+
+def _two_class_probability(pairwise: float) -> float:
+    """
+    libsvm's `multiclass_probability` for two classes.
+
+    sklearn's libsvm runs the iterative pairwise coupling even for two classes,
+    which stops within 0.0025 of `pairwise`; the same steps are repeated here so
+    that the probabilities match to the last bit.
+    """
+    r01, r10 = pairwise, 1 - pairwise
+    q = ((r10 * r10, -r10 * r01), (-r10 * r01, r01 * r01))
+    p = [0.5, 0.5]
+    qp = [0.0, 0.0]
+
+    for _ in range(100):
+        pqp = 0.0
+        for t in range(2):
+            qp[t] = q[t][0] * p[0] + q[t][1] * p[1]
+            pqp += p[t] * qp[t]
+        if max(abs(qp[0] - pqp), abs(qp[1] - pqp)) < _COUPLING_EPS:
+            break
+        for t in range(2):
+            diff = (-qp[t] + pqp) / q[t][t]
+            p[t] += diff
+            pqp = (pqp + diff * (diff * q[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(2):
+                qp[j] = (qp[j] + diff * q[t][j]) / (1 + diff)
+                p[j] /= (1 + diff)
+
+    return p[0]
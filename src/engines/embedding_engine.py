@@ -0,0 +1,179 @@
+"""
+This module provides the embedding model installed as `Settings.embed_model`.
+
+The hybrid retrievers (`HybridRetriever`, `SemanticSearch`, the retriever of
+`EnhanceChatEngine`) and the answer cache each embed their query on their own,
+and a ReAct run often retrieves the same string several times. `CachedEmbedding`
+answers repeated queries from the process-wide `embedding_cache` and sends only
+the misses to the wrapped model; concurrent misses of the same query share one call.
+"""
+
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List
+)
+from llama_index.core.base.embeddings.base import (
+    BaseEmbedding,
+    Embedding
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.callbacks import CallbackManager
+
+from src.storage.embedding_cache import (
+    EmbeddingCache,
+    embedding_cache,
+    normalize_query
+)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model with a cache of its query embeddings.
+
+    Text embeddings, computed when documents are indexed, are not cached. The
+    wrapper reports no callback events of its own: the wrapped model still
+    reports every call that reaches the API.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _inflight: Dict[str, asyncio.Future] = PrivateAttr()
+    _coalesced: int = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache: EmbeddingCache = embedding_cache,
+        **kwargs: Any
+    ) -> None:
+        """
+        Initializes the CachedEmbedding.
+
+        Args:
+            embed_model (BaseEmbedding): The model computing the embeddings.
+            cache (EmbeddingCache): The cache, the process-wide one by default.
+        """
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=CallbackManager([]),
+            **kwargs
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+        self._inflight = {}
+        self._coalesced = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        """
+        The name of the class, as serialized by llama_index.
+        """
+        return "CachedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """
+        The wrapped embedding model.
+        """
+        return self._embed_model
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Counters of the cache, plus the misses that waited for a concurrent call.
+        """
+        return {
+            **self._cache.stats,
+            "coalesced": self._coalesced
+        }
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        """
+        Embeds a query, from the cache when possible.
+        """
+        embedding = self._cache.get(self.model_name, query)
+        if embedding is None:
+            embedding = self._embed_model.get_query_embedding(query)
+            self._cache.put(self.model_name, query, embedding)
+
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        """
+        Embeds a query, from the cache when possible, sharing the call of a
+        concurrent miss on the same query.
+
+        The in-memory LRU is read on the event loop; the SQLite file, when
+        there is one, is read and written in a thread.
+        """
+        embedding = self._cache.lookup(self.model_name, query)
+        if embedding is not None:
+            return embedding
+
+        key = normalize_query(query)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                embedding = await asyncio.shield(pending)
+                self._coalesced += 1
+                return list(embedding)
+            except asyncio.CancelledError:
+                # Only the request that made the call was cancelled: call again.
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        embedded = False
+        try:
+            if self._cache.persistent:
+                embedding = await asyncio.to_thread(self._cache.load, self.model_name, query)
+            else:
+                embedding = self._cache.load(self.model_name, query)
+            if embedding is None:
+                embedding = await self._embed_model.aget_query_embedding(query)
+                self._cache.remember(self.model_name, query, embedding)
+                embedded = True
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so that a call nobody waited for is not reported.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(embedding)
+        if embedded and self._cache.persistent:
+            await asyncio.to_thread(self._cache.persist, self.model_name, query, embedding)
+
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        """
+        Embeds a document text with the wrapped model.
+        """
+        return self._embed_model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        """
+        Embeds a document text with the wrapped model.
+        """
+        return await self._embed_model.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        """
+        Embeds document texts with the wrapped model.
+        """
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        """
+        Embeds document texts with the wrapped model.
+        """
+        return await self._embed_model.aget_text_embedding_batch(texts)
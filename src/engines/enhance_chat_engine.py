@@ -8,7 +8,8 @@ import json
 from typing import (
     List,
     Any,
-    Dict
+    Dict,
+    Optional
 )
 from llama_index.llms.openai import OpenAI
 from llama_index.core.retrievers import BaseRetriever
@@ -22,6 +23,8 @@ from src.prompt.instruction_prompt import (
     CHECK_PROMPT
 )
 from src.prompt.funny_chat_prompt import PROMPT_ENHANCE_FUNNY_FLOW
+from src.engines.retriever_engine import build_hybrid_retriever
+from src.storage.local_index import LocalVectorIndex
 from src.repositories.chat_repository import ChatRepository
 
 
@@ -36,7 +39,8 @@ class EnhanceChatEngine:
         retriever: BaseRetriever = None,
         chat_memory_tracker: ChatRepository = None,
         token_limit: int = 1500,
-        index: Any = None
+        index: Any = None,
+        local_index: Optional[LocalVectorIndex] = None
     ) -> None:
         """
         Initializes the EnhanceChatEngine with specified components.
@@ -47,12 +51,14 @@ class EnhanceChatEngine:
             chat_memory_tracker (ChatRepository): The repository for chat memory.
             token_limit (int): The maximum token limit for chat memory.
             index (Any): The index for retrieval.
+            local_index (Optional[LocalVectorIndex]): The in-process mirror of the index, if any.
         """
         self._llm = llm
-        self._retriever = index.as_retriever(
-            vector_store_query_mode="hybrid",
+        self._retriever = build_hybrid_retriever(
+            index=index,
             similarity_top_k=10,
-            alpha=0.5
+            alpha=0.5,
+            local_index=local_index
         )
         self._memory = ChatMemoryBuffer.from_defaults(
             token_limit=token_limit
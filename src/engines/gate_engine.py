@@ -0,0 +1,167 @@
+"""
+This module decides which preprocessing gates start ahead of time.
+
+The language, prompt injection and domain gates are independent, but their
+results are checked in that order: the first gate that rejects a query decides
+the response. Running them one after the other never runs a gate that is not
+needed, while starting a gate before the previous ones have passed (pipelined
+mode) saves latency when the gate is needed and wastes its cost when it is not.
+
+`GateScheduler` measures the cost and the rejection rate of every gate and only
+starts a gate ahead of time when the latency expected to be saved outweighs the
+work expected to be wasted. Since the results are still checked in the same
+order, the decisions do not depend on the schedule.
+"""
+
+import os
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+from dotenv import load_dotenv
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+# "adaptive", "always" (every gate starts at once) or "never" (one after the other).
+PREPROCESS_GATE_SPECULATION = convert_value(os.getenv("PREPROCESS_GATE_SPECULATION", "adaptive"))
+# Number of runs of a gate before its statistics are trusted.
+PREPROCESS_GATE_WARMUP = convert_value(os.getenv("PREPROCESS_GATE_WARMUP", "100"))
+# Weight of a millisecond of wasted work against a millisecond of saved latency.
+PREPROCESS_GATE_WASTE_WEIGHT = convert_value(os.getenv("PREPROCESS_GATE_WASTE_WEIGHT", "1.0"))
+# Smoothing factor of the moving averages, so the schedule follows the traffic.
+PREPROCESS_GATE_SMOOTHING = convert_value(os.getenv("PREPROCESS_GATE_SMOOTHING", "0.02"))
+
+
+class GateScheduler:
+    """
+    Tracks the cost and rejection rate of ordered gates and picks the ones worth
+    starting ahead of time.
+    """
+
+    def __init__(
+        self,
+        gates: List[str],
+        speculation: str = PREPROCESS_GATE_SPECULATION,
+        warmup: int = PREPROCESS_GATE_WARMUP,
+        waste_weight: float = PREPROCESS_GATE_WASTE_WEIGHT,
+        smoothing: float = PREPROCESS_GATE_SMOOTHING
+    ) -> None:
+        """
+        Initializes the GateScheduler.
+
+        Args:
+            gates (List[str]): The gate names, in the order their results are checked.
+            speculation (str): "adaptive", "always" or "never".
+            warmup (int): Runs of a gate before its statistics are used; until
+                          then the gate is started ahead of time.
+            waste_weight (float): Cost of a millisecond of wasted work, in
+                                  milliseconds of latency.
+            smoothing (float): Weight of the newest observation in the moving averages.
+        """
+        if speculation not in ("adaptive", "always", "never"):
+            raise ValueError(f"Unknown gate speculation: {speculation}")
+
+        self._gates = list(gates)
+        self._speculation = speculation
+        self._warmup = warmup
+        self._waste_weight = waste_weight
+        self._smoothing = smoothing
+        self._cost_ms = {gate: 0.0 for gate in self._gates}
+        self._pass_rate = {gate: 1.0 for gate in self._gates}
+        self._counters = {
+            gate: {"runs": 0, "rejections": 0, "speculative": 0, "wasted": 0}
+            for gate in self._gates
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Per-gate runs, rejections, moving averages and speculation counters.
+        """
+        stats = {}
+
+        for gate, counters in self._counters.items():
+            for name, value in counters.items():
+                stats[f"{gate}_{name}"] = value
+            stats[f"{gate}_cost_ms"] = self._cost_ms[gate]
+            stats[f"{gate}_rejection_rate"] = 1.0 - self._pass_rate[gate]
+
+        return stats
+
+    def _average(self, current: float, value: float, runs: int) -> float:
+        """
+        Updates a moving average: a plain mean during the warm-up, then exponential.
+        """
+        weight = max(1.0 / runs, self._smoothing)
+
+        return current + weight * (value - current)
+
+    def record(self, gate: str, cost_ms: float, rejected: bool) -> None:
+        """
+        Records a gate whose result was checked.
+
+        Args:
+            gate (str): The gate name.
+            cost_ms (float): How long the gate took, in milliseconds.
+            rejected (bool): Whether the gate rejected the query.
+        """
+        counters = self._counters[gate]
+        counters["runs"] += 1
+        counters["rejections"] += rejected
+        self._cost_ms[gate] = self._average(self._cost_ms[gate], cost_ms, counters["runs"])
+        self._pass_rate[gate] = self._average(
+            self._pass_rate[gate], 0.0 if rejected else 1.0, counters["runs"]
+        )
+
+    def record_wasted(self, gate: str) -> None:
+        """
+        Records a gate started ahead of time whose result was not needed.
+        """
+        self._counters[gate]["wasted"] += 1
+
+    def _worth_starting(self, index: int) -> bool:
+        """
+        Whether the gate at `index` is worth starting before the previous ones passed.
+
+        With p the probability that every previous gate passes, starting early
+        saves the overlap of the gate with the previous ones when it is needed,
+        and wastes its whole cost otherwise.
+        """
+        gate = self._gates[index]
+        earlier = self._gates[:index]
+
+        if any(self._counters[name]["runs"] < self._warmup for name in self._gates[:index + 1]):
+            return True
+
+        reached = 1.0
+        for name in earlier:
+            reached *= self._pass_rate[name]
+        saved = min(self._cost_ms[gate], sum(self._cost_ms[name] for name in earlier))
+        wasted = self._cost_ms[gate] * self._waste_weight
+
+        return reached * saved >= (1.0 - reached) * wasted
+
+    def schedule(self) -> Tuple[List[str], List[str]]:
+        """
+        Splits the gates between those started at once and those started when reached.
+
+        The first gate is always started at once. The gates started at once are
+        listed most expensive first, so the slowest one gets a worker first.
+
+        Returns:
+            Tuple[List[str], List[str]]: The gates to start at once, and the others.
+        """
+        if self._speculation == "never":
+            return [], list(self._gates)
+
+        started = [self._gates[0]]
+        for index in range(1, len(self._gates)):
+            if self._speculation == "always" or self._worth_starting(index):
+                started.append(self._gates[index])
+                self._counters[self._gates[index]]["speculative"] += 1
+        started.sort(key=lambda gate: -self._cost_ms[gate])
+
+        return started, [gate for gate in self._gates if gate not in started]
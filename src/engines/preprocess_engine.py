@@ -2,14 +2,33 @@
 This module is used for preprocessing queries
 """
 
+import os
 import re
-from difflib import SequenceMatcher
-from typing import Any
-from underthesea import word_tokenize
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional
+)
+from dotenv import load_dotenv
 import torch
 import numpy as np
 
+from src.engines.classifier_engine import (
+    CLASSIFIER_BATCHING,
+    BatchedClassifier
+)
+from src.engines.gate_engine import (
+    PREPROCESS_GATE_SPECULATION,
+    GateScheduler
+)
+from src.engines.tokenize_engine import word_segmenter
 from src.models.preprocess import ProcessedData
+from src.utils.utility import convert_value
 from src.prompt.postprocessing_prompt import (
     RESPONSE_UNSUPPORTED_LANGUAGE,
     RESPONSE_PROMPT_INJECTION
@@ -23,6 +42,40 @@ from src.prompt.preprocessing_prompt import (
     PROMPT_INJECTION_PATTERNS,
     POTENTIAL_PROMPT_INJECTION_PATTERNS
 )
+from src.services.logger import DSCLogger
+from src.utils.text_patterns import (
+    EMOJI_PATTERN,
+    EMOTICON_PATTERN,
+    NON_VIETNAMESE_PATTERN,
+    SYMBOL_REPLACEMENTS,
+    WHITESPACE_PATTERN,
+    FillerWordRemover,
+    ShortChatMatcher,
+    SynonymMatcher,
+    vietnamese_word_ratio
+)
+
+load_dotenv()
+
+PREPROCESS_PIPELINED = convert_value(os.getenv("PREPROCESS_PIPELINED", "true"))
+PREPROCESS_MAX_WORKERS = convert_value(os.getenv("PREPROCESS_MAX_WORKERS", "4"))
+# Similarity a text needs to be treated as a short chat, and to get the canned
+# response of the matched chat instead of the default one.
+SHORT_CHAT_THRESHOLD = 0.85
+SHORT_CHAT_RESPONSE_THRESHOLD = 0.9
+# Share of words with a Vietnamese-only letter above which a text is taken as
+# Vietnamese without calling the language model, 0 to always call it.
+LANG_DETECT_VIETNAMESE_RATIO = convert_value(os.getenv("LANG_DETECT_VIETNAMESE_RATIO", "0.3"))
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class PreprocessQuestion:
@@ -38,7 +91,12 @@ class PreprocessQuestion:
         tonemark_tokenizer,
         prompt_injection_model,
         device_type,
-        label_list
+        label_list,
+        model_loader=None,
+        pipelined: bool = PREPROCESS_PIPELINED,
+        max_workers: int = PREPROCESS_MAX_WORKERS,
+        batching: bool = CLASSIFIER_BATCHING,
+        gate_speculation: str = PREPROCESS_GATE_SPECULATION
     ) -> None:
         """
         Initializes the model manager with various models and vectorizers.
@@ -53,17 +111,67 @@ class PreprocessQuestion:
             prompt_injection_vectorizer: The vectorizer associated with the prompt injection model.
             device_type: The type of device (e.g., 'cpu', 'cuda') used for model inference.
             label_list: A list of labels used in classification tasks.
+            model_loader: Loads the tonemark model and tokenizer on first use
+                          when they are not given.
+            pipelined: Whether the independent gates run concurrently.
+            max_workers: Size of the thread pool running the blocking stages.
+            batching: Whether concurrent requests share the classifier calls.
+            gate_speculation: In pipelined mode, which gates start before the
+                              previous ones passed: "adaptive", "always" or "never".
 
         Returns:
             None
         """
         self.domain_clf_model = domain_clf_model
         self.lang_detect_model = lang_detect_model
-        self.tonemark_model = tonemark_model
-        self.tonemark_tokenizer = tonemark_tokenizer
+        self._tonemark_model = tonemark_model
+        self._tonemark_tokenizer = tonemark_tokenizer
+        self._model_loader = model_loader
         self.prompt_injection_model = prompt_injection_model
         self.device_type = device_type
         self.label_list = label_list
+        self.gate_scheduler = GateScheduler(
+            ["language", "prompt_injection", "domain"],
+            speculation=gate_speculation if pipelined else "never"
+        )
+        self._synonym_matcher = SynonymMatcher(TERMS_DICT)
+        self._filler_remover = FillerWordRemover(FILLTER_WORDS)
+        self._short_chat_matcher = ShortChatMatcher(SHORT_CHAT)
+        self._word_segmenter = word_segmenter
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="preprocess"
+        )
+        # Concurrent requests are classified together; the decisions are unchanged.
+        self.domain_batcher = None
+        self.prompt_injection_batcher = None
+        if batching:
+            self.domain_batcher = BatchedClassifier(
+                domain_clf_model, executor=self._executor
+            )
+            self.prompt_injection_batcher = BatchedClassifier(
+                prompt_injection_model, executor=self._executor
+            )
+
+    @property
+    def tonemark_model(self):
+        """
+        The tonemark model, loaded on first access if it was not given.
+        """
+        if self._tonemark_model is None and self._model_loader is not None:
+            self._tonemark_model = self._model_loader.tone_model
+
+        return self._tonemark_model
+
+    @property
+    def tonemark_tokenizer(self):
+        """
+        The tokenizer of the tonemark model, loaded on first access if it was not given.
+        """
+        if self._tonemark_tokenizer is None and self._model_loader is not None:
+            self._tonemark_tokenizer = self._model_loader.tone_tokenizer
+
+        return self._tonemark_tokenizer
 
     # @staticmethod
     # def normalize_elonge_word(text):
@@ -124,24 +232,13 @@ class PreprocessQuestion:
             str: A text with specific symbols replaced by their corresponding descriptions
                 or removed, with extra spaces cleaned up.
         """
-        replacements = {
-            ">": " lớn hơn ",
-            "<": " bé hơn ",
-            "=": " bằng ",
-            "$": " ",
-            "#": " ",
-            "^": " ",
-            "/": " ",
-            "!": " "
-        }
-
-        for symbol, replacement in replacements.items():
+        for symbol, replacement in SYMBOL_REPLACEMENTS:
             text = text.replace(symbol, replacement)
 
         return " ".join(text.split())
 
-    @staticmethod
     def replace_synonyms(
+        self,
         text,
         synonym_dict: Any
     ) -> str:
@@ -155,16 +252,11 @@ class PreprocessQuestion:
         Returns:
             str: The text with synonyms replaced by their corresponding keywords.
         """
-        text = text.lower()
-
-        for keyword, synonyms in synonym_dict.items():
-            keyword = keyword.lower()
-            for synonym in synonyms:
-                synonym = synonym.strip().lower()
-                text = re.sub(r'\b{}\b'.format(
-                    re.escape(synonym)), keyword, text)
+        matcher = self._synonym_matcher
+        if synonym_dict is not matcher.source:
+            matcher = SynonymMatcher(synonym_dict)
 
-        return text
+        return matcher.replace(text.lower())
 
     @staticmethod
     def remove_emojis(text):
@@ -177,26 +269,10 @@ class PreprocessQuestion:
         Returns:
             str: The text with all emojis removed.
         """
-        emoji_pattern = re.compile(
-            "["
-            u"\U0001F600-\U0001F64F"
-            u"\U0001F300-\U0001F5FF"
-            u"\U0001F680-\U0001F6FF"
-            u"\U0001F700-\U0001F77F"
-            u"\U0001F780-\U0001F7FF"
-            u"\U0001F800-\U0001F8FF"
-            u"\U0001F900-\U0001F9FF"
-            u"\U0001FA00-\U0001FA6F"
-            u"\U0001FA70-\U0001FAFF"
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            "]+",
-            flags=re.UNICODE
-        )
-        return emoji_pattern.sub(r'', text)
+        return EMOJI_PATTERN.sub(r'', text)
 
-    @staticmethod
     def remove_filler_words(
+        self,
         text: str,
         filler_words: Any
     ):
@@ -210,16 +286,11 @@ class PreprocessQuestion:
         Returns:
             str: The text with the specified filler words removed and extra spaces cleaned up.
         """
-        text = text.lower()
+        remover = self._filler_remover
+        if filler_words is not remover.source:
+            remover = FillerWordRemover(filler_words)
 
-        for word in filler_words:
-            pattern = r'\b{}\b'.format(
-                re.escape(word.strip().lower())
-            )
-            text = re.sub(pattern, '', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        return text
+        return " ".join(remover.remove(text.lower()).split())
 
     @staticmethod
     def delete_non_vietnamese_characters(text):
@@ -233,9 +304,10 @@ class PreprocessQuestion:
         Returns:
             str: The text with non-Vietnamese characters removed.
         """
-        pattern = r"[0-9a-zA-ZaăâbcdđeêghiklmnoôơpqrstuưvxyàằầbcdđèềghìklmnòồờpqrstùừvxỳáắấbcdđéếghíklmnóốớpqrstúứvxýảẳẩbcdđẻểghỉklmnỏổởpqrstủửvxỷạặậbcdđẹệghịklmnọộợpqrstụựvxỵãẵẫbcdđẽễghĩklmnõỗỡpqrstũữvxỹAĂÂBCDĐEÊGHIKLMNOÔƠPQRSTUƯVXYÀẰẦBCDĐÈỀGHÌKLMNÒỒỜPQRSTÙỪVXỲÁẮẤBCDĐÉẾGHÍKLMNÓỐỚPQRSTÚỨVXÝẠẶẬBCDĐẸỆGHỊKLMNỌỘỢPQRSTỤỰVXỴẢẲẨBCDĐẺỂGHỈKLMNỎỔỞPQRSTỦỬVXỶÃẴẪBCDĐẼỄGHĨKLMNÕỖỠPQRSTŨỮVXỸ,._]"
+        if "]" not in text:
+            return text.strip()
 
-        return re.sub(rf'[^{pattern}\s]', '', text).strip()
+        return NON_VIETNAMESE_PATTERN.sub('', text).strip()
 
     @staticmethod
     def merge_tokens_and_preds(
@@ -325,23 +397,60 @@ class PreprocessQuestion:
         Returns:
             bool: True if prompt injection patterns are detected; False otherwise.
         """
+        is_injection = self._injection_pattern(text)
+
+        if is_injection is None:
+            return bool(self.prompt_injection_model.predict_proba(
+                [text]
+            )[0][0] >= 0.5)
+
+        return is_injection
+
+    async def is_prompt_injection_batched(
+        self,
+        text
+    ):
+        """
+        Same as `is_prompt_injection`, with the classifier call batched with
+        those of concurrent requests.
+
+        Args:
+            text (str): The input text to be checked.
+
+        Returns:
+            bool: True if prompt injection patterns are detected; False otherwise.
+        """
+        loop = asyncio.get_running_loop()
+        is_injection = await loop.run_in_executor(
+            self._executor, self._injection_pattern, text
+        )
+
+        if is_injection is None:
+            probabilities = await self.prompt_injection_batcher.predict_proba(text)
+            return bool(probabilities[0] >= 0.5)
+
+        return is_injection
+
+    @staticmethod
+    def _injection_pattern(text) -> Optional[bool]:
+        """
+        Checks the prompt injection patterns only: True on a known injection,
+        None when the prompt injection model has to decide, False otherwise.
+        """
         for pattern in PROMPT_INJECTION_PATTERNS:
             if re.search(pattern, text, re.IGNORECASE):
                 return True
 
         for pattern in POTENTIAL_PROMPT_INJECTION_PATTERNS:
             if re.search(pattern, text, re.IGNORECASE):
-                if self.prompt_injection_model.predict_proba(
-                    [text]
-                )[0][0] >= 0.5:
-                    return True
+                return None
 
         return False
 
     def detect_short_chat(
         self,
         text_input
-    ):
+    ) -> Optional[str]:
         """
         Detects if the input text is a short chat message based on patterns and emojis.
 
@@ -349,39 +458,27 @@ class PreprocessQuestion:
             text_input (str): The input text to be analyzed.
 
         Returns:
-            bool: True if the text is detected as a short chat message; False otherwise.
-        """
-        emoji_pattern = re.compile(
-            "["
-            u"\U0001F600-\U0001F64F"
-            u"\U0001F300-\U0001F5FF"
-            u"\U0001F680-\U0001F6FF"
-            u"\U0001F700-\U0001F77F"
-            u"\U0001F780-\U0001F7FF"
-            u"\U0001F800-\U0001F8FF"
-            u"\U0001F900-\U0001F9FF"
-            u"\U0001FA00-\U0001FA6F"
-            u"\U0001FA70-\U0001FAFF"
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            "]+",
-            flags=re.UNICODE
-        )
-
+            Optional[str]: The canned response to the short chat message,
+                           or None if the text is not a short chat message.
+        """
         normalized_text = text_input.lower().strip()
-        has_emoji = bool(emoji_pattern.search(normalized_text))
+        has_emoji = bool(EMOJI_PATTERN.search(normalized_text))
 
-        def is_similar(text1, text2, threshold=0.85):
-            return SequenceMatcher(None, text1, text2).ratio() >= threshold
-        matches_pattern = any(is_similar(normalized_text, pattern)
-                              for pattern in SHORT_CHAT)
+        best_match, best_ratio = self._short_chat_matcher.match(
+            normalized_text, threshold=SHORT_CHAT_THRESHOLD
+        )
+        matches_pattern = best_match is not None
         if has_emoji:
-            if matches_pattern or normalized_text == '':
-                return True
-        elif matches_pattern:
-            return True
+            is_short_chat = matches_pattern or normalized_text == ''
+        else:
+            is_short_chat = matches_pattern
 
-        return False
+        if not is_short_chat:
+            return None
+
+        return self._short_chat_response(
+            best_match, best_ratio, RESPONSE_DICT, SHORT_CHAT_RESPONSE_THRESHOLD
+        )
 
     def insert_accents(
         self,
@@ -441,17 +538,30 @@ class PreprocessQuestion:
         Returns:
             str: The response corresponding to the best match or a default message.
         """
-        input_text = input_text.lower().strip()
-        best_match = None
-        best_ratio = 0.0
+        matcher = self._short_chat_matcher
+        if short_chats is not matcher.source:
+            matcher = ShortChatMatcher(short_chats)
 
-        for chat in short_chats:
-            ratio = SequenceMatcher(None, input_text, chat).ratio()
-            if ratio > best_ratio and ratio >= threshold:
-                best_ratio = ratio
-                best_match = chat
+        best_match, best_ratio = matcher.match(
+            input_text.lower().strip(), threshold=threshold
+        )
+
+        return self._short_chat_response(
+            best_match, best_ratio, response_dict, threshold
+        )
 
-        if best_match and best_match in response_dict:
+    @staticmethod
+    def _short_chat_response(
+        best_match: Optional[str],
+        best_ratio: float,
+        response_dict: Dict[str, str],
+        threshold: float
+    ) -> str:
+        """
+        Returns the response of the best matching short chat if its ratio
+        reaches the threshold, or a default message.
+        """
+        if best_match and best_ratio >= threshold and best_match in response_dict:
             return response_dict[best_match]
 
         return "Mình chưa hiểu rõ ý bạn lắm."
@@ -471,7 +581,7 @@ class PreprocessQuestion:
         Returns:
             str: The cleaned and normalized text.
         """
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_PATTERN.sub(' ', text)
         text = self.delete_non_vietnamese_characters(text.lower())
         text = self.remove_filler_words(text, FILLTER_WORDS)
         text = self.remove_emojis(text)
@@ -496,8 +606,16 @@ class PreprocessQuestion:
                 Returns (None, 0) if no language is detected.
         """
         prediction = self.lang_detect_model.predict(text)
+
+        return self._most_likely_language(prediction[0], prediction[1])
+
+    @staticmethod
+    def _most_likely_language(labels, scores):
+        """
+        Returns the most likely language and its score from a fastText prediction.
+        """
         lang_scores = {label.replace('__label__', ''): score for label, score in zip(
-            prediction[0], prediction[1]
+            labels, scores
         )}
 
         if lang_scores:
@@ -548,7 +666,7 @@ class PreprocessQuestion:
         Returns:
             list of str: A list of tokens (words) from the input text.
         """
-        tokens = word_tokenize(text, format='text')
+        tokens = self._word_segmenter.tokenize(text)
 
         return tokens
 
@@ -573,7 +691,36 @@ class PreprocessQuestion:
         score_prediction = self.domain_clf_model.predict_proba(
             [processed_text]
         )[0][1]
-        print(f"score domain: {score_prediction}")
+        log.debug("Domain score", score=float(score_prediction))
+
+        if score_prediction >= 0.6:
+            return 1
+
+        return 0
+
+    async def classify_domain_batched(
+        self,
+        text
+    ):
+        """
+        Same as `classify_domain`, with the classifier call batched with
+        those of concurrent requests.
+
+        Args:
+            text (str): The input text to classify.
+
+        Returns:
+            int: 1 if the text is out of the domain, 0 otherwise.
+        """
+        if len(text) <= 30:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        processed_text = await loop.run_in_executor(
+            self._executor, self.tokenize_text, text
+        )
+        score_prediction = (await self.domain_batcher.predict_proba(processed_text))[1]
+        log.debug("Domain score", score=float(score_prediction))
 
         if score_prediction >= 0.6:
             return 1
@@ -593,27 +740,117 @@ class PreprocessQuestion:
         Returns:
             bool: True if the text contains an emoji or emoticon; otherwise, False.
         """
-        emoji_pattern = re.compile(
-            "["
-            u"\U0001F600-\U0001F64F"
-            u"\U0001F300-\U0001F5FF"
-            u"\U0001F680-\U0001F6FF"
-            u"\U0001F700-\U0001F77F"
-            u"\U0001F780-\U0001F7FF"
-            u"\U0001F800-\U0001F8FF"
-            u"\U0001F900-\U0001F9FF"
-            u"\U0001FA00-\U0001FA6F"
-            u"\U0001FA70-\U0001FAFF"
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            "]+",
-            flags=re.UNICODE
-        )
+        return self.is_only_icon(text)
+
+    @staticmethod
+    def is_only_icon(text: str) -> bool:
+        """
+        Checks whether the text is a single run of emojis or an emoticon.
+
+        Args:
+            text (str): The text to be checked.
+
+        Returns:
+            bool: True if the text contains an emoji or emoticon only.
+        """
+        return bool(EMOJI_PATTERN.fullmatch(
+            text) or EMOTICON_PATTERN.fullmatch(text))
 
-        emoticon_pattern = re.compile(r"(:|=|;)(\)+|\(+|D+|P+)")
+    def is_vietnamese(
+        self,
+        text: str
+    ) -> bool:
+        """
+        Checks whether the detected language of the text is Vietnamese.
+
+        Texts where enough words carry a Vietnamese-only letter are accepted
+        without calling the language model.
+
+        Args:
+            text (str): The cleaned input text.
+
+        Returns:
+            bool: True if the text is detected as Vietnamese.
+        """
+        if self._is_clearly_vietnamese(text):
+            return True
 
-        return bool(emoji_pattern.fullmatch(
-            text) or emoticon_pattern.fullmatch(text))
+        lang, _ = self.lang_detect_2(text)
+
+        return lang == "vie_Latn"
+
+    @staticmethod
+    def _is_clearly_vietnamese(text: str) -> bool:
+        """
+        Whether enough words of the text carry letters only Vietnamese uses for the
+        language model to be skipped.
+        """
+        if LANG_DETECT_VIETNAMESE_RATIO <= 0:
+            return False
+
+        return vietnamese_word_ratio(text) >= LANG_DETECT_VIETNAMESE_RATIO
+
+    @staticmethod
+    def _timed(
+        name: str,
+        timings: Dict[str, float],
+        func: Callable,
+        *args
+    ) -> Any:
+        """
+        Runs a stage and records its duration in milliseconds.
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
+
+    async def _run_stage(
+        self,
+        name: str,
+        timings: Dict[str, float],
+        func: Callable,
+        *args
+    ) -> Any:
+        """
+        Runs a blocking stage on the preprocessing thread pool.
+
+        Args:
+            name (str): The name under which the stage duration is reported.
+            timings (Dict[str, float]): The per-stage timings of the request.
+            func (Callable): The stage to run.
+            *args: Arguments of the stage.
+
+        Returns:
+            Any: The result of the stage.
+        """
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self._executor,
+            self._timed,
+            name,
+            timings,
+            func,
+            *args
+        )
+
+    @staticmethod
+    async def _run_async_stage(
+        name: str,
+        timings: Dict[str, float],
+        func: Callable,
+        *args
+    ) -> Any:
+        """
+        Runs a stage that is a coroutine and records its duration in milliseconds.
+        """
+        start = time.perf_counter()
+        try:
+            return await func(*args)
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
 
     async def preprocess_text(
         self,
@@ -623,91 +860,237 @@ class PreprocessQuestion:
         Preprocesses the input text to classify it and detect various conditions
         such as short chat, language, and prompt injection.
 
+        Every blocking stage runs on the preprocessing thread pool. In pipelined mode
+        the language, prompt injection and domain gates that `gate_scheduler` finds
+        worth it run concurrently once the text is cleaned; their results are still
+        checked in that order, so the decision is the same as in sequential mode.
+
         Args:
             text_input (str): The input text to preprocess.
 
         Returns:
-            Union[ShortChat, UnsupportedLanguage, PromptInjection, ProcessedData]: 
-                - ShortChat if the text is detected as a short chat.
-                - UnsupportedLanguage if the detected language is not supported.
-                - PromptInjection if prompt injection is detected.
-                - ProcessedData with various flags and processed text otherwise.
-        """
-        query = ""
-        language = True
-        prompt_injection = False
-        outdomain = False
-        short_chat = False
+            ProcessedData: The processed text, the flags raised by the gates
+                           and the duration of each stage in milliseconds.
+        """
+        timings = {}
+        start = time.perf_counter()
+
+        def processed(**kwargs) -> ProcessedData:
+            timings["total"] = (time.perf_counter() - start) * 1000
+            fields = {
+                "language": True,
+                "is_prompt_injection": False,
+                "is_outdomain": False,
+                "is_short_chat": False,
+                "is_only_icon": False,
+                **kwargs
+            }
+            return ProcessedData(stage_timings=timings, **fields)
 
         if await self.detect_icon(text_input):
-            return ProcessedData(
-                query=text_input,
-                language=True,
-                is_prompt_injection=False,
-                is_outdomain=False,
-                is_short_chat=False,
-                is_only_icon=True
-            )
+            return processed(query=text_input, is_only_icon=True)
 
-        clean_text_input = self.clean_text(text_input, TERMS_DICT)
-        is_short_chat = self.detect_short_chat(clean_text_input)
+        clean_text_input = await self._run_stage(
+            "clean_text", timings, self.clean_text, text_input, TERMS_DICT
+        )
+        short_chat_response = await self._run_stage(
+            "short_chat", timings, self.detect_short_chat, clean_text_input
+        )
 
-        if is_short_chat:
-            query = self.get_response(
-                clean_text_input,
-                SHORT_CHAT,
-                RESPONSE_DICT,
-                threshold=0.9
-            )
-            return ProcessedData(
-                query=query,
-                language=language,
-                is_prompt_injection=prompt_injection,
-                is_outdomain=outdomain,
-                is_short_chat=is_short_chat,
-                is_only_icon=False
-            )
+        if short_chat_response is not None:
+            return processed(query=short_chat_response, is_short_chat=True)
 
-        if short_chat is False:
-            lang, _ = self.lang_detect_2(clean_text_input)
-            corrected_text = clean_text_input
-            if lang != "vie_Latn":
-                language = False
-                return ProcessedData(
+        gates = {
+            "language": self.is_vietnamese,
+            "prompt_injection": self.is_prompt_injection,
+            "domain": self.classify_domain
+        }
+        if self.domain_batcher is not None:
+            gates["prompt_injection"] = self.is_prompt_injection_batched
+            gates["domain"] = self.classify_domain_batched
+
+        def stage(name):
+            gate = gates[name]
+            if asyncio.iscoroutinefunction(gate):
+                return self._run_async_stage(name, timings, gate, clean_text_input)
+            return self._run_stage(name, timings, gate, clean_text_input)
+
+        # The gates worth it start at once, the others when their turn comes;
+        # the results are checked in the same order either way.
+        started, _ = self.gate_scheduler.schedule()
+        stages = {name: asyncio.ensure_future(stage(name)) for name in started}
+
+        async def check(name, rejects):
+            result = await (stages.pop(name) if name in stages else stage(name))
+            rejected = rejects(result)
+            self.gate_scheduler.record(name, timings.get(name, 0.0), rejected)
+            return result, rejected
+
+        try:
+            _, rejected = await check("language", lambda language: not language)
+            if rejected:
+                return processed(
                     query=RESPONSE_UNSUPPORTED_LANGUAGE,
-                    language=language,
-                    is_prompt_injection=prompt_injection,
-                    is_outdomain=outdomain,
-                    is_short_chat=short_chat,
-                    is_only_icon=False
+                    language=False
                 )
 
-            if language:
-                if self.is_prompt_injection(corrected_text):
-                    prompt_injection = True
-                    return ProcessedData(
-                        query=RESPONSE_PROMPT_INJECTION,
-                        language=language,
-                        is_prompt_injection=prompt_injection,
-                        is_outdomain=outdomain,
-                        is_short_chat=short_chat,
-                        is_only_icon=False
-                    )
-                domain = self.classify_domain(corrected_text)
-                if domain == 1:
-                    outdomain = True
-                if language and not outdomain:
-                    query = corrected_text
-                else:
-                    query = corrected_text
-            else:
-                query = text_input
-
-        return ProcessedData(
-            query=query,
-            language=language,
-            is_prompt_injection=prompt_injection,
-            is_outdomain=outdomain,
-            is_short_chat=short_chat,
-            is_only_icon=False
+            _, rejected = await check("prompt_injection", bool)
+            if rejected:
+                return processed(
+                    query=RESPONSE_PROMPT_INJECTION,
+                    is_prompt_injection=True
+                )
+
+            domain, _ = await check("domain", lambda domain: domain == 1)
+
+        finally:
+            # Gates that are no longer needed are dropped, short-circuiting the request.
+            for name, future in stages.items():
+                self.gate_scheduler.record_wasted(name)
+                if not future.cancel() and not future.cancelled():
+                    future.exception()
+
+        return processed(
+            query=clean_text_input,
+            is_outdomain=domain == 1
         )
+
+    def preprocess_batch(
+        self,
+        text_inputs: List[str]
+    ) -> List[ProcessedData]:
+        """
+        Preprocesses a list of queries, running each classifier once on the whole
+        list instead of once per query.
+
+        Every query gets the same decision as with `preprocess_text`: a query
+        only reaches a gate if it passed the previous ones, in the same order.
+        Meant for offline evaluation and traffic replay, it runs on the calling
+        thread; the stage timings of each result are the batch stage durations
+        amortized over the queries that went through the stage.
+
+        Args:
+            text_inputs (List[str]): The input texts to preprocess.
+
+        Returns:
+            List[ProcessedData]: The processed queries, in the order of the inputs.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(text_inputs)
+        timings: List[Dict[str, float]] = [{} for _ in text_inputs]
+
+        def run_stage(name, indexes, func):
+            start = time.perf_counter()
+            output = func(indexes)
+            elapsed = (time.perf_counter() - start) * 1000
+            for index in indexes:
+                timings[index][name] = elapsed / len(indexes)
+            return output
+
+        def finish(index, **kwargs):
+            results[index] = kwargs
+
+        pending = []
+        for index, text_input in enumerate(text_inputs):
+            if self.is_only_icon(text_input):
+                finish(index, query=text_input, is_only_icon=True)
+            else:
+                pending.append(index)
+
+        clean_texts = {}
+        if pending:
+            clean_texts = run_stage("clean_text", pending, lambda indexes: {
+                index: self.clean_text(text_inputs[index], TERMS_DICT)
+                for index in indexes
+            })
+
+        responses = {}
+        if pending:
+            responses = run_stage("short_chat", pending, lambda indexes: {
+                index: self.detect_short_chat(clean_texts[index])
+                for index in indexes
+            })
+        for index in pending:
+            if responses[index] is not None:
+                finish(index, query=responses[index], is_short_chat=True)
+        pending = [index for index in pending if results[index] is None]
+
+        def languages(indexes):
+            detected = {
+                index: "vie_Latn" for index in indexes
+                if self._is_clearly_vietnamese(clean_texts[index])
+            }
+            undetected = [index for index in indexes if index not in detected]
+            if undetected:
+                labels, scores = self.lang_detect_model.predict(
+                    [clean_texts[index] for index in undetected]
+                )
+                for position, index in enumerate(undetected):
+                    detected[index] = self._most_likely_language(
+                        labels[position], scores[position]
+                    )[0]
+            return detected
+
+        if pending:
+            detected = run_stage("language", pending, languages)
+            for index in pending:
+                if detected[index] != "vie_Latn":
+                    finish(index, query=RESPONSE_UNSUPPORTED_LANGUAGE, language=False)
+            pending = [index for index in pending if results[index] is None]
+
+        def injections(indexes):
+            flags = {index: self._injection_pattern(clean_texts[index]) for index in indexes}
+            undecided = [index for index in indexes if flags[index] is None]
+            if undecided:
+                scores = self.prompt_injection_model.predict_proba(
+                    [clean_texts[index] for index in undecided]
+                )[:, 0]
+                for index, score in zip(undecided, scores):
+                    flags[index] = bool(score >= 0.5)
+            return flags
+
+        if pending:
+            flagged = run_stage("prompt_injection", pending, injections)
+            for index in pending:
+                if flagged[index]:
+                    finish(index, query=RESPONSE_PROMPT_INJECTION, is_prompt_injection=True)
+            pending = [index for index in pending if results[index] is None]
+
+        def domains(indexes):
+            # Short queries are in domain without asking the classifier.
+            long_indexes = [index for index in indexes if len(clean_texts[index]) > 30]
+            outdomain = {index: False for index in indexes}
+            if long_indexes:
+                scores = self.domain_clf_model.predict_proba(
+                    self._word_segmenter.tokenize_many(
+                        [clean_texts[index] for index in long_indexes]
+                    )
+                )[:, 1]
+                for index, score in zip(long_indexes, scores):
+                    outdomain[index] = bool(score >= 0.6)
+            return outdomain
+
+        if pending:
+            outdomain = run_stage("domain", pending, domains)
+            for index in pending:
+                finish(
+                    index,
+                    query=clean_texts[index],
+                    is_outdomain=outdomain[index]
+                )
+
+        processed = []
+        for fields, stage_timings in zip(results, timings):
+            stage_timings["total"] = sum(stage_timings.values())
+            processed.append(ProcessedData(
+                stage_timings=stage_timings,
+                **{
+                    "language": True,
+                    "is_prompt_injection": False,
+                    "is_outdomain": False,
+                    "is_short_chat": False,
+                    "is_only_icon": False,
+                    **fields
+                }
+            ))
+
+        return processed
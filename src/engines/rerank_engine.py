@@ -0,0 +1,315 @@
+"""
+This module reranks the nodes returned by the hybrid retrievers.
+
+The retrievers return the top 10 nodes of a hybrid query; a reranker scores
+them again, more precisely, and keeps the best RERANK_TOP_N, so fewer and
+better nodes reach the LLM. Two rerankers run on the CPU:
+
+- `FusionReranker` fuses the exact cosine similarity of the query and node
+  embeddings with a BM25 score, using the statistics of the local index when
+  there is one. It costs well under a millisecond.
+- `CrossEncoderReranker` scores every (query, node) pair with a small
+  multilingual cross-encoder, e.g. cross-encoder/mmarco-mMiniLMv2-L12-H384-v1.
+
+Both score the nodes in rank order, batch by batch, and stop when the time
+budget of the request is spent: the nodes not scored keep their place after
+the scored ones.
+"""
+
+import os
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional
+)
+from dotenv import load_dotenv
+import numpy as np
+import torch
+from llama_index.core import Settings
+from llama_index.core.bridge.pydantic import (
+    Field,
+    PrivateAttr
+)
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import (
+    MetadataMode,
+    NodeWithScore,
+    QueryBundle
+)
+
+from src.storage.local_index import (
+    BM25_B,
+    BM25_K1,
+    LocalVectorIndex,
+    normalize_scores,
+    tokenize
+)
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+# "none", "fusion" or "cross_encoder".
+RERANKER = convert_value(os.getenv("RERANKER", "none"))
+RERANK_TOP_N = convert_value(os.getenv("RERANK_TOP_N", "5"))
+RERANK_TIME_BUDGET_MS = convert_value(os.getenv("RERANK_TIME_BUDGET_MS", "150"))
+RERANK_BATCH_SIZE = convert_value(os.getenv("RERANK_BATCH_SIZE", "4"))
+# Weight of the embedding similarity in the fusion, 1 - weight for BM25.
+RERANK_FUSION_ALPHA = convert_value(os.getenv("RERANK_FUSION_ALPHA", "0.5"))
+RERANK_MAX_LENGTH = convert_value(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+
+class BudgetedReranker(BaseNodePostprocessor):
+    """
+    Reranks nodes batch by batch within a time budget, keeping the best `top_n`.
+    """
+
+    top_n: int = Field(default=RERANK_TOP_N, description="Nodes kept.")
+    time_budget_ms: float = Field(
+        default=RERANK_TIME_BUDGET_MS,
+        description="Time after which no new batch is scored; the first always is."
+    )
+    batch_size: int = Field(default=RERANK_BATCH_SIZE, description="Nodes scored at once.")
+
+    _counters: Dict = PrivateAttr()
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initializes the BudgetedReranker.
+        """
+        super().__init__(**kwargs)
+        self._counters = {
+            "calls": 0,
+            "scored": 0,
+            "over_budget": 0,
+            "time_ms": 0.0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Calls, scored nodes, calls cut short by the budget and total time.
+        """
+        return dict(self._counters)
+
+    def _score(self, query_bundle: QueryBundle, nodes: List[NodeWithScore]) -> List[float]:
+        """
+        Scores a batch of nodes against the query, higher is more relevant.
+        """
+        raise NotImplementedError
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        """
+        Reranks the nodes and keeps the best `top_n`.
+        """
+        if query_bundle is None or not nodes:
+            return nodes[:self.top_n]
+
+        start = time.perf_counter()
+        deadline = start + self.time_budget_ms / 1000
+        self._counters["calls"] += 1
+        scored = []
+
+        for offset in range(0, len(nodes), self.batch_size):
+            if offset and time.perf_counter() >= deadline:
+                self._counters["over_budget"] += 1
+                break
+            batch = nodes[offset:offset + self.batch_size]
+            scored.extend(
+                NodeWithScore(node=node.node, score=float(score))
+                for node, score in zip(batch, self._score(query_bundle, batch))
+            )
+
+        self._counters["scored"] += len(scored)
+        scored.sort(key=lambda node: -node.score)
+        self._counters["time_ms"] += (time.perf_counter() - start) * 1000
+
+        return (scored + nodes[len(scored):])[:self.top_n]
+
+
+class FusionReranker(BudgetedReranker):
+    """
+    Scores nodes by a weighted sum of their normalized cosine similarity and BM25.
+
+    With a local index, the vectors and the BM25 statistics come from it;
+    otherwise the node embeddings (or, without them, the retrieval scores)
+    stand for the similarity and BM25 uses the statistics of the candidates.
+    """
+
+    alpha: float = Field(default=RERANK_FUSION_ALPHA, description="Weight of the similarity.")
+    # The budget is for a single batch: the fusion needs every candidate at once.
+    batch_size: int = Field(default=1000, description="Nodes scored at once.")
+
+    _local_index: Optional[LocalVectorIndex] = PrivateAttr()
+
+    def __init__(self, local_index: Optional[LocalVectorIndex] = None, **kwargs: Any) -> None:
+        """
+        Initializes the FusionReranker.
+
+        Args:
+            local_index (Optional[LocalVectorIndex]): The in-process mirror of the
+                                                      knowledge base, if any.
+        """
+        super().__init__(**kwargs)
+        self._local_index = local_index
+
+    @classmethod
+    def class_name(cls) -> str:
+        """
+        The name of the class, as serialized by llama_index.
+        """
+        return "FusionReranker"
+
+    @staticmethod
+    def _candidate_bm25(query: str, nodes: List[NodeWithScore]) -> np.ndarray:
+        """
+        BM25 scores of the nodes, with the statistics of the nodes themselves.
+        """
+        documents = [tokenize(node.node.get_content(metadata_mode=MetadataMode.NONE))
+                     for node in nodes]
+        lengths = np.array([len(terms) for terms in documents], dtype=np.float32)
+        mean_length = max(float(lengths.mean()), 1.0)
+        scores = np.zeros(len(nodes), dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            counts = np.array([terms.count(term) for terms in documents], dtype=np.float32)
+            frequency = np.count_nonzero(counts)
+            if not frequency:
+                continue
+            idf = np.log(1 + (len(nodes) - frequency + 0.5) / (frequency + 0.5))
+            scores += idf * counts * (BM25_K1 + 1) / (
+                counts + BM25_K1 * (1 - BM25_B + BM25_B * lengths / mean_length)
+            )
+
+        return scores
+
+    def _similarities(self, embedding: List[float], nodes: List[NodeWithScore]) -> np.ndarray:
+        """
+        Cosine similarities of the node embeddings, or the retrieval scores.
+        """
+        if any(node.node.embedding is None for node in nodes):
+            return np.array([node.score or 0.0 for node in nodes], dtype=np.float32)
+
+        vectors = np.asarray([node.node.embedding for node in nodes], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(embedding, dtype=np.float32)
+
+        return vectors @ (query / max(np.linalg.norm(query), 1e-12))
+
+    def _score(self, query_bundle: QueryBundle, nodes: List[NodeWithScore]) -> List[float]:
+        """
+        Fuses the normalized similarity and BM25 scores of the nodes.
+        """
+        embedding = query_bundle.embedding
+        if embedding is None:
+            # The retrievers and the retrieval cache leave it on the bundle; only a
+            # retriever that did not embed the query, e.g. BM25 alone, gets here.
+            embedding = Settings.embed_model.get_query_embedding(query_bundle.query_str)
+
+        similarities = bm25 = None
+        if self._local_index is not None:
+            similarities, bm25 = self._local_index.score_nodes(
+                query_bundle.query_str, embedding, [node.node.node_id for node in nodes]
+            )
+            if np.isnan(similarities).any():
+                similarities = bm25 = None
+        if similarities is None:
+            similarities = self._similarities(embedding, nodes)
+            bm25 = self._candidate_bm25(query_bundle.query_str, nodes)
+
+        return list(
+            self.alpha * normalize_scores(similarities) + (1 - self.alpha) * normalize_scores(bm25)
+        )
+
+
+class CrossEncoderReranker(BudgetedReranker):
+    """
+    Scores (query, node) pairs with a sequence classification cross-encoder.
+    """
+
+    max_length: int = Field(default=RERANK_MAX_LENGTH, description="Tokens per pair.")
+
+    _tokenizer: Any = PrivateAttr()
+    _model: Any = PrivateAttr()
+    _device: Any = PrivateAttr()
+
+    def __init__(self, tokenizer: Any, model: Any, device: Any, **kwargs: Any) -> None:
+        """
+        Initializes the CrossEncoderReranker.
+
+        Args:
+            tokenizer (Any): The tokenizer of the cross-encoder.
+            model (Any): The cross-encoder, in evaluation mode.
+            device (torch.device): The device the model is on.
+        """
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer
+        self._model = model
+        self._device = device
+
+    @classmethod
+    def class_name(cls) -> str:
+        """
+        The name of the class, as serialized by llama_index.
+        """
+        return "CrossEncoderReranker"
+
+    def _score(self, query_bundle: QueryBundle, nodes: List[NodeWithScore]) -> List[float]:
+        """
+        Runs the cross-encoder on a batch of (query, node text) pairs.
+        """
+        inputs = self._tokenizer(
+            [query_bundle.query_str] * len(nodes),
+            [node.node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt"
+        ).to(self._device)
+
+        with torch.inference_mode():
+            logits = self._model(**inputs).logits
+        # Probabilities, so the scores stay positive for the knapsack packing.
+        if logits.shape[-1] > 1:
+            scores = logits.softmax(dim=-1)[:, 1]
+        else:
+            scores = logits[:, 0].sigmoid()
+
+        return scores.float().cpu().tolist()
+
+
+def build_reranker(
+    kind: str = RERANKER,
+    local_index: Optional[LocalVectorIndex] = None,
+    model_loader: Any = None
+) -> Optional[BudgetedReranker]:
+    """
+    Builds the configured reranker.
+
+    Args:
+        kind (str): "none", "fusion" or "cross_encoder".
+        local_index (Optional[LocalVectorIndex]): The local index, used by the fusion.
+        model_loader (ModelLoader): Holds the cross-encoder.
+
+    Returns:
+        Optional[BudgetedReranker]: The reranker, None for "none".
+    """
+    if kind == "none":
+        return None
+    if kind == "fusion":
+        return FusionReranker(local_index=local_index)
+    if kind == "cross_encoder":
+        if "rerank_model" not in model_loader.status:
+            raise ValueError("The cross_encoder reranker needs RERANK_MODEL")
+        return CrossEncoderReranker(
+            tokenizer=model_loader.rerank_tokenizer,
+            model=model_loader.rerank_model,
+            device=model_loader.device
+        )
+
+    raise ValueError(f"Unknown reranker: {kind}")
@@ -1,25 +1,398 @@
 """
 This module defines the HybridRetriever class for retrieving documents
 using a hybrid approach combining vector search and traditional retrieval methods.
+
+With a `LocalVectorIndex`, the hybrid search runs in process: either always
+(LOCAL_INDEX_MODE=primary) or only while Weaviate fails (fallback). Results
+are cached in the `retrieval_cache` until the knowledge base changes.
 """
 
 import os
-from typing import List
+import time
+import asyncio
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
 from dotenv import load_dotenv
-import tiktoken
-from llama_index.core import VectorStoreIndex
-from llama_index.core.schema import TextNode
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import (
+    NodeWithScore,
+    QueryBundle,
+    TextNode
+)
 
+from src.engines.rerank_engine import BudgetedReranker
+from src.services.logger import DSCLogger
+from src.storage.local_index import (
+    LOCAL_INDEX_MODE,
+    LOCAL_INDEX_RETRY_INTERVAL,
+    LocalVectorIndex
+)
+from src.storage.retrieval_cache import (
+    RetrievalCache,
+    retrieval_cache
+)
+from src.utils.token_budget import (
+    CONTEXT_PACKING,
+    NODE_SEPARATOR,
+    get_encoding,
+    node_token_count,
+    pack,
+    render_node
+)
 from src.utils.utility import convert_value
 
 load_dotenv()
 
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
 MAX_TOKENS = convert_value(os.getenv('MAX_TOKENS'))
 VECTOR_STORE_QUERY_MODE = convert_value(os.getenv('VECTOR_STORE_QUERY_MODE'))
 SIMILARITY_TOP_K = convert_value(os.getenv('SIMILARITY_TOP_K'))
 ALPHA = convert_value(os.getenv('ALPHA'))
 THRESHOLD = convert_value(os.getenv('THRESHOLD'))
 
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
+
+class LocalHybridRetriever(BaseRetriever):
+    """
+    Retrieves nodes from a `LocalVectorIndex`, scored like a Weaviate hybrid query.
+    """
+
+    def __init__(
+        self,
+        local_index: LocalVectorIndex,
+        similarity_top_k: int = 10,
+        alpha: float = 0.65
+    ) -> None:
+        """
+        Initializes the LocalHybridRetriever.
+
+        Args:
+            local_index (LocalVectorIndex): The in-process index.
+            similarity_top_k (int): Number of nodes retrieved.
+            alpha (float): Weight of the vector search, 1 - alpha for BM25.
+        """
+        super().__init__(callback_manager=Settings.callback_manager)
+        self._local_index = local_index
+        self._similarity_top_k = similarity_top_k
+        self._alpha = alpha
+
+    def _search(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Searches the index with an already embedded query.
+        """
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, score in self._local_index.search(
+                query_bundle.query_str,
+                query_bundle.embedding,
+                top_k=self._similarity_top_k,
+                alpha=self._alpha
+            )
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Embeds the query if needed and searches the index.
+        """
+        if query_bundle.embedding is None and self._alpha > 0:
+            query_bundle.embedding = Settings.embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+
+        return self._search(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Embeds the query if needed and searches the index.
+        """
+        if query_bundle.embedding is None and self._alpha > 0:
+            query_bundle.embedding = await Settings.embed_model.aget_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+
+        return self._search(query_bundle)
+
+
+class FallbackRetriever(BaseRetriever):
+    """
+    Retrieves with a primary retriever, and with a fallback one when it fails.
+
+    After a failure the primary retriever is skipped for `retry_interval`
+    seconds, so an unreachable Weaviate does not delay every request by its
+    connection timeout.
+    """
+
+    def __init__(
+        self,
+        primary: BaseRetriever,
+        fallback: BaseRetriever,
+        retry_interval: float = LOCAL_INDEX_RETRY_INTERVAL
+    ) -> None:
+        """
+        Initializes the FallbackRetriever.
+
+        Args:
+            primary (BaseRetriever): The retriever used while it works.
+            fallback (BaseRetriever): The retriever used when it fails.
+            retry_interval (float): Seconds the primary retriever is skipped after a failure.
+        """
+        super().__init__(callback_manager=Settings.callback_manager)
+        self._primary = primary
+        self._fallback = fallback
+        self._retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._counters = {
+            "failures": 0,
+            "fallbacks": 0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Failures of the primary retriever and retrievals served by the fallback.
+        """
+        return dict(self._counters)
+
+    def _failed(self, error: Exception) -> None:
+        """
+        Records a failure of the primary retriever.
+        """
+        self._counters["failures"] += 1
+        self._retry_at = time.monotonic() + self._retry_interval
+        log.error(f"Retrieval failed, using the local index: {error}")
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves with the primary retriever, or the fallback one.
+        """
+        if time.monotonic() >= self._retry_at:
+            try:
+                return self._primary._retrieve(query_bundle)
+            except Exception as e:
+                self._failed(e)
+
+        self._counters["fallbacks"] += 1
+
+        return self._fallback._retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves with the primary retriever, or the fallback one.
+        """
+        if time.monotonic() >= self._retry_at:
+            try:
+                return await self._primary._aretrieve(query_bundle)
+            except Exception as e:
+                self._failed(e)
+
+        self._counters["fallbacks"] += 1
+
+        return await self._fallback._aretrieve(query_bundle)
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Answers repeated queries of a retriever from a `RetrievalCache`.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        cache: RetrievalCache,
+        similarity_top_k: int,
+        alpha: float
+    ) -> None:
+        """
+        Initializes the CachedRetriever.
+
+        Args:
+            retriever (BaseRetriever): The retriever called on a miss.
+            cache (RetrievalCache): The cache of results.
+            similarity_top_k (int): Number of nodes retrieved, part of the key.
+            alpha (float): Hybrid weight of the retriever, part of the key.
+        """
+        super().__init__(callback_manager=Settings.callback_manager)
+        self._retriever = retriever
+        self._cache = cache
+        self._similarity_top_k = similarity_top_k
+        self._alpha = alpha
+
+    @property
+    def retriever(self) -> BaseRetriever:
+        """
+        The retriever called on a miss.
+        """
+        return self._retriever
+
+    def _key(self, query_bundle: QueryBundle):
+        """
+        The cache key of a query, None if the query carries its own embedding.
+        """
+        if query_bundle.embedding is not None:
+            return None
+
+        return self._cache.key(
+            query_bundle.query_str,
+            tuple(query_bundle.custom_embedding_strs or ()),
+            self._similarity_top_k,
+            self._alpha
+        )
+
+    @staticmethod
+    def _hit(
+        query_bundle: QueryBundle,
+        entry: Tuple[List[NodeWithScore], Optional[List[float]]]
+    ) -> List[NodeWithScore]:
+        """
+        Returns the cached nodes, giving the query the embedding they were
+        retrieved with, so that a reranker does not embed it again.
+        """
+        nodes, embedding = entry
+        if embedding is not None:
+            query_bundle.embedding = embedding
+
+        return nodes
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves from the cache, or from the retriever on a miss.
+        """
+        key = self._key(query_bundle)
+        entry = self._cache.get_entry(key) if key is not None else None
+        if entry is not None:
+            return self._hit(query_bundle, entry)
+
+        version = self._cache.version
+        nodes = self._retriever._retrieve(query_bundle)
+        if key is not None:
+            self._cache.put(key, nodes, version, embedding=query_bundle.embedding)
+
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves from the cache, or from the retriever on a miss.
+        """
+        key = self._key(query_bundle)
+        entry = self._cache.get_entry(key) if key is not None else None
+        if entry is not None:
+            return self._hit(query_bundle, entry)
+
+        version = self._cache.version
+        nodes = await self._retriever._aretrieve(query_bundle)
+        if key is not None:
+            self._cache.put(key, nodes, version, embedding=query_bundle.embedding)
+
+        return nodes
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Reranks the nodes of a retriever with a `BudgetedReranker`.
+
+    The asynchronous path reranks in a worker thread, so neither the
+    cross-encoder nor the query embedding of the fusion blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        reranker: BudgetedReranker
+    ) -> None:
+        """
+        Initializes the RerankingRetriever.
+
+        Args:
+            retriever (BaseRetriever): The retriever whose nodes are reranked.
+            reranker (BudgetedReranker): The reranker.
+        """
+        super().__init__(callback_manager=Settings.callback_manager)
+        self._retriever = retriever
+        self._reranker = reranker
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves and reranks the nodes.
+        """
+        nodes = self._retriever._retrieve(query_bundle)
+
+        return self._reranker.postprocess_nodes(nodes, query_bundle=query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves the nodes, then reranks them in a worker thread.
+        """
+        nodes = await self._retriever._aretrieve(query_bundle)
+
+        return await asyncio.to_thread(
+            self._reranker.postprocess_nodes, nodes, query_bundle=query_bundle
+        )
+
+
+def build_hybrid_retriever(
+    index: VectorStoreIndex,
+    similarity_top_k: int,
+    alpha: float,
+    local_index: Optional[LocalVectorIndex] = None,
+    mode: str = LOCAL_INDEX_MODE,
+    cache: Optional[RetrievalCache] = retrieval_cache
+) -> BaseRetriever:
+    """
+    Builds a hybrid retriever over the knowledge base.
+
+    Args:
+        index (VectorStoreIndex): The Weaviate index.
+        similarity_top_k (int): Number of nodes retrieved.
+        alpha (float): Weight of the vector search, 1 - alpha for BM25.
+        local_index (Optional[LocalVectorIndex]): The in-process mirror, if any.
+        mode (str): "off", "fallback" or "primary".
+        cache (Optional[RetrievalCache]): Caches the results, unless None or disabled.
+
+    Returns:
+        BaseRetriever: The Weaviate retriever, the local one, or both, behind the cache.
+    """
+    if mode not in ("off", "fallback", "primary"):
+        raise ValueError(f"Unknown local index mode: {mode}")
+
+    retriever = index.as_retriever(
+        vector_store_query_mode="hybrid",
+        similarity_top_k=similarity_top_k,
+        alpha=alpha
+    )
+    if local_index is not None and mode != "off":
+        local_retriever = LocalHybridRetriever(
+            local_index=local_index,
+            similarity_top_k=similarity_top_k,
+            alpha=alpha
+        )
+        if mode == "primary":
+            retriever = local_retriever
+        else:
+            retriever = FallbackRetriever(primary=retriever, fallback=local_retriever)
+
+    if cache is None or not cache.enabled:
+        return retriever
+
+    return CachedRetriever(
+        retriever=retriever,
+        cache=cache,
+        similarity_top_k=similarity_top_k,
+        alpha=alpha
+    )
+
 
 class HybridRetriever:
     """
@@ -29,18 +402,47 @@ class HybridRetriever:
 
     def __init__(
         self,
-        index: VectorStoreIndex = None
+        index: VectorStoreIndex = None,
+        local_index: Optional[LocalVectorIndex] = None,
+        reranker: Optional[BudgetedReranker] = None
     ):
         """
         Initializes the HybridRetriever with the given configuration parameters.
+
+        Args:
+            index (VectorStoreIndex): The Weaviate index.
+            local_index (Optional[LocalVectorIndex]): Its in-process mirror, if any.
+            reranker (Optional[BudgetedReranker]): Reranks the retrieved nodes, if any.
         """
         self._index = index
-        self._encoding = tiktoken.get_encoding("cl100k_base")
-        self.retriever = self._index.as_retriever(
-            vector_store_query_mode="hybrid",
+        self._reranker = reranker
+        self._encoding = get_encoding()
+        self.retriever = build_hybrid_retriever(
+            index=self._index,
             similarity_top_k=10,
-            alpha=0.65
+            alpha=0.65,
+            local_index=local_index
         )
+        self._reranked_retriever = self.retriever
+        if self._reranker is not None:
+            self._reranked_retriever = RerankingRetriever(
+                retriever=self.retriever,
+                reranker=self._reranker
+            )
+
+    @property
+    def reranker(self) -> Optional[BudgetedReranker]:
+        """
+        The reranker applied to the retrieved nodes, None if disabled.
+        """
+        return self._reranker
+
+    @property
+    def reranked_retriever(self) -> BaseRetriever:
+        """
+        The hybrid retriever followed by the reranker, if any.
+        """
+        return self._reranked_retriever
 
     @property
     def token_counter(self):
@@ -55,32 +457,29 @@ class HybridRetriever:
     async def combine_retrieved_nodes(
         self,
         retrieved_nodes: List[TextNode],
-        max_tokens: int = MAX_TOKENS
+        max_tokens: int = MAX_TOKENS,
+        packing: str = CONTEXT_PACKING
     ) -> str:
         """
         Combines multiple retrieved TextNode objects into a single string.
         Args:
             retrieved_nodes (List[TextNode]): The list of TextNode objects to be combined.
             max_tokens (int, optional): The maximum number of tokens.
+            packing (str, optional): "greedy" stops at the first node that does not
+                                     fit, "knapsack" keeps the most relevant nodes that fit.
         Returns:
             str: The combined string of text nodes up to the token limit.
         """
-        combined_strings = ""
-        current_tokens = 0
-
-        for retrieved_node in retrieved_nodes:
-            text = retrieved_node.text
-            metadata = str(retrieved_node.metadata)
-            sub_combine = text + "\nmetadata:\n" + metadata
-            tokens = len(self._encoding.encode(sub_combine))
-
-            if tokens + current_tokens > max_tokens:
-                break
-
-            combined_strings = combined_strings + "\n" + "=" * 20 + "\n" + sub_combine
-            current_tokens += tokens
+        chosen = pack(
+            token_counts=[node_token_count(node) for node in retrieved_nodes],
+            scores=[getattr(node, "score", None) for node in retrieved_nodes],
+            max_tokens=max_tokens,
+            packing=packing
+        )
 
-        return combined_strings
+        return "".join(
+            NODE_SEPARATOR + render_node(retrieved_nodes[position]) for position in chosen
+        )
 
     async def retrieve_nodes(
         self,
@@ -96,7 +495,7 @@ class HybridRetriever:
             Tuple[str, List[TextNode]]: A tuple containing the combined text
                                          and the list of original TextNode objects.
         """
-        retrieved_nodes = await self.retriever.aretrieve(query)
+        retrieved_nodes = await self._reranked_retriever.aretrieve(query)
         combined_retrieved_nodes = await self.combine_retrieved_nodes(
             retrieved_nodes=retrieved_nodes,
         )
@@ -10,6 +10,7 @@ from llama_index.core import VectorStoreIndex
 from llama_index.core.schema import TextNode
 
 from src.utils.utility import convert_value
+from src.services.logger import DSCLogger
 
 load_dotenv()
 
@@ -19,6 +20,16 @@ ALPHA = convert_value(os.getenv('ALPHA'))
 MAX_TOKENS = convert_value(os.getenv('MAX_TOKENS'))
 THRESHOLD = convert_value(os.getenv('THRESHOLD'))
 
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
 
 class SemanticSearch:
     """
@@ -88,7 +99,7 @@ class SemanticSearch:
         retrieved_nodes = await self.retrieve_nodes(query=query)
 
         if retrieved_nodes:
-            print(f"the score: {retrieved_nodes[0].score}")
+            log.debug("Suggestion score", score=retrieved_nodes[0].score)
             if retrieved_nodes[0].score <= self._threshold:
                 return retrieved_nodes[0].metadata['answer']
 
@@ -0,0 +1,211 @@
+"""
+This module provides a memoized Vietnamese word segmenter.
+
+`underthesea.word_tokenize` runs a CRF model in pure Python and is the slowest
+CPU step of the preprocessing, while the same questions come back again and
+again. The segmentations are kept in a bounded LRU cache keyed on the cleaned
+text. Misses can also be sent to a pool of processes (TOKENIZE_PROCESSES), so
+the GIL-bound segmentation does not stall the other requests of the worker.
+"""
+
+import os
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    List
+)
+from dotenv import load_dotenv
+from underthesea import word_tokenize
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+TOKENIZE_CACHE_MAX_SIZE = convert_value(os.getenv("TOKENIZE_CACHE_MAX_SIZE", "8192"))
+TOKENIZE_CACHE_MAX_BYTES = convert_value(os.getenv("TOKENIZE_CACHE_MAX_BYTES", "16777216"))
+# Number of processes running the segmentation, 0 to run it on the calling thread.
+TOKENIZE_PROCESSES = convert_value(os.getenv("TOKENIZE_PROCESSES", "0"))
+
+
+def segment(text: str) -> str:
+    """
+    Segments a text into words, joining the syllables of a word with "_".
+    """
+    return word_tokenize(text, format='text')
+
+
+def _warm_up() -> None:
+    """
+    Loads the segmentation model when a pool process starts.
+    """
+    segment("xin chào")
+
+
+class WordSegmenter:
+    """
+    A bounded LRU cache in front of `underthesea.word_tokenize`, safe to use
+    from the preprocessing thread pool.
+    """
+
+    def __init__(
+        self,
+        max_size: int = TOKENIZE_CACHE_MAX_SIZE,
+        max_bytes: int = TOKENIZE_CACHE_MAX_BYTES,
+        processes: int = TOKENIZE_PROCESSES
+    ) -> None:
+        """
+        Initializes the WordSegmenter.
+
+        Args:
+            max_size (int): Maximum number of cached segmentations.
+            max_bytes (int): Maximum total size of the cached texts, in bytes.
+            processes (int): Size of the segmentation process pool, 0 for none.
+        """
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._processes = processes
+        self._entries: OrderedDict = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor = None
+        self._pool_pid = None
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and the current footprint of the cache.
+        """
+        lookups = self._counters["hits"] + self._counters["misses"]
+
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "bytes": self._total_bytes,
+            "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+            "processes": self._processes
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Returns the process pool of the current process, creating it if needed.
+
+        The pool is started with "spawn", since the worker that owns it already
+        runs threads, and is recreated in a process forked from its owner.
+        """
+        if self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self._processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_warm_up
+                    )
+                    self._pool_pid = os.getpid()
+
+        return self._pool
+
+    def _lookup(self, text: str):
+        """
+        Returns the cached segmentation of a text, or None.
+        """
+        with self._lock:
+            tokens = self._entries.get(text)
+            if tokens is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(text)
+            self._counters["hits"] += 1
+
+        return tokens
+
+    def _store(self, text: str, tokens: str) -> None:
+        """
+        Caches a segmentation, evicting the least recently used ones if needed.
+        """
+        size = len(text.encode("utf-8")) + len(tokens.encode("utf-8"))
+        if size > self._max_bytes:
+            return
+
+        with self._lock:
+            if text in self._entries:
+                return
+            self._entries[text] = tokens
+            self._total_bytes += size
+            while self._entries and (
+                len(self._entries) > self._max_size
+                or self._total_bytes > self._max_bytes
+            ):
+                evicted_text, evicted_tokens = self._entries.popitem(last=False)
+                self._total_bytes -= (
+                    len(evicted_text.encode("utf-8"))
+                    + len(evicted_tokens.encode("utf-8"))
+                )
+                self._counters["evictions"] += 1
+
+    def tokenize(self, text: str) -> str:
+        """
+        Segments a text into words, from the cache when possible.
+
+        Args:
+            text (str): The cleaned text.
+
+        Returns:
+            str: The text with the syllables of each word joined by "_".
+        """
+        tokens = self._lookup(text)
+        if tokens is not None:
+            return tokens
+
+        if self._processes:
+            tokens = self._get_pool().submit(segment, text).result()
+        else:
+            tokens = segment(text)
+        self._store(text, tokens)
+
+        return tokens
+
+    def tokenize_many(self, texts: List[str]) -> List[str]:
+        """
+        Segments a list of texts; with a process pool the misses run in parallel.
+
+        Args:
+            texts (List[str]): The cleaned texts.
+
+        Returns:
+            List[str]: The segmented texts, in order.
+        """
+        if not self._processes:
+            return [self.tokenize(text) for text in texts]
+
+        results = {}
+        for text in texts:
+            if text not in results:
+                results[text] = self._lookup(text)
+        misses = [text for text, tokens in results.items() if tokens is None]
+
+        if misses:
+            for text, tokens in zip(misses, self._get_pool().map(segment, misses)):
+                results[text] = tokens
+                self._store(text, tokens)
+
+        return [results[text] for text in texts]
+
+    def close(self) -> None:
+        """
+        Shuts the process pool down, if this process started one.
+        """
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._pool_pid = None
+
+
+word_segmenter = WordSegmenter()
@@ -2,7 +2,10 @@
 This module defines a data model for handling chat domain data using Pydantic.
 """
 
-from typing import List
+from typing import (
+    List,
+    Optional
+)
 from pydantic import BaseModel
 
 
@@ -21,6 +24,18 @@ class Chat(BaseModel):
     retrieved_nodes: List[str]
 
 
+class ChatDelta(BaseModel):
+    """
+    Represents a piece of a streamed chat response.
+
+    Attributes:
+        delta (str): The text generated since the previous piece.
+        is_outdomain (bool): Indicates if the response is outside the expected domain.
+    """
+    delta: str
+    is_outdomain: bool
+
+
 class ChatDomain(BaseModel):
     """
     A Pydantic model representing a chat domain entry.
@@ -32,6 +47,8 @@ class ChatDomain(BaseModel):
         time (str): The timestamp of when the query was processed.
         is_outdomain (bool): A flag indicating whether the query is outside 
                              the expected domain of questions.
+        token_count (Optional[int]): Tokens of the chat as written into the
+                                     history prompt; None for older chats.
     """
     Id: str
     room_id: str
@@ -40,3 +57,4 @@ class ChatDomain(BaseModel):
     retrieved_nodes: List[str]
     time: str
     is_outdomain: bool
+    token_count: Optional[int] = None
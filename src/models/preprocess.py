@@ -2,6 +2,7 @@
 this model provides a data model for representing a processed data entry
 """
 
+from typing import Dict
 from pydantic import BaseModel
 
 
@@ -14,6 +15,7 @@ class ProcessedData(BaseModel):
         language (bool): A flag indicating whether the language is detected
         is_prompt_injection (bool): A flag indicating if the query contains a prompt injection.
         is_outdomain (bool): A flag indicating if the query is outside the expected domain.
+        stage_timings (Dict[str, float]): Duration of each preprocessing stage, in milliseconds.
     """
     query: str
     language: bool
@@ -21,6 +23,7 @@ class ProcessedData(BaseModel):
     is_outdomain: bool
     is_short_chat: bool
     is_only_icon: bool
+    stage_timings: Dict[str, float] = {}
 
 
 class ShortChat(BaseModel):
@@ -8,7 +8,14 @@ from typing import (
 )
 
 from src.storage.chat_crud import CRUDChatCollection
+from src.storage.history_cache import HistoryCache
+from src.storage.batch_writer import BatchWriter
 from src.models.chat import ChatDomain
+from src.services.tracing import span
+from src.utils.token_budget import (
+    count_tokens,
+    history_record
+)
 from src.utils.utility import (
     create_new_id,
     get_datetime
@@ -20,12 +27,21 @@ class ChatRepository:
     A repository class for managing result documents in the question answering system.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        history_cache: HistoryCache = None
+    ):
         """
         Initializes the collection attribute with a CRUDResultCollection instance 
         and loads all data into the data attribute.
+
+        Args:
+            history_cache (HistoryCache, optional): The cache of the latest chats
+                                                    of each room.
         """
         self.collection = CRUDChatCollection()
+        self.history_cache = history_cache or HistoryCache()
+        self.writer = BatchWriter(collection=self.collection)
         self.data = self.load_all_data()
 
     def load_all_data(self):
@@ -52,13 +68,17 @@ class ChatRepository:
         """
         Add a new chat domain document to the collection.
 
+        The document is handed to the background writer when it is running,
+        so the caller does not wait for Mongo.
+
         Args:
             chat (ChatDomain): The chat document to be added.
 
         Returns:
             None
         """
-        self.collection.insert_one_doc(chat.__dict__)
+        if not self.writer.put(chat.model_dump()):
+            await self.collection.ainsert_one_doc(chat.model_dump())
 
     async def add_chat_domains(
         self,
@@ -92,10 +112,16 @@ class ChatRepository:
             answer=answer,
             retrieved_nodes=retrieved_nodes,
             time=timestamp,
-            is_outdomain=is_out_of_domain
+            is_outdomain=is_out_of_domain,
+            token_count=count_tokens(history_record(1, query, answer))
         )
 
-        await self.add_one_record(chat=chat_instance)
+        with span("persist"):
+            await self.add_one_record(chat=chat_instance)
+        self.history_cache.append(
+            room_id=room_id,
+            chat=chat_instance.model_dump()
+        )
 
     async def get_last_chat(
         self,
@@ -110,11 +136,29 @@ class ChatRepository:
         Returns:
             ChatDomain: The last five chat messages from the room.
         """
+        latest_chats = self.history_cache.get(room_id)
+
+        if latest_chats is not None:
+            return latest_chats
+
+        fill_id = self.history_cache.begin_fill(room_id)
         filter_obj = {"room_id": room_id}
-        latest_chats = await self.collection.find_with_filter(
+        stored_chats = await self.collection.find_with_filter(
             filter_obj=filter_obj,
             sort_by=("time", -1),
-            limit=5
+            limit=self.history_cache.history_length
+        )
+        # Chats still queued in the writer are newer than anything in Mongo.
+        pending_chats = list(reversed(self.writer.pending(room_id)))
+        pending_ids = {chat["Id"] for chat in pending_chats}
+        latest_chats = (
+            pending_chats
+            + [chat for chat in stored_chats if chat.get("Id") not in pending_ids]
+        )[:self.history_cache.history_length]
+        self.history_cache.finish_fill(
+            room_id=room_id,
+            fill_id=fill_id,
+            chats=latest_chats
         )
 
         return latest_chats
@@ -133,10 +177,15 @@ class ChatRepository:
             Any: All chat records for the room.
         """
         filter_obj = {"room_id": room_id}
-        records = self.collection.find_one_doc(
+        records = await self.collection.afind_one_doc(
             obj=filter_obj
         )
 
+        if not records:
+            # The room may only have chats still queued in the writer.
+            pending_chats = self.writer.pending(room_id)
+            records = pending_chats[0] if pending_chats else records
+
         return records
 
     async def delete_room_chat(
@@ -152,12 +201,16 @@ class ChatRepository:
         Returns:
             bool: True if records were deleted, otherwise False.
         """
+        # Drop the chats still queued first, or they would be written after
+        # the delete and bring the room back.
+        discarded = await self.writer.discard(room_id)
         filter_obj = {"room_id": room_id}
         records = await self.collection.delete_many_doc(
             obj=filter_obj
         )
+        self.history_cache.invalidate(room_id)
 
-        if records.deleted_count > 0:
+        if records.deleted_count > 0 or discarded > 0:
             return True
 
         return False
@@ -175,6 +228,17 @@ class ChatRepository:
         Returns:
             List[ChatDomain]: The most recent chat message from the room.
         """
+        latest_chats = self.history_cache.get(room_id)
+
+        if latest_chats is not None:
+            return latest_chats[:1]
+
+        # Chats still queued in the writer are newer than anything in Mongo.
+        pending_chats = self.writer.pending(room_id)
+
+        if pending_chats:
+            return pending_chats[-1:]
+
         filter_obj = {"room_id": room_id}
         latest_chats = await self.collection.find_with_filter(
             filter_obj=filter_obj,
@@ -16,12 +16,23 @@ from src.utils.utility import (
     get_datetime,
     convert_value
 )
+from src.services.logger import DSCLogger
 
 load_dotenv()
 
 TIME_OUT = convert_value(os.getenv('TIME_OUT'))
 DIRECTORY = convert_value(os.getenv('DIRECTORY'))
 
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
 
 class FileRepository:
     """
@@ -58,6 +69,23 @@ class FileRepository:
 
         return self.data
 
+    async def aload_all_data(self):
+        """
+        Load all documents from the collection without blocking the event loop.
+
+        Args:
+            None
+
+        Returns:
+            list: A list of documents with '_id' field as a string.
+        """
+        self.data = await self.collection.afind_all_doc()
+
+        for doc in self.data:
+            doc["_id"] = str(doc["_id"])
+
+        return self.data
+
     async def add_one_record(
         self,
         file: File = None
@@ -68,7 +96,7 @@ class FileRepository:
         Args:
             file (File): A `File` instance containing the data to be inserted.
         """
-        self.collection.insert_one_doc(file.__dict__)
+        await self.collection.ainsert_one_doc(file.__dict__)
 
     async def add_file(
         self,
@@ -137,7 +165,7 @@ class FileRepository:
 
         return file_path
 
-    def delete_specific_file(
+    async def delete_specific_file(
         self,
         public_id: str = None
     ) -> None:
@@ -149,25 +177,25 @@ class FileRepository:
         Raises:
             Exception: If an error occurs during the deletion process.
         Returns:
-            None: This method returns nothing, but prints a message indicating
+            None: This method returns nothing, but logs a message indicating
             the result of the deletion operation.
         """
         try:
-            result = self.collection.delete_one_doc(
+            result = await self.collection.adelete_one_doc(
                 {"public_id": public_id}
             )
 
             if result.deleted_count > 0:
-                print(
+                log.info(
                     f"Document with public_id = {public_id} deleted successfully."
                 )
             else:
-                print(f"No document with public_id = {public_id} found.")
+                log.warning(f"No document with public_id = {public_id} found.")
         except Exception as e:
-            print(f"Error deleting document with public_id = {public_id}: {e}")
+            log.error(f"Error deleting document with public_id = {public_id}: {e}")
             raise
 
-    def get_specific_file(
+    async def get_specific_file(
         self,
         public_id: str = None
     ) -> List:
@@ -178,7 +206,7 @@ class FileRepository:
         Returns:
             Optional[dict]: A dictionary representing the document
         """
-        document = self.collection.find_one_doc(
+        document = await self.collection.afind_one_doc(
             {
                 "public_id": public_id
             }
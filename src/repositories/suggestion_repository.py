@@ -2,11 +2,28 @@
 This module provides a repository class for managing suggestions
 """
 
+import os
+from dotenv import load_dotenv
+
 from src.storage.suggestion_crud import CRUDSuggestionCollection
 from src.models.suggestion import Suggestion
+from src.services.logger import DSCLogger
 from src.utils.utility import (
     create_new_id,
-    get_datetime
+    get_datetime,
+    convert_value
+)
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
 )
 
 
@@ -41,7 +58,24 @@ class SuggestionRepository:
 
         return self.data
 
-    def add_one_record(
+    async def aload_data(self):
+        """
+        Load all documents from the collection without blocking the event loop.
+
+        Args:
+            None
+
+        Returns:
+            list: A list of documents with '_id' field as a string.
+        """
+        self.data = await self.collection.afind_all_doc()
+
+        for doc in self.data:
+            doc["_id"] = str(doc["_id"])
+
+        return self.data
+
+    async def add_one_record(
         self,
         suggestion: Suggestion = None
     ) -> None:
@@ -54,9 +88,9 @@ class SuggestionRepository:
         Returns:
             None
         """
-        self.collection.insert_one_doc(suggestion.__dict__)
+        await self.collection.ainsert_one_doc(suggestion.__dict__)
 
-    def add_suggestion(
+    async def add_suggestion(
         self,
         question: str = None,
         answer: str = None
@@ -81,11 +115,11 @@ class SuggestionRepository:
             time=timestamp
         )
 
-        self.add_one_record(
+        await self.add_one_record(
             suggestion=suggestion_instance
         )
 
-    def delete_suggestion(
+    async def delete_suggestion(
         self,
         identifier: str = None
     ) -> None:
@@ -103,18 +137,18 @@ class SuggestionRepository:
         """
         try:
             query = {"$or": [{"Id": identifier}, {"question": identifier}]}
-            result = self.collection.delete_one_doc(query)
+            result = await self.collection.adelete_one_doc(query)
             if result.deleted_count > 0:
-                print(
+                log.info(
                     f"Suggestion with identifier = {identifier} deleted successfully.")
             else:
-                print(f"No suggestion with identifier = {identifier} found.")
+                log.warning(f"No suggestion with identifier = {identifier} found.")
         except Exception as e:
-            print(
+            log.error(
                 f"Error deleting suggestion with identifier = {identifier}: {e}")
             raise
 
-    def get_suggestion_by_question(
+    async def get_suggestion_by_question(
         self,
         suggestion_question: str = None
     ) -> str:
@@ -127,7 +161,7 @@ class SuggestionRepository:
         Returns:
             dict: A dictionary containing the suggestion document
         """
-        document = self.collection.find_one_doc(
+        document = await self.collection.afind_one_doc(
             {
                 "question": suggestion_question
             }
@@ -1,13 +1,30 @@
 """
 This service represents the file management functionality of the application.
 """
+import os
 import re
 from typing import List
+from dotenv import load_dotenv
 
 from src.data_loader.general_loader import GeneralLoader
 from src.repositories.file_repository import FileRepository
 from src.storage.weaviatedb import WeaviateDB
+from src.engines.cache_engine import AnswerCache
 from src.models.file import FileUpload
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class FileManagement:
@@ -20,10 +37,22 @@ class FileManagement:
         file_repository: FileRepository = None,
         general_loader: GeneralLoader = None,
         vector_database: WeaviateDB = None,
+        answer_cache: AnswerCache = None
     ):
         self._file_repository = file_repository
         self._general_loader = general_loader
         self._vector_database = vector_database
+        self._answer_cache = answer_cache
+
+    def invalidate_answers(self) -> None:
+        """
+        Drops cached answers after the knowledge base changed.
+
+        Returns:
+            None
+        """
+        if self._answer_cache is not None:
+            self._answer_cache.invalidate()
 
     async def add_file(
         self,
@@ -42,7 +71,7 @@ class FileManagement:
         for data in data_list:
             file_path = await self._file_repository.file_transfer(data=data)
             documents = await self._general_loader.aload_data(sources=[file_path])
-            print([doc.id_ for doc in documents])
+            log.debug("Loaded documents", document_ids=[doc.id_ for doc in documents])
 
             try:
                 await self._vector_database.add_knowledge(
@@ -52,7 +81,8 @@ class FileManagement:
                     file_name=data.file_name,
                     documents=documents,
                 )
-                print("Indexing successfully!!!")
+                log.info("Indexing successfully", file_name=data.file_name)
+                self.invalidate_answers()
                 await self._file_repository.add_file(
                     public_id=data.public_id,
                     url=data.url,
@@ -60,9 +90,9 @@ class FileManagement:
                     file_type=data.file_type,
                     file_path=file_path,
                 )
-                print("add data successfully!!!")
+                log.info("Add data successfully", file_name=data.file_name)
             except ValueError as e:
-                print(f"Failed to process file {data.file_name}: {str(e)}")
+                log.error(f"Failed to process file {data.file_name}: {str(e)}")
 
     async def add_file_by_chunking(
         self,
@@ -82,8 +112,7 @@ class FileManagement:
             # file_path = await self._file_repository.file_transfer(data=data)
             file_path = data.url
             documents = await self._general_loader.aload_data(sources=[file_path])
-            print(f"documents: {documents[0]}")
-            print([doc.id_ for doc in documents])
+            log.debug("Loaded documents", document_ids=[doc.id_ for doc in documents])
 
             try:
                 await self._vector_database.add_knowledge_by_chunking(
@@ -93,7 +122,8 @@ class FileManagement:
                     file_name=data.file_name,
                     documents=documents,
                 )
-                print("Indexing successfully!!!")
+                log.info("Indexing successfully", file_name=data.file_name)
+                self.invalidate_answers()
                 # print(os.path.basename(data))
                 await self._file_repository.add_file(
                     url=data.url,
@@ -102,9 +132,9 @@ class FileManagement:
                     file_name=data.file_name,
                     file_path=file_path,
                 )
-                print("add data successfully!!!")
+                log.info("Add data successfully", file_name=data.file_name)
             except ValueError as e:
-                print(f"Failed to process file {data.file_name}: {str(e)}")
+                log.error(f"Failed to process file {data.file_name}: {str(e)}")
 
     async def add_file_router(
         self,
@@ -135,7 +165,7 @@ class FileManagement:
                     data_list=temp_list
                 )
 
-    def delete_file(self, public_id: str = None) -> None:
+    async def delete_file(self, public_id: str = None) -> None:
         """
         Deletes a file and its associated knowledge from the vector database.
 
@@ -145,5 +175,6 @@ class FileManagement:
         Returns:
             None
         """
-        self._file_repository.delete_specific_file(public_id=public_id)
+        await self._file_repository.delete_specific_file(public_id=public_id)
         self._vector_database.delete_knowlegde(public_id=public_id)
+        self.invalidate_answers()
@@ -1,10 +1,175 @@
 """
 This module provides the QAsystem class which sets up logging for the system.
+
+Records are handed to a bounded in-memory queue and written by a background
+listener thread (QueueHandler/QueueListener), so logging never blocks a request
+on stdout or disk. Output is one JSON object per line by default; set
+LOG_FORMAT=text for the previous plain format.
 """
 import os
+import sys
+import json
+import queue
+import atexit
+import random
 import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler,
+    QueueListener
+)
 
 LOG_NOTIFICATION = "====="
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Fraction of debug records kept; debug output on the hot path is sampled.
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON line, with its structured fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "source": getattr(record, "source", None),
+            "message": record.getMessage(),
+            **getattr(record, "fields", {})
+        }
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats a record as plain text, appending its structured fields.
+    """
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+
+        if fields:
+            line = f"{line} {json.dumps(fields, ensure_ascii=False, default=str)}"
+
+        return line
+
+
+class DispatchHandler(logging.Handler):
+    """
+    Runs on the listener thread: writes every record to stderr, and to the
+    log file of its logger when one was requested.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stream = logging.StreamHandler(sys.stderr)
+        self.files = {}
+
+        if LOG_FORMAT == "text":
+            self.stream.setFormatter(TextFormatter(
+                "%(levelname)s:%(name)s:%(message)s"))
+        else:
+            self.stream.setFormatter(JsonFormatter())
+
+    def add_file(self, logger_name, path):
+        """
+        Routes the records of a logger to a file as well.
+        """
+        if logger_name in self.files:
+            return
+
+        hdlr = logging.FileHandler(path)
+        if LOG_FORMAT == "text":
+            hdlr.setFormatter(TextFormatter(
+                "%(asctime)s %(levelname)s %(name)s %(message)s"))
+        else:
+            hdlr.setFormatter(JsonFormatter())
+        self.files[logger_name] = hdlr
+
+    def emit(self, record):
+        self.stream.handle(record)
+
+        file_handler = self.files.get(record.name)
+        if file_handler is not None:
+            file_handler.handle(record)
+
+
+class LogPipeline:
+    """
+    The process-wide queue and listener thread shared by every DSCLogger.
+
+    The listener is started on first use in each process, so a gunicorn worker
+    forked from a master that already logged gets its own thread.
+    """
+
+    def __init__(self):
+        self.dispatch = DispatchHandler()
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self):
+        self._pid = None
+        self._queue = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def get_queue(self):
+        """
+        Returns the queue of the current process, starting its listener if needed.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+                    self._listener = QueueListener(self._queue, self.dispatch)
+                    self._listener.start()
+                    self._pid = os.getpid()
+
+        return self._queue
+
+    def stop(self):
+        """
+        Writes the queued records and stops the listener thread.
+        """
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+pipeline = LogPipeline()
+atexit.register(pipeline.stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=pipeline._reset)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    A QueueHandler that drops records instead of blocking when the queue is full.
+    """
+
+    def __init__(self):
+        super().__init__(queue=None)
+
+    def enqueue(self, record):
+        try:
+            pipeline.get_queue().put_nowait(record)
+        except queue.Full:
+            pipeline.dropped += 1
+
+    def prepare(self, record):
+        # DSCLogger messages are already rendered, so the record is queued as is
+        # instead of being formatted and copied on the caller thread.
+        if record.args or record.exc_info:
+            return super().prepare(record)
+
+        return record
 
 
 class DSCLogger(object):
@@ -24,60 +189,94 @@ class DSCLogger(object):
         Initialize the QAsystem instance.
         """
         self.file_name = file_name
-
-        if not write_to_file:
-            logging.basicConfig()
-
         self.logger = logging.getLogger(file_log)
+        self.logger.propagate = False
+
+        if not any(isinstance(hdlr, NonBlockingQueueHandler)
+                   for hdlr in self.logger.handlers):
+            self.logger.addHandler(NonBlockingQueueHandler())
 
         if write_to_file:
-            hdlr = logging.FileHandler(os.path.join(
-                data_source, f"{file_log}.log"))
-            formatter = logging.Formatter(
-                "%(asctime)s %(levelname)s %(name)s %(message)s")
-            hdlr.setFormatter(formatter)
-            self.logger.addHandler(hdlr)
+            pipeline.dispatch.add_file(
+                file_log,
+                os.path.join(data_source, f"{file_log}.log")
+            )
 
         self.logger.setLevel(logging.INFO)
 
         if mode == "debug":
             self.logger.setLevel(logging.DEBUG)
 
-    def info(self, content):
+    def _log(self, level, content, fields):
+        """
+        Hands a record to the background listener.
+        """
+        if LOG_FORMAT == "text":
+            content = f"{self.file_name}:{LOG_NOTIFICATION} {content}"
+
+        self.logger.log(
+            level,
+            content,
+            extra={"source": self.file_name, "fields": fields}
+        )
+
+    def info(self, content, **fields):
         """
         Log an informational message.
 
         Args:
             content (str): The message content to log.
+            **fields: Structured fields written alongside the message.
 
         Returns:
             None
         """
-        content = f"{self.file_name}:{LOG_NOTIFICATION} {content}"
-        self.logger.info(content)
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, content, fields)
 
-    def error(self, content):
+    def warning(self, content, **fields):
+        """
+        Log a warning message.
+
+        Args:
+            content (str): The message content to log.
+            **fields: Structured fields written alongside the message.
+
+        Returns:
+            None
+        """
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, content, fields)
+
+    def error(self, content, **fields):
         """
         Log an error message.
 
         Args:
             content (str): The message content to log.
+            **fields: Structured fields written alongside the message.
 
         Returns:
             None
         """
-        content = f"{self.file_name}:{LOG_NOTIFICATION}{content}"
-        self.logger.error(content)
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, content, fields)
 
-    def debug(self, content):
+    def debug(self, content, **fields):
         """
-        Log a debug message.
+        Log a debug message, keeping only a sample of LOG_DEBUG_SAMPLE_RATE.
 
         Args:
             content (str): The message content to log.
+            **fields: Structured fields written alongside the message.
 
         Returns:
             None
         """
-        content = f"{self.file_name}:{LOG_NOTIFICATION}{content}"
-        self.logger.debug(content)
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+
+        if LOG_DEBUG_SAMPLE_RATE < 1 and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+            return
+
+        self._log(logging.DEBUG, content, fields)
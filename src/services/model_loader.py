@@ -0,0 +1,392 @@
+"""
+This module loads the read-only models used by the preprocessing pipeline.
+
+The models are held by a process-wide `model_loader`. In the multi-worker
+deployment (see gunicorn.conf.py) they are loaded once in the master process
+before the workers are forked, so every worker shares the same pages
+copy-on-write instead of loading its own copy.
+
+Models on the request path are loaded in parallel at startup; the tonemark
+model, which nothing calls yet, and the reranking cross-encoder are loaded on
+first access. Hugging Face files
+are resolved from the local cache first, so a warm cache never hits the network.
+"""
+
+import os
+import gc
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Callable,
+    Dict
+)
+import joblib
+import fasttext
+import torch
+from dotenv import load_dotenv
+from huggingface_hub import hf_hub_download
+from huggingface_hub.utils import LocalEntryNotFoundError
+from transformers import (AutoTokenizer,
+                          AutoModelForTokenClassification,
+                          AutoModelForSequenceClassification)
+
+from src.engines.classifier_engine import (
+    CompactClassifier,
+    compact_path,
+    restore_idf
+)
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+DOMAIN_CLF_MODEL = convert_value(os.getenv('DOMAIN_CLF_MODEL'))
+PROMPT_INJECTION_MODEL = convert_value(os.getenv('PROMPT_INJECTION_MODEL'))
+RAG_CLASSIFIER_MODEL = convert_value(os.getenv('RAG_CLASSIFIER_MODEL'))
+TONE_MODEL = convert_value(os.getenv('TONE_MODEL'))
+# Cross-encoder of `CrossEncoderReranker`, loaded on first access; none if unset.
+RERANK_MODEL = convert_value(os.getenv('RERANK_MODEL'))
+LANG_DETECT_REPO = "facebook/fasttext-language-identification"
+# A local fastText language identifier used instead of LANG_DETECT_REPO, e.g.
+# the quantized `.ftz` written by `scripts.quantize_lang_detector`.
+LANG_DETECT_MODEL = convert_value(os.getenv('LANG_DETECT_MODEL'))
+# The joblib pickles are uncompressed, so their numpy arrays can be memory-mapped
+# read-only and shared through the page cache. Set to "none" to load them in RAM.
+MODEL_MMAP_MODE = convert_value(os.getenv('MODEL_MMAP_MODE', 'r'))
+# "compact" loads the classifiers from their `.npz` export (see
+# `scripts.export_classifiers`) instead of unpickling the sklearn pipelines.
+MODEL_FORMAT = convert_value(os.getenv('MODEL_FORMAT', 'joblib'))
+# Local cache of the Hugging Face models, filled by `scripts.download_models`.
+MODEL_CACHE_DIR = convert_value(os.getenv('MODEL_CACHE_DIR', 'AIModel/hf_cache'))
+# When true, a model missing from the cache is an error instead of a download.
+MODEL_OFFLINE = convert_value(os.getenv('MODEL_OFFLINE', 'false'))
+MODEL_LOAD_WORKERS = convert_value(os.getenv('MODEL_LOAD_WORKERS', '4'))
+
+
+class ModelLoader:
+    """
+    Loads and holds the classifiers, the fastText language identifier
+    and the tonemark model, recording how long each one took.
+    """
+
+    def __init__(
+        self,
+        domain_clf_path: str = DOMAIN_CLF_MODEL,
+        prompt_injection_path: str = PROMPT_INJECTION_MODEL,
+        rag_classifier_path: str = RAG_CLASSIFIER_MODEL,
+        tone_model_name: str = TONE_MODEL,
+        lang_detect_path: str = LANG_DETECT_MODEL,
+        rerank_model_name: str = RERANK_MODEL,
+        mmap_mode: str = MODEL_MMAP_MODE,
+        model_format: str = MODEL_FORMAT,
+        cache_dir: str = MODEL_CACHE_DIR,
+        offline: bool = MODEL_OFFLINE,
+        max_workers: int = MODEL_LOAD_WORKERS
+    ) -> None:
+        """
+        Initializes the ModelLoader without loading anything yet.
+
+        Args:
+            domain_clf_path (str): Path of the domain classifier.
+            prompt_injection_path (str): Path of the prompt injection classifier.
+            rag_classifier_path (str): Path of the RAG domain classifier.
+            tone_model_name (str): Name or path of the tonemark model.
+            lang_detect_path (str): Path of a local language identifier, None
+                                    for the Hugging Face one.
+            rerank_model_name (str): Name or path of the reranking cross-encoder.
+            mmap_mode (str): The joblib memory-map mode, or "none".
+            model_format (str): "joblib" or "compact", the format of the classifiers.
+            cache_dir (str): Local cache directory of the Hugging Face models.
+            offline (bool): Whether downloading a missing model is forbidden.
+            max_workers (int): Number of models loaded at the same time.
+        """
+        self._domain_clf_path = domain_clf_path
+        self._prompt_injection_path = prompt_injection_path
+        self._rag_classifier_path = rag_classifier_path
+        self._tone_model_name = tone_model_name
+        self._lang_detect_path = lang_detect_path
+        self._rerank_model_name = rerank_model_name
+        self._mmap_mode = None if mmap_mode in (None, "none") else mmap_mode
+        if model_format not in ("joblib", "compact"):
+            raise ValueError(f"Unknown model format: {model_format}")
+        self._model_format = model_format
+        self._cache_dir = cache_dir
+        self._offline = offline
+        self._max_workers = max_workers
+        self._models = {}
+        self._timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._device = torch.device(
+            "cuda") if torch.cuda.is_available() else torch.device("cpu")
+        # Models needed to answer a request, loaded by `load`.
+        self._eager: Dict[str, Callable] = {
+            "domain_clf_model": lambda: self._load_classifier(self._domain_clf_path),
+            "prompt_injection_model": lambda: self._load_classifier(self._prompt_injection_path),
+            "rag_classifier_model": lambda: self._load_classifier(self._rag_classifier_path),
+            "lang_detector": self._load_lang_detector
+        }
+        # Models loaded on first access only.
+        self._lazy: Dict[str, Callable] = {
+            "tone_tokenizer": self._load_tone_tokenizer,
+            "tone_model": self._load_tone_model
+        }
+        if self._rerank_model_name:
+            self._lazy["rerank_tokenizer"] = self._load_rerank_tokenizer
+            self._lazy["rerank_model"] = self._load_rerank_model
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether the models needed on the request path have been loaded.
+        """
+        return all(name in self._models for name in self._eager)
+
+    @property
+    def device(self) -> torch.device:
+        """
+        The device used for model inference.
+        """
+        return self._device
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        Seconds spent loading each model, plus the wall time of `load`.
+        """
+        return dict(self._timings)
+
+    @property
+    def status(self) -> Dict[str, str]:
+        """
+        Whether each model is loaded, or left for its first access.
+        """
+        return {
+            name: "loaded" if name in self._models else "lazy"
+            for name in {**self._eager, **self._lazy}
+        }
+
+    @property
+    def domain_clf_model(self):
+        """
+        The domain classifier.
+        """
+        return self._get("domain_clf_model")
+
+    @property
+    def prompt_injection_model(self):
+        """
+        The prompt injection classifier.
+        """
+        return self._get("prompt_injection_model")
+
+    @property
+    def rag_classifier_model(self):
+        """
+        The RAG domain classifier.
+        """
+        return self._get("rag_classifier_model")
+
+    @property
+    def lang_detector(self):
+        """
+        The fastText language identification model.
+        """
+        return self._get("lang_detector")
+
+    @property
+    def tone_tokenizer(self):
+        """
+        The tokenizer of the tonemark model, loaded on first access.
+        """
+        return self._get("tone_tokenizer")
+
+    @property
+    def tone_model(self):
+        """
+        The tonemark model, loaded on first access.
+        """
+        return self._get("tone_model")
+
+    @property
+    def rerank_tokenizer(self):
+        """
+        The tokenizer of the reranking cross-encoder, loaded on first access.
+        """
+        return self._get("rerank_tokenizer")
+
+    @property
+    def rerank_model(self):
+        """
+        The reranking cross-encoder, loaded on first access.
+        """
+        return self._get("rerank_model")
+
+    def _load_classifier(self, path: str):
+        """
+        Loads a scikit-learn pipeline saved with joblib, or its compact export.
+        """
+        if self._model_format == "compact":
+            return CompactClassifier.load(compact_path(path))
+
+        return restore_idf(joblib.load(filename=path, mmap_mode=self._mmap_mode))
+
+    def lang_detector_path(self) -> str:
+        """
+        Returns the path of the language identifier: the local model if one is
+        configured, else the Hugging Face one from the local cache.
+        """
+        if self._lang_detect_path:
+            return self._lang_detect_path
+
+        try:
+            return hf_hub_download(
+                repo_id=LANG_DETECT_REPO,
+                filename="model.bin",
+                cache_dir=self._cache_dir,
+                local_files_only=True
+            )
+        except LocalEntryNotFoundError:
+            if self._offline:
+                raise
+            return hf_hub_download(
+                repo_id=LANG_DETECT_REPO,
+                filename="model.bin",
+                cache_dir=self._cache_dir
+            )
+
+    def _load_lang_detector(self):
+        """
+        Loads the fastText language identifier.
+        """
+        return fasttext.load_model(self.lang_detector_path())
+
+    def _from_pretrained(self, factory, model_name: str, **kwargs):
+        """
+        Calls `from_pretrained` on the local cache, downloading only if allowed.
+        """
+        try:
+            return factory.from_pretrained(
+                model_name,
+                cache_dir=self._cache_dir,
+                local_files_only=True,
+                **kwargs
+            )
+        except OSError:
+            if self._offline:
+                raise
+            return factory.from_pretrained(
+                model_name,
+                cache_dir=self._cache_dir,
+                **kwargs
+            )
+
+    def _load_tone_tokenizer(self):
+        """
+        Loads the tokenizer of the tonemark model.
+        """
+        return self._from_pretrained(
+            AutoTokenizer, self._tone_model_name, add_prefix_space=True
+        )
+
+    def _load_tone_model(self):
+        """
+        Loads the tonemark model onto the inference device.
+        """
+        return self._from_pretrained(
+            AutoModelForTokenClassification, self._tone_model_name
+        ).to(self._device).eval()
+
+    def _load_rerank_tokenizer(self):
+        """
+        Loads the tokenizer of the reranking cross-encoder.
+        """
+        return self._from_pretrained(AutoTokenizer, self._rerank_model_name)
+
+    def _load_rerank_model(self):
+        """
+        Loads the reranking cross-encoder onto the inference device.
+        """
+        return self._from_pretrained(
+            AutoModelForSequenceClassification, self._rerank_model_name
+        ).to(self._device).eval()
+
+    def _timed(self, name: str, loader: Callable):
+        """
+        Runs a loader and records its duration.
+        """
+        start = time.perf_counter()
+        model = loader()
+        self._timings[name] = time.perf_counter() - start
+
+        return model
+
+    def _get(self, name: str):
+        """
+        Returns a model, loading it first if needed.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._models:
+                loader = self._eager.get(name) or self._lazy[name]
+                self._models[name] = self._timed(name, loader)
+
+        return self._models[name]
+
+    def load(self) -> "ModelLoader":
+        """
+        Loads the models needed on the request path in parallel, once per process.
+
+        Returns:
+            ModelLoader: The loader itself.
+        """
+        with self._lock:
+            if self.loaded:
+                return self
+
+            start = time.perf_counter()
+            pending = {
+                name: loader for name, loader in self._eager.items()
+                if name not in self._models
+            }
+            with ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="model-loader"
+            ) as executor:
+                futures = {
+                    name: executor.submit(self._timed, name, loader)
+                    for name, loader in pending.items()
+                }
+                for name, future in futures.items():
+                    self._models[name] = future.result()
+            self._timings["load"] = time.perf_counter() - start
+
+        return self
+
+    def preload_all(self) -> "ModelLoader":
+        """
+        Loads the lazy models as well, e.g. to fill the local cache.
+
+        Returns:
+            ModelLoader: The loader itself.
+        """
+        self.load()
+        for name in self._lazy:
+            self._get(name)
+
+        return self
+
+    def freeze(self) -> None:
+        """
+        Moves every object allocated so far out of the garbage collector's reach.
+
+        Called in the master process right before forking, so that collections in
+        the workers do not touch (and therefore copy) the pages of the shared models.
+        """
+        gc.collect()
+        gc.freeze()
+
+
+model_loader = ModelLoader()
@@ -2,7 +2,13 @@
 this service provides retrieve and chat module for chatbot
 """
 
-from typing import Any
+import os
+import time
+from typing import (
+    Any,
+    AsyncGenerator
+)
+from dotenv import load_dotenv
 
 from src.engines.chat_engine import ChatEngine
 from src.engines.retriever_engine import HybridRetriever
@@ -10,8 +16,34 @@ from src.engines.semantic_engine import SemanticSearch
 from src.engines.preprocess_engine import PreprocessQuestion
 from src.engines.enhance_chat_engine import EnhanceChatEngine
 from src.engines.agent_engine import AgentEngine
+from src.engines.cache_engine import AnswerCache
 from src.repositories.chat_repository import ChatRepository
-from src.models.chat import Chat
+from src.services.tracing import (
+    span,
+    record_span
+)
+from src.models.chat import (
+    Chat,
+    ChatDelta
+)
+from src.services.logger import DSCLogger
+from src.utils.token_budget import (
+    count_tokens,
+    history_record
+)
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class RetrieveChat:
@@ -29,7 +61,8 @@ class RetrieveChat:
         max_chat_token: float = 2000,
         enhance_chat_engine: EnhanceChatEngine = None,
         agent: AgentEngine = None,
-        rag_classifier: Any = None
+        rag_classifier: Any = None,
+        answer_cache: AnswerCache = None
     ) -> None:
         self._retriever = retriever
         self._chat = chat
@@ -40,6 +73,7 @@ class RetrieveChat:
         self._enhance_chat_engine = enhance_chat_engine
         self._agent = agent
         self._rag_classifier = rag_classifier
+        self._answer_cache = answer_cache
 
     async def history_chat_config(
         self,
@@ -58,19 +92,59 @@ class RetrieveChat:
             room_id=room_id
         )
         lastest_chats = list(lastest_chats)
-        combine_history_chat = ""
+        memo_key = f"history_chat_config:{self._max_chat_token}"
+        memoized = self._chat_history_tracker.history_cache.get_rendered(
+            room_id=room_id,
+            key=memo_key
+        )
+
+        if memoized is not None:
+            return memoized
+
+        records = []
         sum_token = 0
 
         for idx, chat in enumerate(reversed(lastest_chats)):
-            record = f"question {idx + 1}: {chat['query']}\nanswer {idx + 1}: {chat['answer']}"
-            tokens = len(self._retriever.token_counter.encode(record))
+            record = history_record(idx + 1, chat['query'], chat['answer'])
+            tokens = chat.get("token_count") or count_tokens(record)
             if tokens + sum_token >= self._max_chat_token:
                 break
-            combine_history_chat = combine_history_chat + record + "\n"
+            records.append(record + "\n")
             sum_token += tokens
 
+        combine_history_chat = "".join(records)
+
+        self._chat_history_tracker.history_cache.set_rendered(
+            room_id=room_id,
+            key=memo_key,
+            value=combine_history_chat
+        )
+
         return combine_history_chat
 
+    async def traced_preprocess(
+        self,
+        query: str
+    ):
+        """
+        Runs the preprocessing pipeline, recording a span per stage.
+
+        Args:
+            query (str): The input query from the user.
+
+        Returns:
+            ProcessedData: The result of the preprocessing pipeline.
+        """
+        with span("preprocess"):
+            processed_query = await self._preprocess.preprocess_text(
+                text_input=query
+            )
+            for stage, milliseconds in processed_query.stage_timings.items():
+                if stage != "total":
+                    record_span(f"preprocess.{stage}", milliseconds / 1000)
+
+        return processed_query
+
     async def retrieve_chat(
         self,
         query: str,
@@ -86,9 +160,24 @@ class RetrieveChat:
         Returns:
             Chat: The response object containing the chat response and metadata.
         """
-        chat_history = await self._enhance_chat_engine.history_config(
-            room_id=room_id
-        )
+        with span("history"):
+            chat_history = await self._enhance_chat_engine.history_config(
+                room_id=room_id
+            )
+
+        # Only standalone questions are looked up, follow-ups depend on the history.
+        generation = None
+        if self._answer_cache is not None and not chat_history:
+            with span("answer_cache") as attributes:
+                cached_answer = await self._answer_cache.lookup(query)
+                attributes["hit"] = cached_answer is not None
+            if cached_answer is not None:
+                return Chat(
+                    response=cached_answer,
+                    is_outdomain=False,
+                    retrieved_nodes=[]
+                )
+            generation = self._answer_cache.generation
 
         # score = self._rag_classifier.predict_proba([query])[0][1]
         # print(f"domain score: {score}")
@@ -122,11 +211,20 @@ class RetrieveChat:
         #         is_outdomain=False,
         #         retrieved_nodes=retrieved_nodes
         #     )
-        print("AGENT AI RAG pipeline")
-        response = await self._agent.reasoning_agent(
-            chat=query,
-            chat_history=chat_history
-        )
+        log.debug("AGENT AI RAG pipeline")
+        with span("agent"):
+            response = await self._agent.reasoning_agent(
+                chat=query,
+                chat_history=chat_history
+            )
+
+        # Only standalone answers are cached, follow-ups depend on the room history.
+        if self._answer_cache is not None and not chat_history:
+            await self._answer_cache.store(
+                query=query,
+                answer=response,
+                generation=generation
+            )
 
         return Chat(
             response=response,
@@ -149,10 +247,8 @@ class RetrieveChat:
             Chat: A Chat object containing the response, a flag indicating if the response
                 is out of domain, and a list of retrieved nodes.
         """
-        processed_query = await self._preprocess.preprocess_text(
-            text_input=query
-        )
-        print(processed_query)
+        processed_query = await self.traced_preprocess(query)
+        log.debug("Processed query", processed_query=processed_query)
 
         if processed_query.is_only_icon:
             answer = await self._chat.chat(
@@ -206,3 +302,89 @@ class RetrieveChat:
             query=processed_query.query,
             room_id=room_id
         )
+
+    async def stream_retrieve_chat(
+        self,
+        query: str,
+        room_id: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        Process a chat query through the agent pipeline, streaming the answer.
+
+        Args:
+            query (str): The user's chat query.
+            room_id (str): The ID of the chat room.
+
+        Yields:
+            str: Tokens of the answer as they are generated.
+        """
+        with span("history"):
+            chat_history = await self._enhance_chat_engine.history_config(
+                room_id=room_id
+            )
+
+        # Only standalone questions are looked up, follow-ups depend on the history.
+        generation = None
+        if self._answer_cache is not None and not chat_history:
+            with span("answer_cache") as attributes:
+                cached_answer = await self._answer_cache.lookup(query)
+                attributes["hit"] = cached_answer is not None
+            if cached_answer is not None:
+                yield cached_answer
+                return
+            generation = self._answer_cache.generation
+        tokens = []
+        # A span cannot enclose the yields, the agent is timed by hand instead.
+        start = time.perf_counter()
+
+        async for token in self._agent.stream_reasoning_agent(
+            chat=query,
+            chat_history=chat_history
+        ):
+            tokens.append(token)
+            yield token
+
+        record_span("agent", time.perf_counter() - start, start=start)
+
+        if self._answer_cache is not None and not chat_history:
+            await self._answer_cache.store(
+                query=query,
+                answer="".join(tokens),
+                generation=generation
+            )
+
+    async def stream_preprocess_query(
+        self,
+        query: str,
+        room_id: str
+    ) -> AsyncGenerator[ChatDelta, None]:
+        """
+        Preprocesses the user's query and streams an appropriate response.
+
+        Args:
+            query (str): The input query from the user.
+            room_id (str): The ID of the chat room.
+
+        Yields:
+            ChatDelta: Pieces of the response together with the out of domain flag.
+        """
+        processed_query = await self.traced_preprocess(query)
+
+        if processed_query.is_only_icon:
+            async for delta in self._chat.stream_chat(text=query):
+                yield ChatDelta(delta=delta, is_outdomain=True)
+            return
+
+        if (
+            processed_query.is_short_chat
+            or processed_query.language is False
+            or processed_query.is_prompt_injection
+        ):
+            yield ChatDelta(delta=processed_query.query, is_outdomain=True)
+            return
+
+        async for delta in self.stream_retrieve_chat(
+            query=processed_query.query,
+            room_id=room_id
+        ):
+            yield ChatDelta(delta=delta, is_outdomain=False)
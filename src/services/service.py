@@ -3,26 +3,34 @@ This module provides services for handling LLM and embedding models using OpenAI
 """
 
 import os
-import joblib
+import time
+from typing import Dict
 import requests
 from dotenv import load_dotenv
 import google.generativeai as genai
-import fasttext
-import torch
-from huggingface_hub import hf_hub_download
 from llama_index.llms.openai import OpenAI
 from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core import Settings
-from transformers import (AutoTokenizer,
-                          AutoModelForTokenClassification)
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.callbacks import CallbackManager
 
 from src.storage.weaviatedb import WeaviateDB
-from src.engines.retriever_engine import HybridRetriever
+from src.engines.retriever_engine import (
+    CachedRetriever,
+    FallbackRetriever,
+    HybridRetriever
+)
 from src.engines.chat_engine import ChatEngine
 from src.engines.enhance_chat_engine import EnhanceChatEngine
 from src.engines.agent_engine import AgentEngine
+from src.engines.cache_engine import AnswerCache
+from src.engines.rerank_engine import build_reranker
+from src.engines.embedding_engine import CachedEmbedding
+from src.storage.embedding_cache import embedding_cache
+from src.storage.retrieval_cache import retrieval_cache
+from src.utils.token_budget import count_tokens
 from src.utils.utility import convert_value
 from src.repositories.chat_repository import ChatRepository
 from src.repositories.file_repository import FileRepository
@@ -30,9 +38,15 @@ from src.data_loader.general_loader import GeneralLoader
 from src.services.file_management import FileManagement
 from src.repositories.suggestion_repository import SuggestionRepository
 from src.engines.preprocess_engine import PreprocessQuestion
+from src.engines.tokenize_engine import word_segmenter
 from src.engines.semantic_engine import SemanticSearch
 from src.prompt.preprocessing_prompt import SAFETY_SETTINGS
 from src.services.retrieve_chat import RetrieveChat
+from src.services.model_loader import model_loader
+from src.services.tracing import (
+    TracingCallbackHandler,
+    register_stats
+)
 
 load_dotenv()
 
@@ -59,12 +73,9 @@ TEMPERATURE = convert_value(os.getenv('TEMPERATURE'))
 TOP_P = convert_value(os.getenv('TOP_P'))
 TOP_K = convert_value(os.getenv('TOP_K'))
 MAX_OUTPUT_TOKENS = convert_value(os.getenv('MAX_OUTPUT_TOKENS'))
-DOMAIN_CLF_MODEL = convert_value(os.getenv('DOMAIN_CLF_MODEL'))
-PROMPT_INJECTION_MODEL = convert_value(os.getenv('PROMPT_INJECTION_MODEL'))
-RAG_CLASSIFIER_MODEL = convert_value(os.getenv('RAG_CLASSIFIER_MODEL'))
-TONE_MODEL = convert_value(os.getenv('TONE_MODEL'))
 URL = convert_value(os.getenv('LABEL_LIST'))
 MAX_HISTORY_TOKENS = convert_value(os.getenv('MAX_HISTORY_TOKENS'))
+EMBEDDING_CACHE_ENABLED = convert_value(os.getenv('EMBEDDING_CACHE_ENABLED', 'true'))
 
 
 class Service:
@@ -76,41 +87,40 @@ class Service:
         """
         Initializes the Service class with LLM and embedding models.
         """
-        self._device = torch.device(
-            "cuda") if torch.cuda.is_available() else torch.device("cpu")
+        # The read-only models are loaded once per process; under gunicorn they
+        # were already loaded by the master and are shared with this worker.
+        start = time.perf_counter()
+        self._startup_timings = {}
+        self._models = model_loader.load()
+        phase_start = time.perf_counter()
+        self._startup_timings["models"] = phase_start - start
+        self._device = self._models.device
         genai.configure(
             api_key=GEMINI_API_KEY
         )
-        self._domain_clf_model = joblib.load(
-            filename=DOMAIN_CLF_MODEL
-        )
-        self._prompt_injection_model = joblib.load(
-            filename=PROMPT_INJECTION_MODEL
-        )
-        self._rag_classifier_model = joblib.load(
-            filename=RAG_CLASSIFIER_MODEL
-        )
-        self._tone_tokenizer = AutoTokenizer.from_pretrained(
-            TONE_MODEL, add_prefix_space=True)
-        self._tone_model = AutoModelForTokenClassification.from_pretrained(
-            TONE_MODEL
-        ).to(self._device)
+        self._domain_clf_model = self._models.domain_clf_model
+        self._prompt_injection_model = self._models.prompt_injection_model
+        self._rag_classifier_model = self._models.rag_classifier_model
         self._generation_config = {
             "temperature": TEMPERATURE,
             "top_p": TOP_P,
             "top_k": TOP_K,
             "max_output_tokens": MAX_OUTPUT_TOKENS,
         }
-        self._lang_detect_model_path = hf_hub_download(
-            repo_id="facebook/fasttext-language-identification",
-            filename="model.bin"
-        )
-        self._lang_detector = fasttext.load_model(self._lang_detect_model_path)
+        self._lang_detector = self._models.lang_detector
         # self._raw_text = requests.get(URL, timeout=60).text
         self._raw_text = """en\nvi\nja\nko\nzh-cn\nzh-tw\nen-us\nen-gb"""
         self._label_list = self._raw_text.split("\n")
+        # Spans for LLM calls, agent iterations and retriever calls.
+        self._callback_manager = CallbackManager([
+            TracingCallbackHandler(token_counter=count_tokens)
+        ])
+        Settings.callback_manager = self._callback_manager
         self._llm = OpenAI(
-            api_key=OPENAI_API_KEY, model=OPENAI_MODEL, temperature=TEMPERATURE_MODEL
+            api_key=OPENAI_API_KEY,
+            model=OPENAI_MODEL,
+            temperature=TEMPERATURE_MODEL,
+            callback_manager=self._callback_manager
         )
         # self._complex_llm = OpenAI(
         #     api_key=OPENAI_API_KEY,
@@ -122,12 +132,18 @@ class Service:
                     engine=deployment_name,
                     api_key=api_key,
                     azure_endpoint=azure_endpoint,
-                    api_version=api_version
+                    api_version=api_version,
+                    callback_manager=self._callback_manager
         )
         self._embed_model = OpenAIEmbedding(
             api_key=OPENAI_API_KEY,
-            model=OPENAI_EMBED_MODEL
+            model=OPENAI_EMBED_MODEL,
+            callback_manager=self._callback_manager
         )
+        # Every retriever and the answer cache embed their queries through
+        # Settings.embed_model, so repeated queries are embedded once.
+        if EMBEDDING_CACHE_ENABLED:
+            self._embed_model = CachedEmbedding(self._embed_model)
         # self._embed_model = HuggingFaceEmbedding(
         #     model_name="hiieu/halong_embedding",
         #     truncate_dim=768,
@@ -140,9 +156,19 @@ class Service:
         )
         Settings.llms = self._llm
         Settings.embed_model = self._embed_model
+        self._startup_timings["llm_clients"] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
         self._vector_database = WeaviateDB()
+        self._startup_timings["vector_database"] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
+        self._reranker = build_reranker(
+            local_index=self._vector_database.local_index,
+            model_loader=self._models
+        )
         self._retriever = HybridRetriever(
-            index=self._vector_database.index
+            index=self._vector_database.index,
+            local_index=self._vector_database.local_index,
+            reranker=self._reranker
         )
         self._suggestion_repository = SuggestionRepository()
         self._chat_engine = ChatEngine(
@@ -154,11 +180,12 @@ class Service:
         self._preprocess_engine = PreprocessQuestion(
             domain_clf_model=self._domain_clf_model,
             lang_detect_model=self._lang_detector,
-            tonemark_model=self._tone_model,
-            tonemark_tokenizer=self._tone_tokenizer,
+            tonemark_model=None,
+            tonemark_tokenizer=None,
             prompt_injection_model=self._prompt_injection_model,
             device_type=self._device,
-            label_list=self._label_list
+            label_list=self._label_list,
+            model_loader=self._models
         )
         self._semantic_engine = SemanticSearch(
             index=self._vector_database._suggestion_index
@@ -169,13 +196,17 @@ class Service:
             retriever=self._retriever.retriever,
             chat_memory_tracker=self._chat_repository,
             token_limit=MAX_HISTORY_TOKENS,
-            index=self._vector_database.index
+            index=self._vector_database.index,
+            local_index=self._vector_database.local_index
         )
         self._agent_engine = AgentEngine(
-            retriever=self._retriever.retriever,
+            retriever=self._retriever.reranked_retriever,
             index=self._vector_database.index,
             llm=self._complex_llm
         )
+        self._answer_cache = AnswerCache(
+            embed_model=self._embed_model
+        )
         self._retrieve_chat_engine = RetrieveChat(
             retriever=self._retriever,
             chat=self._chat_engine,
@@ -185,7 +216,8 @@ class Service:
             max_chat_token=MAX_OUTPUT_TOKENS,
             enhance_chat_engine=self._enhance_chat_engine,
             agent=self._agent_engine,
-            rag_classifier=self._rag_classifier_model
+            rag_classifier=self._rag_classifier_model,
+            answer_cache=self._answer_cache
         )
         self._file_repository = FileRepository()
         self._general_loader = GeneralLoader()
@@ -193,7 +225,46 @@ class Service:
             file_repository=self._file_repository,
             general_loader=self._general_loader,
             vector_database=self._vector_database,
+            answer_cache=self._answer_cache
         )
+        register_stats("answer_cache", lambda: self._answer_cache.stats)
+        register_stats("history_cache", lambda: self._chat_repository.history_cache.stats)
+        register_stats("chat_writer", lambda: self._chat_repository.writer.stats)
+        register_stats("word_segmenter", lambda: word_segmenter.stats)
+        if retrieval_cache.enabled:
+            register_stats("retrieval_cache", lambda: retrieval_cache.stats)
+        if isinstance(self._embed_model, CachedEmbedding):
+            register_stats("embedding_cache", lambda: self._embed_model.stats)
+        if self._vector_database.local_index is not None:
+            register_stats("local_index", self._local_index_stats)
+        if self._reranker is not None:
+            register_stats("reranker", lambda: self._reranker.stats)
+        register_stats("preprocess_gates", lambda: self._preprocess_engine.gate_scheduler.stats)
+        if self._preprocess_engine.domain_batcher is not None:
+            register_stats(
+                "domain_batcher",
+                lambda: self._preprocess_engine.domain_batcher.stats
+            )
+            register_stats(
+                "prompt_injection_batcher",
+                lambda: self._preprocess_engine.prompt_injection_batcher.stats
+            )
+        end = time.perf_counter()
+        self._startup_timings["engines"] = end - phase_start
+        self._startup_timings["total"] = end - start
+
+    def _local_index_stats(self) -> Dict:
+        """
+        Counters of the local index, plus the fallbacks of the main retriever.
+        """
+        stats = dict(self._vector_database.local_index.stats)
+        retriever = self._retriever.retriever
+        if isinstance(retriever, CachedRetriever):
+            retriever = retriever.retriever
+        if isinstance(retriever, FallbackRetriever):
+            stats.update(retriever.stats)
+
+        return stats
 
     @property
     def vector_database(self) -> WeaviateDB:
@@ -216,12 +287,13 @@ class Service:
         return self._llm
 
     @property
-    def embed_model(self) -> OpenAIEmbedding:
+    def embed_model(self) -> BaseEmbedding:
         """
         Retrieves the embedding model instance.
 
         Returns:
-            OpenAIEmbedding: The initialized embedding model object.
+            BaseEmbedding: The embedding model, behind the query embedding cache
+                           unless EMBEDDING_CACHE_ENABLED is false.
         """
         return self._embed_model
 
@@ -255,6 +327,30 @@ class Service:
         """
         return self._retrieve_chat_engine
 
+    @property
+    def answer_cache(self) -> AnswerCache:
+        """
+        Retrieves the AnswerCache instance.
+
+        Returns:
+            AnswerCache: The initialized AnswerCache object.
+        """
+        return self._answer_cache
+
+    @property
+    def startup_timings(self) -> dict:
+        """
+        Retrieves the startup-time breakdown of the service.
+
+        Returns:
+            dict: Seconds spent in each startup phase, and per model.
+        """
+        return {
+            "phases": dict(self._startup_timings),
+            "models": model_loader.timings,
+            "model_status": model_loader.status
+        }
+
     @property
     def chat_repository(self) -> ChatRepository:
         """
@@ -323,3 +419,21 @@ class Service:
         Provides access to the AgentEngine instance.
         """
         return self._agent_engine
+
+    async def start(self) -> None:
+        """
+        Starts the background tasks of the service on the running event loop.
+        """
+        await self._chat_repository.writer.start()
+        await self._vector_database.start()
+
+    async def stop(self) -> None:
+        """
+        Stops the background tasks, flushing every pending chat record,
+        the local index sync, the word segmentation processes and the
+        embedding cache file.
+        """
+        await self._chat_repository.writer.stop()
+        await self._vector_database.stop()
+        word_segmenter.close()
+        embedding_cache.close()
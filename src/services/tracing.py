@@ -0,0 +1,462 @@
+"""
+Request-level latency tracing for the chat pipeline.
+
+Every HTTP request gets a trace, carried in a context variable. Code on the
+request path records spans with `span(...)` (or `record_span(...)` for durations
+measured elsewhere); LLM calls, agent iterations and retriever calls made by
+llama-index are recorded by `TracingCallbackHandler`. When the response is sent,
+the trace is written as one JSON log line and every span feeds the Prometheus
+histograms served at `/metrics`.
+"""
+
+import os
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional
+)
+from dotenv import load_dotenv
+from prometheus_client import (
+    Counter,
+    Histogram,
+    CollectorRegistry,
+    REGISTRY
+)
+from prometheus_client.core import GaugeMetricFamily
+from llama_index.core.callbacks import (
+    CBEventType,
+    EventPayload
+)
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+TRACE_LOG_ENABLED = convert_value(os.getenv("TRACE_LOG_ENABLED", "true"))
+TRACE_HEADER = "X-Trace-Id"
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    file_log="trace",
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
+SPAN_DURATION = Histogram(
+    "dsc_span_duration_seconds",
+    "Duration of a pipeline step within a request.",
+    ["span"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+REQUEST_DURATION = Histogram(
+    "dsc_request_duration_seconds",
+    "Duration of an HTTP request, until its last byte is sent.",
+    ["method", "route", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+LLM_TOKENS = Counter(
+    "dsc_llm_tokens_total",
+    "Tokens sent to and generated by the LLMs.",
+    ["model", "kind"]
+)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+class Trace:
+    """
+    The spans recorded while serving one request.
+    """
+
+    def __init__(self, name: str, trace_id: str = None) -> None:
+        """
+        Initializes the Trace.
+
+        Args:
+            name (str): What is traced, e.g. "POST /chat/chatDomain".
+            trace_id (str, optional): The ID of the trace, generated if absent.
+        """
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        parent: str = None,
+        **attributes
+    ) -> None:
+        """
+        Records a finished span.
+
+        Args:
+            name (str): The name of the step.
+            start (float): `time.perf_counter()` when the step started.
+            duration (float): Duration of the step, in seconds.
+            parent (str, optional): Name of the enclosing span.
+            **attributes: Extra fields, e.g. token counts.
+        """
+        self.spans.append({
+            "name": name,
+            "parent": parent,
+            "offset_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            **attributes
+        })
+
+    def to_dict(self, **fields) -> Dict[str, Any]:
+        """
+        Serializes the trace for the JSON log.
+        """
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            **fields,
+            "spans": self.spans
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    """
+    Returns the trace of the request being served, if any.
+    """
+    return _current_trace.get()
+
+
+def record_span(
+    name: str,
+    duration: float,
+    start: float = None,
+    **attributes
+) -> None:
+    """
+    Records a span whose duration was measured elsewhere.
+
+    Args:
+        name (str): The name of the step.
+        duration (float): Duration of the step, in seconds.
+        start (float, optional): `time.perf_counter()` when the step started.
+        **attributes: Extra fields of the span.
+    """
+    SPAN_DURATION.labels(span=name).observe(duration)
+    trace = _current_trace.get()
+
+    if trace is not None:
+        trace.add(
+            name=name,
+            start=start if start is not None else time.perf_counter() - duration,
+            duration=duration,
+            parent=_current_span.get(),
+            **attributes
+        )
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times the enclosed block as a span of the current trace.
+
+    Args:
+        name (str): The name of the step.
+        **attributes: Extra fields of the span.
+    """
+    start = time.perf_counter()
+    token = _current_span.set(name)
+
+    try:
+        yield attributes
+    finally:
+        _current_span.reset(token)
+        record_span(name, time.perf_counter() - start, start=start, **attributes)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records llama-index events as spans: LLM calls with their token counts,
+    ReAct iterations, tool calls, retriever calls and query embeddings.
+    """
+
+    SPAN_NAMES = {
+        CBEventType.LLM: "llm",
+        CBEventType.AGENT_STEP: "agent.step",
+        CBEventType.FUNCTION_CALL: "agent.tool",
+        CBEventType.RETRIEVE: "retrieve",
+        CBEventType.EMBEDDING: "embedding"
+    }
+
+    def __init__(self, token_counter: Callable[[str], int] = None) -> None:
+        """
+        Initializes the TracingCallbackHandler.
+
+        Args:
+            token_counter (Callable[[str], int], optional): Counts the tokens of a
+                text, used when the LLM response does not report its usage.
+        """
+        ignored = [
+            event for event in CBEventType if event not in self.SPAN_NAMES
+        ]
+        super().__init__(
+            event_starts_to_ignore=ignored,
+            event_ends_to_ignore=ignored
+        )
+        self._token_counter = token_counter
+        self._starts: Dict[str, Any] = {}
+
+    def _count(self, text: str) -> int:
+        """
+        Counts the tokens of a text with the fallback counter.
+        """
+        if self._token_counter is None or not text:
+            return 0
+
+        return self._token_counter(text)
+
+    def _token_usage(
+        self,
+        start_payload: Dict,
+        payload: Dict
+    ) -> Dict[str, Any]:
+        """
+        Extracts the model and the prompt/completion token counts of an LLM call.
+        """
+        response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+        raw = getattr(response, "raw", None)
+        usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+        model = (raw.get("model") if isinstance(raw, dict) else getattr(raw, "model", None))
+        model = model or (start_payload.get(EventPayload.SERIALIZED) or {}).get("model", "unknown")
+
+        if usage is not None:
+            prompt_tokens = (usage.get("prompt_tokens") if isinstance(usage, dict)
+                             else getattr(usage, "prompt_tokens", 0))
+            completion_tokens = (usage.get("completion_tokens") if isinstance(usage, dict)
+                                 else getattr(usage, "completion_tokens", 0))
+        else:
+            messages = start_payload.get(EventPayload.MESSAGES)
+            prompt = ("\n".join(str(message.content or "") for message in messages)
+                      if messages else start_payload.get(EventPayload.PROMPT, ""))
+            completion = (response.message.content if hasattr(response, "message")
+                          else getattr(response, "text", ""))
+            prompt_tokens = self._count(prompt)
+            completion_tokens = self._count(completion or "")
+
+        return {
+            "model": model,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0
+        }
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any
+    ) -> str:
+        """
+        Remembers when an event started.
+        """
+        self._starts[event_id] = (time.perf_counter(), payload or {})
+
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any
+    ) -> None:
+        """
+        Records the finished event as a span.
+        """
+        started = self._starts.pop(event_id, None)
+        if started is None:
+            return
+
+        start, start_payload = started
+        attributes = {}
+
+        if event_type == CBEventType.LLM and payload:
+            attributes = self._token_usage(start_payload, payload)
+            LLM_TOKENS.labels(model=attributes["model"], kind="prompt").inc(
+                attributes["prompt_tokens"])
+            LLM_TOKENS.labels(model=attributes["model"], kind="completion").inc(
+                attributes["completion_tokens"])
+        elif event_type == CBEventType.RETRIEVE and payload:
+            attributes = {"nodes": len(payload.get(EventPayload.NODES) or [])}
+        elif event_type == CBEventType.FUNCTION_CALL:
+            tool = start_payload.get(EventPayload.TOOL)
+            attributes = {"tool": getattr(tool, "name", None)}
+
+        record_span(
+            self.SPAN_NAMES[event_type],
+            time.perf_counter() - start,
+            start=start,
+            **attributes
+        )
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        """
+        Nothing to do, traces are opened per HTTP request.
+        """
+
+    def end_trace(
+        self,
+        trace_id: Optional[str] = None,
+        trace_map: Optional[Dict[str, List[str]]] = None
+    ) -> None:
+        """
+        Nothing to do, traces are closed per HTTP request.
+        """
+
+
+class StatsCollector:
+    """
+    Exposes the `stats` counters of the in-process caches and queues as gauges.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the StatsCollector with no provider.
+        """
+        self._providers: Dict[str, Callable[[], Dict]] = {}
+
+    def register(self, name: str, provider: Callable[[], Dict]) -> None:
+        """
+        Registers a component, replacing any previous one with the same name.
+
+        Args:
+            name (str): The component name, used as the `component` label.
+            provider (Callable[[], Dict]): Returns the current counters.
+        """
+        self._providers[name] = provider
+
+    def collect(self):
+        """
+        Yields one gauge family with a sample per numeric counter.
+        """
+        gauge = GaugeMetricFamily(
+            "dsc_component_stat",
+            "Counters reported by the caches and queues of the service.",
+            labels=["component", "stat"]
+        )
+
+        for name, provider in list(self._providers.items()):
+            try:
+                stats = provider()
+            except Exception as e:
+                log.error(f"Failed to collect the stats of {name}: {e}")
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge.add_metric([name, stat], value)
+
+        yield gauge
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(name: str, provider: Callable[[], Dict]) -> None:
+    """
+    Exposes the counters of a component at `/metrics`.
+
+    Args:
+        name (str): The component name.
+        provider (Callable[[], Dict]): Returns the current counters.
+    """
+    stats_collector.register(name, provider)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Returns the registry served at `/metrics`.
+
+    Under gunicorn with PROMETHEUS_MULTIPROC_DIR set, the histograms and counters
+    of every worker are aggregated from that directory; the component gauges
+    are those of the worker answering the scrape.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(stats_collector)
+
+    return registry
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a trace for every HTTP request.
+
+    The trace is closed once the last byte of the response is sent, so the
+    streamed answers of `/chat/chatDomainStream` are timed until they finish.
+    """
+
+    def __init__(self, app) -> None:
+        """
+        Initializes the TracingMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        trace = Trace(name=f"{method} {scope['path']}")
+        token = _current_trace.set(trace)
+        response_status = {"code": 500}
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                response_status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (TRACE_HEADER.lower().encode(), trace.trace_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(token)
+            # Label by route template, unmatched paths would explode the cardinality.
+            route_path = getattr(scope.get("route"), "path", "unmatched")
+            duration = time.perf_counter() - trace.start
+            REQUEST_DURATION.labels(
+                method=method,
+                route=route_path,
+                status=str(response_status["code"])
+            ).observe(duration)
+
+            if TRACE_LOG_ENABLED and trace.spans:
+                log.info(
+                    "trace",
+                    **trace.to_dict(route=route_path, status=response_status["code"])
+                )
@@ -0,0 +1,323 @@
+"""
+Background batched writer for Mongo collections.
+"""
+
+import os
+import asyncio
+from collections import defaultdict
+from typing import (
+    Dict,
+    List,
+    Set
+)
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from src.services.logger import DSCLogger
+from src.storage.mongodb import CRUDDocuments
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+WRITE_BATCH_SIZE = convert_value(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_INTERVAL_MS = convert_value(os.getenv("WRITE_FLUSH_INTERVAL_MS", "50"))
+WRITE_QUEUE_SIZE = convert_value(os.getenv("WRITE_QUEUE_SIZE", "100000"))
+DUPLICATE_KEY_ERROR = 11000
+RETRY_INTERVAL = 1.0
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
+
+class BatchWriter:
+    """
+    Queues documents in memory and flushes them with `insert_many`,
+    every `batch_size` documents or every `flush_interval_ms` milliseconds.
+    """
+
+    def __init__(
+        self,
+        collection: CRUDDocuments = None,
+        batch_size: int = WRITE_BATCH_SIZE,
+        flush_interval_ms: float = WRITE_FLUSH_INTERVAL_MS,
+        max_queue_size: int = WRITE_QUEUE_SIZE,
+        group_key: str = "room_id"
+    ) -> None:
+        """
+        Initializes the BatchWriter.
+
+        Args:
+            collection (CRUDDocuments): The collection the documents are written to.
+            batch_size (int): Maximum number of documents per `insert_many`.
+            flush_interval_ms (float): Maximum time a document waits in the queue.
+            max_queue_size (int): Documents beyond this are rejected by `put`.
+            group_key (str): Field used to look up documents not flushed yet.
+        """
+        self._collection = collection
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_queue_size = max_queue_size
+        self._group_key = group_key
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        self._stopping = object()
+        self._retry: List[Dict] = []
+        self._pending: Dict[str, List[Dict]] = defaultdict(list)
+        self._discarded: Set[int] = set()
+        self._in_flight: List[Dict] = []
+        self._flush_lock: asyncio.Lock = None
+        self._counters = {
+            "queued": 0,
+            "written": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dropped": 0,
+            "discarded": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        """
+        Whether the background flush task is running.
+        """
+        return self._task is not None and not self._task.done()
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Counters of the writer.
+        """
+        return {
+            **self._counters,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "retrying": len(self._retry)
+        }
+
+    async def start(self) -> None:
+        """
+        Starts the background flush task on the running event loop.
+        """
+        if self.running:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flushes every queued document, then stops the background task.
+        """
+        if not self.running:
+            return
+
+        await self._queue.put(self._stopping)
+        await self._task
+        self._task = None
+
+    def put(self, document: Dict) -> bool:
+        """
+        Queues a document for writing.
+
+        Args:
+            document (Dict): The document to insert.
+
+        Returns:
+            bool: False if the writer is not running or the queue is full,
+                  in which case the caller should write the document itself.
+        """
+        if not self.running:
+            return False
+
+        try:
+            self._queue.put_nowait(document)
+        except asyncio.QueueFull:
+            return False
+
+        self._pending[document.get(self._group_key)].append(document)
+        self._counters["queued"] += 1
+
+        return True
+
+    def pending(self, group: str) -> List[Dict]:
+        """
+        Returns the documents of a group that are not in Mongo yet, oldest first.
+
+        Args:
+            group (str): The value of the group key, e.g. a room ID.
+
+        Returns:
+            List[Dict]: The pending documents.
+        """
+        return list(self._pending.get(group, []))
+
+    async def discard(self, group: str) -> int:
+        """
+        Drops the documents of a group that are not in Mongo yet.
+
+        Queued documents are skipped by the next flush. If a batch holding
+        documents of the group is being written, waits for it to finish, so
+        once this returns no document of the group can reach Mongo anymore.
+
+        Args:
+            group (str): The value of the group key, e.g. a room ID.
+
+        Returns:
+            int: The number of documents that will not be written.
+        """
+        documents = self._pending.pop(group, [])
+        in_flight_ids = {id(doc) for doc in self._in_flight}
+        discarded = [doc for doc in documents if id(doc) not in in_flight_ids]
+
+        self._discarded.update(id(doc) for doc in discarded)
+        self._counters["discarded"] += len(discarded)
+
+        if len(discarded) < len(documents):
+            async with self._flush_lock:
+                pass
+
+        return len(discarded)
+
+    def _skip_discarded(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Removes the discarded documents from a batch.
+        """
+        if not self._discarded:
+            return documents
+
+        kept = []
+        for document in documents:
+            if id(document) in self._discarded:
+                self._discarded.discard(id(document))
+            else:
+                kept.append(document)
+
+        return kept
+
+    def _release(self, documents: List[Dict]) -> None:
+        """
+        Forgets documents that reached Mongo or were dropped.
+        """
+        for document in documents:
+            group = document.get(self._group_key)
+            pending = self._pending.get(group)
+            if pending is None:
+                continue
+            pending[:] = [doc for doc in pending if doc is not document]
+            if not pending:
+                del self._pending[group]
+
+    async def _flush(self, batch: List[Dict]) -> None:
+        """
+        Writes a batch, keeping failed documents for the next flush.
+        """
+        batch = self._skip_discarded(self._retry + batch)
+        self._retry = []
+
+        if not batch:
+            return
+
+        try:
+            async with self._flush_lock:
+                self._in_flight = batch
+                try:
+                    await self._collection.ainsert_many_doc(batch, ordered=False)
+                finally:
+                    self._in_flight = []
+            failed = []
+        except BulkWriteError as e:
+            # Documents already written by a previous attempt fail with a
+            # duplicate key error, which means they are safe.
+            failed_indexes = {
+                error["index"] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            }
+            failed = [doc for idx, doc in enumerate(batch) if idx in failed_indexes]
+        except Exception as e:
+            log.error(f"Failed to write a batch of {len(batch)} documents: {e}")
+            failed = batch
+
+        failed_ids = {id(doc) for doc in failed}
+        written = [doc for doc in batch if id(doc) not in failed_ids]
+        self._counters["written"] += len(written)
+        self._counters["batches"] += 1
+        self._release(written)
+
+        # Documents whose group was discarded while they were written are not retried.
+        failed = [
+            doc for doc in failed
+            if any(doc is pending for pending in self._pending.get(doc.get(self._group_key), []))
+        ]
+
+        if failed:
+            self._counters["failed_batches"] += 1
+            overflow = len(failed) - self._max_queue_size
+            if overflow > 0:
+                log.error(f"Dropped {overflow} documents, the retry buffer is full")
+                self._counters["dropped"] += overflow
+                self._release(failed[:overflow])
+                failed = failed[overflow:]
+            self._retry = failed
+
+    async def _run(self) -> None:
+        """
+        Collects documents from the queue and flushes them in batches.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            try:
+                if self._retry:
+                    first = await asyncio.wait_for(self._queue.get(), RETRY_INTERVAL)
+                else:
+                    first = await self._queue.get()
+            except asyncio.TimeoutError:
+                await self._flush([])
+                continue
+
+            if first is self._stopping:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self._flush_interval
+
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    document = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if document is self._stopping:
+                    stopping = True
+                    break
+                batch.append(document)
+
+            await self._flush(batch)
+
+        # Drain whatever is still queued before shutting down.
+        remaining = []
+        while not self._queue.empty():
+            document = self._queue.get_nowait()
+            if document is not self._stopping:
+                remaining.append(document)
+
+        for start in range(0, len(remaining), self._batch_size):
+            await self._flush(remaining[start:start + self._batch_size])
+
+        if self._retry:
+            await self._flush([])
+
+        if self._retry:
+            log.error(f"Dropped {len(self._retry)} documents that could not be written")
+            self._counters["dropped"] += len(self._retry)
+            self._release(self._retry)
+            self._retry = []
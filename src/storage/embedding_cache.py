@@ -0,0 +1,330 @@
+"""
+Process-wide cache of query embeddings.
+
+Embeddings are kept in a bounded LRU keyed on the embedding model and the
+normalized query. With EMBEDDING_CACHE_PATH set they are also written to a
+local SQLite file, shared by the workers of the host and read back after a
+restart, so a query embedded once is not sent to the embedding API again.
+"""
+
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+from dotenv import load_dotenv
+
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+EMBEDDING_CACHE_MAX_SIZE = convert_value(os.getenv("EMBEDDING_CACHE_MAX_SIZE", "2048"))
+# SQLite file the embeddings are persisted to, none if unset.
+EMBEDDING_CACHE_PATH = convert_value(os.getenv("EMBEDDING_CACHE_PATH"))
+EMBEDDING_CACHE_DISK_MAX_SIZE = convert_value(os.getenv("EMBEDDING_CACHE_DISK_MAX_SIZE", "100000"))
+# The file is trimmed to its maximum size every this many writes.
+DISK_TRIM_INTERVAL = 1000
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
+
+def normalize_query(text: str) -> str:
+    """
+    The cache key of a query: its words separated by single spaces.
+    """
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    A bounded LRU of embeddings, optionally backed by a SQLite file, safe to use
+    from several threads.
+
+    Vectors are stored as arrays of doubles, a third of the size of a list of
+    floats, and returned as new lists, identical to what the model returned.
+
+    The in-memory LRU (`lookup`, `remember`) and the file (`load`, `persist`)
+    have their own locks, so that an async caller can read the LRU on the
+    event loop and run the SQLite reads and writes in a thread.
+    """
+
+    def __init__(
+        self,
+        max_size: int = EMBEDDING_CACHE_MAX_SIZE,
+        path: str = EMBEDDING_CACHE_PATH,
+        disk_max_size: int = EMBEDDING_CACHE_DISK_MAX_SIZE
+    ) -> None:
+        """
+        Initializes the EmbeddingCache.
+
+        Args:
+            max_size (int): Maximum number of embeddings kept in memory.
+            path (str): SQLite file the embeddings are persisted to, None for none.
+            disk_max_size (int): Maximum number of embeddings kept in the file.
+        """
+        self._max_size = max_size
+        self._path = path
+        self._disk_max_size = disk_max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = None
+        self._disk_writes = 0
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_errors": 0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and the current size of the cache.
+        """
+        hits = self._counters["hits"] + self._counters["disk_hits"]
+        lookups = hits + self._counters["misses"]
+
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+    @property
+    def persistent(self) -> bool:
+        """
+        Whether the embeddings are also written to a SQLite file.
+        """
+        return bool(self._path)
+
+    def _get_connection(self) -> Optional[sqlite3.Connection]:
+        """
+        Returns the SQLite connection of the current process, opening the file if
+        needed; None if there is no file or it cannot be opened.
+
+        A connection must not be used across a fork, so a worker forked from the
+        gunicorn master opens its own.
+        """
+        if not self._path:
+            return None
+        if self._connection_pid == os.getpid():
+            return self._connection
+
+        self._connection = None
+        self._connection_pid = os.getpid()
+        try:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, check_same_thread=False, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            connection.commit()
+            self._connection = connection
+        except (sqlite3.Error, OSError) as e:
+            log.error(f"Failed to open the embedding cache {self._path}: {e}")
+
+        return self._connection
+
+    def _remember(self, key: Tuple[str, str], vector: array) -> None:
+        """
+        Puts a vector in the LRU, evicting the least recently used ones if needed.
+        """
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _read(self, connection: sqlite3.Connection, key: Tuple[str, str]) -> Optional[array]:
+        """
+        Reads a vector from the SQLite file.
+        """
+        try:
+            row = connection.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND query = ?", key
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._counters["disk_errors"] += 1
+            log.error(f"Failed to read the embedding cache: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        vector = array("d")
+        vector.frombytes(row[0])
+
+        return vector
+
+    def _write(self, connection: sqlite3.Connection, key: Tuple[str, str], vector: array) -> None:
+        """
+        Writes a vector to the SQLite file, trimming the oldest rows now and then.
+        """
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO embeddings (model, query, vector) VALUES (?, ?, ?)",
+                (*key, vector.tobytes())
+            )
+            self._disk_writes += 1
+            if self._disk_writes % DISK_TRIM_INTERVAL == 0:
+                connection.execute(
+                    "DELETE FROM embeddings WHERE rowid <= "
+                    "(SELECT MAX(rowid) FROM embeddings) - ?",
+                    (self._disk_max_size,)
+                )
+            connection.commit()
+        except sqlite3.Error as e:
+            self._counters["disk_errors"] += 1
+            log.error(f"Failed to write the embedding cache: {e}")
+
+    def lookup(self, model: str, query: str) -> Optional[List[float]]:
+        """
+        Returns the embedding of a query from the in-memory LRU only, or None.
+
+        A miss is not counted: it is counted by `load`, which should follow.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+
+        Returns:
+            Optional[List[float]]: The embedding, or None if not in memory.
+        """
+        key = (model, normalize_query(query))
+
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+
+        return vector.tolist()
+
+    def load(self, model: str, query: str) -> Optional[List[float]]:
+        """
+        Returns the embedding of a query from the SQLite file, or None.
+
+        A vector found in the file is put in the LRU. This blocks on the file,
+        async callers run it in a thread.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+
+        Returns:
+            Optional[List[float]]: The embedding, or None on a miss.
+        """
+        key = (model, normalize_query(query))
+        vector = None
+
+        with self._disk_lock:
+            connection = self._get_connection()
+            if connection is not None:
+                vector = self._read(connection, key)
+
+        with self._lock:
+            if vector is None:
+                self._counters["misses"] += 1
+                return None
+            self._remember(key, vector)
+            self._counters["disk_hits"] += 1
+
+        return vector.tolist()
+
+    def remember(self, model: str, query: str, embedding: List[float]) -> None:
+        """
+        Puts the embedding of a query in the in-memory LRU.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+            embedding (List[float]): Its embedding.
+        """
+        key = (model, normalize_query(query))
+
+        with self._lock:
+            self._remember(key, array("d", embedding))
+
+    def persist(self, model: str, query: str, embedding: List[float]) -> None:
+        """
+        Writes the embedding of a query to the SQLite file, if any.
+
+        This blocks on the file, async callers run it in a thread.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+            embedding (List[float]): Its embedding.
+        """
+        key = (model, normalize_query(query))
+
+        with self._disk_lock:
+            connection = self._get_connection()
+            if connection is not None:
+                self._write(connection, key, array("d", embedding))
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """
+        Returns the cached embedding of a query, from memory or the file, or None.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+
+        Returns:
+            Optional[List[float]]: The embedding, or None on a miss.
+        """
+        embedding = self.lookup(model, query)
+        if embedding is not None:
+            return embedding
+
+        return self.load(model, query)
+
+    def put(self, model: str, query: str, embedding: List[float]) -> None:
+        """
+        Caches the embedding of a query in memory and in the file.
+
+        Args:
+            model (str): The name of the embedding model.
+            query (str): The query, normalized or not.
+            embedding (List[float]): Its embedding.
+        """
+        self.remember(model, query, embedding)
+        self.persist(model, query, embedding)
+
+    def close(self) -> None:
+        """
+        Closes the SQLite file, if this process opened it.
+        """
+        with self._disk_lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._connection_pid = None
+
+
+embedding_cache = EmbeddingCache()
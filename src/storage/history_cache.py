@@ -0,0 +1,282 @@
+"""
+In-process cache of the latest chats of each room.
+"""
+
+import os
+import time
+import itertools
+from collections import OrderedDict
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional
+)
+from dotenv import load_dotenv
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+HISTORY_CACHE_MAX_ROOMS = convert_value(os.getenv("HISTORY_CACHE_MAX_ROOMS", "10000"))
+HISTORY_CACHE_MAX_BYTES = convert_value(os.getenv("HISTORY_CACHE_MAX_BYTES", "67108864"))
+# A worker does not see the chats written by the other workers, so with several
+# workers a cached room is read again from Mongo this many seconds after it was filled.
+HISTORY_CACHE_TTL = convert_value(os.getenv("HISTORY_CACHE_TTL", "30"))
+# Set by gunicorn.conf.py; a single process keeps its rooms until they are evicted.
+WEB_CONCURRENCY = convert_value(os.getenv("WEB_CONCURRENCY", "1"))
+HISTORY_LENGTH = 5
+
+
+class HistoryCache:
+    """
+    A bounded LRU cache mapping a room ID to its latest chats, newest first.
+
+    The cache is filled from Mongo on a miss and kept up to date by write-through,
+    together with any string rendered from the history (memoized per room).
+    It is local to the process, so each worker keeps its own copy. With several
+    workers a room is read from Mongo again `ttl` seconds after it was filled,
+    which bounds how long a worker can miss the chats written by another one;
+    a single process has no TTL, its write-through keeps every room current.
+    """
+
+    def __init__(
+        self,
+        max_rooms: int = HISTORY_CACHE_MAX_ROOMS,
+        max_bytes: int = HISTORY_CACHE_MAX_BYTES,
+        history_length: int = HISTORY_LENGTH,
+        ttl: Optional[float] = HISTORY_CACHE_TTL if WEB_CONCURRENCY > 1 else None
+    ) -> None:
+        """
+        Initializes the HistoryCache.
+
+        Args:
+            max_rooms (int): Maximum number of rooms kept in memory.
+            max_bytes (int): Maximum total size of the cached texts, in bytes.
+            history_length (int): Number of chats kept per room.
+            ttl (Optional[float]): Seconds a room stays cached after it was read
+                                   from Mongo, None to keep it until evicted.
+        """
+        self._ttl = ttl
+        self._max_rooms = max_rooms
+        self._max_bytes = max_bytes
+        self._history_length = history_length
+        self._rooms: OrderedDict = OrderedDict()
+        self._filling: Dict[str, int] = {}
+        self._fill_ids = itertools.count()
+        self._total_bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "memo_hits": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    @property
+    def history_length(self) -> int:
+        """
+        Number of chats kept per room.
+        """
+        return self._history_length
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Counters and the current footprint of the cache.
+        """
+        return {
+            **self._counters,
+            "rooms": len(self._rooms),
+            "bytes": self._total_bytes
+        }
+
+    @staticmethod
+    def _chat_size(chat: Dict) -> int:
+        """
+        Approximates the memory held by a chat record by the size of its texts.
+        """
+        return (
+            len(str(chat.get("query", "")).encode("utf-8"))
+            + len(str(chat.get("answer", "")).encode("utf-8"))
+        )
+
+    def _room_size(self, room: Dict) -> int:
+        """
+        Size of the chats and memoized strings of a room.
+        """
+        return (
+            sum(self._chat_size(chat) for chat in room["chats"])
+            + sum(len(value.encode("utf-8")) for value in room["rendered"].values()
+                  if isinstance(value, str))
+        )
+
+    def _resize(self, room_id: str) -> None:
+        """
+        Recomputes the accounted size of a room and evicts LRU rooms if needed.
+        """
+        room = self._rooms[room_id]
+        self._total_bytes -= room["size"]
+        room["size"] = self._room_size(room)
+        self._total_bytes += room["size"]
+
+        while self._rooms and (
+            len(self._rooms) > self._max_rooms or self._total_bytes > self._max_bytes
+        ):
+            _, evicted = self._rooms.popitem(last=False)
+            self._total_bytes -= evicted["size"]
+            self._counters["evictions"] += 1
+
+    def _live_room(self, room_id: str) -> Optional[Dict]:
+        """
+        Returns the cached room, dropping it if it was filled too long ago.
+        """
+        room = self._rooms.get(room_id)
+
+        if (
+            room is not None
+            and self._ttl is not None
+            and time.monotonic() - room["filled_at"] > self._ttl
+        ):
+            self.invalidate(room_id)
+            self._counters["expirations"] += 1
+            return None
+
+        return room
+
+    def get(self, room_id: str) -> Optional[List[Dict]]:
+        """
+        Returns the cached chats of a room, newest first.
+
+        Args:
+            room_id (str): The ID of the chat room.
+
+        Returns:
+            Optional[List[Dict]]: The chats, or None on a miss.
+        """
+        room = self._live_room(room_id)
+
+        if room is None:
+            self._counters["misses"] += 1
+            return None
+
+        self._rooms.move_to_end(room_id)
+        self._counters["hits"] += 1
+
+        return list(room["chats"])
+
+    def begin_fill(self, room_id: str) -> int:
+        """
+        Marks the start of a Mongo read meant to fill the cache for a room.
+
+        Args:
+            room_id (str): The ID of the chat room.
+
+        Returns:
+            int: A token to pass to `finish_fill`.
+        """
+        fill_id = next(self._fill_ids)
+        self._filling[room_id] = fill_id
+
+        return fill_id
+
+    def finish_fill(
+        self,
+        room_id: str,
+        fill_id: int,
+        chats: List[Dict]
+    ) -> None:
+        """
+        Stores the chats read from Mongo, unless the room was written meanwhile.
+
+        Args:
+            room_id (str): The ID of the chat room.
+            fill_id (int): The token returned by `begin_fill`.
+            chats (List[Dict]): The latest chats of the room, newest first.
+        """
+        if self._filling.get(room_id) != fill_id:
+            return
+
+        del self._filling[room_id]
+        self._rooms[room_id] = {
+            "chats": list(chats)[:self._history_length],
+            "rendered": {},
+            "size": 0,
+            "filled_at": time.monotonic()
+        }
+        self._rooms.move_to_end(room_id)
+        self._resize(room_id)
+
+    def append(self, room_id: str, chat: Dict) -> None:
+        """
+        Writes a new chat through to a cached room.
+
+        Rooms that are not cached are left alone, they are read from Mongo
+        on the next access.
+
+        Args:
+            room_id (str): The ID of the chat room.
+            chat (Dict): The chat record that was persisted.
+        """
+        self._filling.pop(room_id, None)
+        room = self._rooms.get(room_id)
+
+        if room is None:
+            return
+
+        room["chats"] = ([chat] + room["chats"])[:self._history_length]
+        room["rendered"] = {}
+        self._rooms.move_to_end(room_id)
+        self._resize(room_id)
+
+    def invalidate(self, room_id: str) -> None:
+        """
+        Drops a room from the cache.
+
+        Args:
+            room_id (str): The ID of the chat room.
+        """
+        self._filling.pop(room_id, None)
+        room = self._rooms.pop(room_id, None)
+
+        if room is not None:
+            self._total_bytes -= room["size"]
+
+    def get_rendered(self, room_id: str, key: str) -> Any:
+        """
+        Returns a value memoized for the current history of a room.
+
+        Args:
+            room_id (str): The ID of the chat room.
+            key (str): The name of the memoized value.
+
+        Returns:
+            Any: The memoized value, or None if absent.
+        """
+        room = self._live_room(room_id)
+
+        if room is None or key not in room["rendered"]:
+            return None
+
+        self._counters["memo_hits"] += 1
+
+        return room["rendered"][key]
+
+    def set_rendered(self, room_id: str, key: str, value: Any) -> None:
+        """
+        Memoizes a value derived from the current history of a room.
+
+        The value is dropped as soon as the history of the room changes.
+
+        Args:
+            room_id (str): The ID of the chat room.
+            key (str): The name of the memoized value.
+            value (Any): The value to memoize.
+        """
+        room = self._rooms.get(room_id)
+
+        if room is None:
+            return
+
+        room["rendered"][key] = value
+        self._resize(room_id)
@@ -0,0 +1,389 @@
+"""
+In-process mirror of the knowledge base collection of Weaviate.
+
+The knowledge base holds a few thousand chunks, which fit in memory. The
+mirror keeps their unit-normalized embeddings in one float32 matrix, for an
+exact (flat) cosine search, and a BM25 index of their text. It scores hybrid
+queries like Weaviate's relative score fusion: both result lists are min-max
+normalized, then weighted by `alpha` (vector) and `1 - alpha` (BM25).
+
+The mirror is filled from Weaviate at startup and updated by `WeaviateDB` on
+every insertion and deletion made by this process. Changes made by another
+worker are picked up by `sync`, which `WeaviateDB` calls every
+KNOWLEDGE_SYNC_INTERVAL seconds. Every change builds a new immutable
+snapshot, so searches never take a lock.
+"""
+
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+from dotenv import load_dotenv
+import numpy as np
+from llama_index.core.schema import (
+    BaseNode,
+    MetadataMode
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from src.services.logger import DSCLogger
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+# "off", "fallback" (Weaviate first, the mirror when it fails) or "primary".
+LOCAL_INDEX_MODE = convert_value(os.getenv("LOCAL_INDEX_MODE", "off"))
+# Results taken from each of the vector and BM25 searches before the fusion.
+LOCAL_INDEX_CANDIDATES = convert_value(os.getenv("LOCAL_INDEX_CANDIDATES", "100"))
+# Seconds Weaviate is skipped for after a failure, in fallback mode.
+LOCAL_INDEX_RETRY_INTERVAL = convert_value(os.getenv("LOCAL_INDEX_RETRY_INTERVAL", "5"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
+
+# Weaviate's "word" tokenization: lowercased runs of letters and digits.
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into the terms of the BM25 index.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class _Snapshot:
+    """
+    The immutable state of the index: nodes, embeddings and BM25 postings.
+    """
+
+    def __init__(self, entries: Dict[str, Tuple[BaseNode, np.ndarray, Counter]]) -> None:
+        self.node_ids = list(entries)
+        self.positions = {node_id: position for position, node_id in enumerate(self.node_ids)}
+        self.nodes = [entries[node_id][0] for node_id in self.node_ids]
+        dimension = next(iter(entries.values()))[1].shape[0] if entries else 0
+        self.matrix = np.zeros((len(self.node_ids), dimension), dtype=np.float32)
+        self.lengths = np.zeros(len(self.node_ids), dtype=np.float32)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+
+        for position, node_id in enumerate(self.node_ids):
+            _, vector, terms = entries[node_id]
+            self.matrix[position] = vector
+            self.lengths[position] = sum(terms.values())
+            for term, count in terms.items():
+                documents, counts = postings.setdefault(term, ([], []))
+                documents.append(position)
+                counts.append(count)
+
+        self.postings = {
+            term: (np.asarray(documents), np.asarray(counts, dtype=np.float32))
+            for term, (documents, counts) in postings.items()
+        }
+        self.mean_length = float(self.lengths.mean()) if len(self.node_ids) else 0.0
+
+
+def object_ids(client, index_name: str) -> Set[str]:
+    """
+    The IDs of the objects of a Weaviate collection, read without their properties.
+    """
+    collection = client.collections.get(index_name)
+
+    return {str(entry.uuid) for entry in collection.iterator(return_properties=[])}
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """
+    Min-max normalizes scores into [0, 1]; equal scores all become 1.
+    """
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+
+    return (scores - low) / (high - low)
+
+
+class LocalVectorIndex:
+    """
+    A flat vector index with a BM25 side index, searched with hybrid scoring.
+    """
+
+    def __init__(self, candidates: int = LOCAL_INDEX_CANDIDATES) -> None:
+        """
+        Initializes an empty LocalVectorIndex.
+
+        Args:
+            candidates (int): Results of each search kept for the fusion.
+        """
+        self._candidates = candidates
+        self._entries: Dict[str, Tuple[BaseNode, np.ndarray, Counter]] = {}
+        self._ref_docs: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot({})
+        self._counters = {
+            "searches": 0,
+            "inserts": 0,
+            "deletes": 0,
+            "skipped": 0,
+            "syncs": 0,
+            "reloads": 0
+        }
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Counters and the size of the index.
+        """
+        snapshot = self._snapshot
+
+        return {
+            **self._counters,
+            "nodes": len(snapshot.node_ids),
+            "terms": len(snapshot.postings)
+        }
+
+    def __len__(self) -> int:
+        return len(self._snapshot.node_ids)
+
+    def add(self, nodes: Iterable[BaseNode]) -> None:
+        """
+        Adds or replaces nodes; each must carry its embedding.
+
+        Args:
+            nodes (Iterable[BaseNode]): The nodes, as inserted in the vector store.
+        """
+        with self._lock:
+            self._add(nodes)
+            self._snapshot = _Snapshot(self._entries)
+
+    def _add(self, nodes: Iterable[BaseNode]) -> None:
+        """
+        Adds nodes to the entries; the caller holds the lock and builds the snapshot.
+        """
+        for node in nodes:
+            if node.embedding is None:
+                self._counters["skipped"] += 1
+                continue
+            vector = np.asarray(node.embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            terms = Counter(tokenize(node.get_content(metadata_mode=MetadataMode.NONE)))
+            # The vectors live in the matrix only.
+            stored = node.copy()
+            stored.embedding = None
+            self._entries[node.node_id] = (stored, vector, terms)
+            if node.ref_doc_id:
+                self._ref_docs.setdefault(node.ref_doc_id, set()).add(node.node_id)
+            self._counters["inserts"] += 1
+
+    def load_from_weaviate(self, client, index_name: str) -> None:
+        """
+        Replaces the content of the index with a Weaviate collection.
+
+        Args:
+            client (weaviate.WeaviateClient): The connected Weaviate client.
+            index_name (str): The collection written by `WeaviateVectorStore`.
+        """
+        nodes = []
+        for entry in client.collections.get(index_name).iterator(include_vector=True):
+            properties = entry.properties
+            node = metadata_dict_to_node(properties, text=properties.get("text", ""))
+            vector = entry.vector
+            node.embedding = vector.get("default") if isinstance(vector, dict) else vector
+            nodes.append(node)
+
+        # Swapped in at once, so searches never see a half-loaded index.
+        with self._lock:
+            self._counters["deletes"] += len(self._entries)
+            self._entries.clear()
+            self._ref_docs.clear()
+            self._add(nodes)
+            self._snapshot = _Snapshot(self._entries)
+        log.info(f"Loaded {len(self)} nodes of {index_name} into the local index")
+
+    def sync(self, client, index_name: str, stored_ids: Optional[Set[str]] = None) -> bool:
+        """
+        Reloads the index if the Weaviate collection holds other objects.
+
+        Only the object IDs are read for the check, which catches the nodes
+        inserted or deleted by another process.
+
+        Args:
+            client (weaviate.WeaviateClient): The connected Weaviate client.
+            index_name (str): The collection written by `WeaviateVectorStore`.
+            stored_ids (Optional[Set[str]]): The IDs of the collection, if
+                                             already read by the caller.
+
+        Returns:
+            bool: Whether the index was reloaded.
+        """
+        self._counters["syncs"] += 1
+        if stored_ids is None:
+            stored_ids = object_ids(client, index_name)
+
+        if stored_ids == set(self._snapshot.node_ids):
+            return False
+
+        self._counters["reloads"] += 1
+        self.load_from_weaviate(client, index_name)
+
+        return True
+
+    def delete_ref_doc(self, ref_doc_id: str) -> None:
+        """
+        Deletes the nodes of a source document.
+
+        Args:
+            ref_doc_id (str): The reference document ID.
+        """
+        with self._lock:
+            node_ids = self._ref_docs.pop(ref_doc_id, set())
+            for node_id in node_ids:
+                if self._entries.pop(node_id, None) is not None:
+                    self._counters["deletes"] += 1
+            if node_ids:
+                self._snapshot = _Snapshot(self._entries)
+
+    def clear(self) -> None:
+        """
+        Deletes every node.
+        """
+        with self._lock:
+            self._counters["deletes"] += len(self._entries)
+            self._entries.clear()
+            self._ref_docs.clear()
+            self._snapshot = _Snapshot({})
+
+    def _bm25(self, snapshot: _Snapshot, query: str) -> np.ndarray:
+        """
+        Computes the BM25 score of every node for a query.
+        """
+        scores = np.zeros(len(snapshot.node_ids), dtype=np.float32)
+        total = len(snapshot.node_ids)
+
+        for term in set(tokenize(query)):
+            posting = snapshot.postings.get(term)
+            if posting is None:
+                continue
+            documents, counts = posting
+            idf = math.log(1 + (total - len(documents) + 0.5) / (len(documents) + 0.5))
+            lengths = snapshot.lengths[documents] / snapshot.mean_length
+            scores[documents] += idf * counts * (BM25_K1 + 1) / (
+                counts + BM25_K1 * (1 - BM25_B + BM25_B * lengths)
+            )
+
+        return scores
+
+    def score_nodes(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]],
+        node_ids: List[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores given nodes against a query, with the statistics of the whole index.
+
+        Args:
+            query (str): The query text, for BM25.
+            query_embedding (Optional[List[float]]): Its embedding, None to skip the cosine.
+            node_ids (List[str]): The nodes to score.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The cosine similarity and the BM25
+            score of each node; NaN for nodes the index does not hold.
+        """
+        snapshot = self._snapshot
+        positions = np.array([snapshot.positions.get(node_id, -1) for node_id in node_ids])
+        known = positions >= 0
+        similarities = np.full(len(node_ids), np.nan, dtype=np.float32)
+        bm25 = np.full(len(node_ids), np.nan, dtype=np.float32)
+        if not known.any():
+            return similarities, bm25
+
+        if query_embedding is not None:
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            similarities[known] = snapshot.matrix[positions[known]] @ vector
+        bm25[known] = self._bm25(snapshot, query)[positions[known]]
+
+        return similarities, bm25
+
+    def _top(self, scores: np.ndarray, limit: int) -> np.ndarray:
+        """
+        The positions of the `limit` best scores, best first.
+        """
+        if limit < len(scores):
+            positions = np.argpartition(-scores, limit)[:limit]
+        else:
+            positions = np.arange(len(scores))
+
+        return positions[np.argsort(-scores[positions], kind="stable")]
+
+    def search(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]],
+        top_k: int,
+        alpha: float
+    ) -> List[Tuple[BaseNode, float]]:
+        """
+        Finds the nodes most relevant to a query with hybrid scoring.
+
+        Args:
+            query (str): The query text, for BM25.
+            query_embedding (Optional[List[float]]): Its embedding, None for BM25 only.
+            top_k (int): Number of nodes returned.
+            alpha (float): Weight of the vector search, 1 - alpha for BM25.
+
+        Returns:
+            List[Tuple[BaseNode, float]]: The nodes and their fused score, best first.
+        """
+        snapshot = self._snapshot
+        self._counters["searches"] += 1
+        if not snapshot.node_ids:
+            return []
+
+        limit = max(top_k, self._candidates)
+        fused: Dict[int, float] = {}
+
+        if query_embedding is not None and alpha > 0:
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            similarities = snapshot.matrix @ vector
+            positions = self._top(similarities, limit)
+            for position, score in zip(positions, normalize_scores(similarities[positions])):
+                fused[position] = fused.get(position, 0.0) + alpha * float(score)
+
+        if alpha < 1:
+            scores = self._bm25(snapshot, query)
+            positions = self._top(scores, limit)
+            positions = positions[scores[positions] > 0]
+            if len(positions):
+                for position, score in zip(positions, normalize_scores(scores[positions])):
+                    fused[position] = fused.get(position, 0.0) + (1 - alpha) * float(score)
+
+        ranked = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+
+        return [(snapshot.nodes[position], score) for position, score in ranked]
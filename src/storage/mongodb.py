@@ -3,6 +3,9 @@ mongodb function
 """
 
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pymongo import MongoClient
 
@@ -18,6 +21,7 @@ if MONGODB_URL is None:
 LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
 WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
 FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+MONGODB_MAX_WORKERS = convert_value(os.environ.get("MONGODB_MAX_WORKERS", "16"))
 
 log = DSCLogger(
     file_name=FILE_NAME,
@@ -34,12 +38,10 @@ class MongoDBConnection():
     """
     url = MONGODB_URL
     col = MONGODB_NAME
-    print("MONGODB_URL =", MONGODB_URL)
 
     def __init__(self):
-        self.client = MongoClient(self.url)
+        self.client = MongoClient(self.url, maxPoolSize=max(MONGODB_MAX_WORKERS, 100))
         self.db = self.client[MONGODB_NAME]
-        print("DEBUG DEBUG")
         try:
             # check connection is available
             self.client.admin.command("ismaster")
@@ -53,11 +55,40 @@ class CRUDDocuments():
     """
     author: Ngo Phuc Danh
     """
-    connection = MongoDBConnection()
+    # Created by the first instance rather than at import time, so that a
+    # gunicorn master importing the app does not hand a client to forked workers.
+    connection: MongoDBConnection = None
+    # pymongo is synchronous, the async methods run it on this bounded pool
+    # so that Mongo latency never blocks the event loop.
+    executor = ThreadPoolExecutor(
+        max_workers=MONGODB_MAX_WORKERS,
+        thread_name_prefix="mongodb"
+    )
 
     def __init__(self):
+        if CRUDDocuments.connection is None:
+            CRUDDocuments.connection = MongoDBConnection()
         self.collection = None
 
+    async def run_in_executor(self, func, *args, **kwargs):
+        """
+        Runs a blocking pymongo call on the storage thread pool.
+
+        Args:
+            func (Callable): The blocking function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The result of the function.
+        """
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
     def insert_one_doc(self, obj):
         """
         Insert a single document.
@@ -74,6 +105,19 @@ class CRUDDocuments():
         """
         return self.collection.insert_one(document=obj)
 
+    def insert_many_doc(self, objs, ordered=True):
+        """
+        Insert a batch of documents in a single round-trip.
+
+        Args:
+            objs (list): The documents to insert.
+            ordered (bool): If False, the server keeps inserting after a failed document.
+
+        Returns:
+            InsertManyResult: A result object containing the inserted ids.
+        """
+        return self.collection.insert_many(documents=objs, ordered=ordered)
+
     def find_all_doc(self):
         """
         Retrieve all documents from the collection.
@@ -110,6 +154,69 @@ class CRUDDocuments():
         """
         return self.collection.find_one(filter=obj)
 
+    async def ainsert_one_doc(self, obj):
+        """
+        Insert a single document without blocking the event loop.
+
+        Args:
+            obj (dict): The document to insert.
+
+        Returns:
+            InsertOneResult: A result object containing the inserted id.
+        """
+        return await self.run_in_executor(self.insert_one_doc, obj)
+
+    async def ainsert_many_doc(self, objs, ordered=True):
+        """
+        Insert a batch of documents without blocking the event loop.
+
+        Args:
+            objs (list): The documents to insert.
+            ordered (bool): If False, the server keeps inserting after a failed document.
+
+        Returns:
+            InsertManyResult: A result object containing the inserted ids.
+        """
+        return await self.run_in_executor(self.insert_many_doc, objs, ordered)
+
+    async def afind_all_doc(self):
+        """
+        Retrieve all documents from the collection without blocking the event loop.
+
+        Args:
+            None
+
+        Returns:
+            list: All documents in the collection.
+        """
+        return await self.run_in_executor(
+            lambda: list(self.find_all_doc())
+        )
+
+    async def adelete_one_doc(self, obj):
+        """
+        Delete a single document without blocking the event loop.
+
+        Args:
+            obj (dict): A dictionary specifying the filter
+
+        Returns:
+            DeleteResult: A result object containing information about the operation.
+        """
+        return await self.run_in_executor(self.delete_one_doc, obj)
+
+    async def afind_one_doc(self, obj):
+        """
+        Find a single document without blocking the event loop.
+
+        Args:
+            obj (dict): A dictionary specifying the filter
+
+        Returns:
+            Optional[dict]: A dictionary representing the found document
+        """
+        return await self.run_in_executor(self.find_one_doc, obj)
+
     async def find_with_filter(
         self,
         filter_obj,
@@ -125,7 +232,7 @@ class CRUDDocuments():
             limit (int): Optional. The maximum number of documents to return.
 
         Returns:
-            pymongo.cursor.Cursor: A cursor to iterate over the matching documents.
+            list: The matching documents.
         """
         cursor = self.collection.find(filter=filter_obj)
         if sort_by:
@@ -136,7 +243,9 @@ class CRUDDocuments():
 
         if limit > 0:
             cursor = cursor.limit(limit)
-        return cursor
+
+        # The cursor is lazy, the round-trip happens while it is consumed.
+        return await self.run_in_executor(list, cursor)
 
     async def find_many_doc(self, obj):
         """
@@ -146,9 +255,11 @@ class CRUDDocuments():
             obj (dict): A dictionary representing the filter criteria.
 
         Returns:
-            AsyncIterator: An asynchronous iterator.
+            list: The matching documents.
         """
-        return self.collection.find(filter=obj)
+        return await self.run_in_executor(
+            lambda: list(self.collection.find(filter=obj))
+        )
 
     async def delete_many_doc(self, obj):
         """
@@ -160,4 +271,7 @@ class CRUDDocuments():
         Returns:
             DeleteResult: A result object containing information about the operation.
         """
-        return self.collection.delete_many(filter=obj)
+        return await self.run_in_executor(
+            self.collection.delete_many,
+            filter=obj
+        )
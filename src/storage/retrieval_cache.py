@@ -0,0 +1,196 @@
+"""
+In-process cache of hybrid retrieval results.
+
+Results are keyed on the normalized query, the top k and alpha of the
+retriever and the knowledge base version. `WeaviateDB` bumps the version after
+every insertion and deletion, which drops every cached result, so a retrieval
+never returns nodes from before a change made in this process. Changes made by
+another worker bump it when `WeaviateDB` finds them, every
+KNOWLEDGE_SYNC_INTERVAL seconds; entries also expire after RETRIEVAL_CACHE_TTL
+seconds.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple
+)
+from dotenv import load_dotenv
+from llama_index.core.schema import NodeWithScore
+
+from src.storage.embedding_cache import normalize_query
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+RETRIEVAL_CACHE_ENABLED = convert_value(os.getenv("RETRIEVAL_CACHE_ENABLED", "true"))
+RETRIEVAL_CACHE_MAX_SIZE = convert_value(os.getenv("RETRIEVAL_CACHE_MAX_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL = convert_value(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+
+
+class RetrievalCache:
+    """
+    A bounded LRU of retrieved nodes, safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RETRIEVAL_CACHE_MAX_SIZE,
+        ttl: float = RETRIEVAL_CACHE_TTL,
+        enabled: bool = RETRIEVAL_CACHE_ENABLED
+    ) -> None:
+        """
+        Initializes the RetrievalCache.
+
+        Args:
+            max_size (int): Maximum number of cached results.
+            ttl (float): Time to live of a result, in seconds.
+            enabled (bool): Whether results are cached at all.
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._enabled = enabled
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "stale_stores": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether results are cached at all.
+        """
+        return self._enabled
+
+    @property
+    def version(self) -> int:
+        """
+        The knowledge base version; bumped on every change.
+        """
+        return self._version
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters, the current size and the knowledge base version.
+        """
+        lookups = self._counters["hits"] + self._counters["misses"]
+
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "version": self._version,
+            "hit_rate": self._counters["hits"] / lookups if lookups else 0.0
+        }
+
+    @staticmethod
+    def key(query: str, *params: Hashable) -> Tuple:
+        """
+        The cache key of a query for a retriever with the given parameters.
+        """
+        return (normalize_query(query), *params)
+
+    def get_entry(self, key: Tuple) -> Optional[Tuple[List[NodeWithScore], Optional[List[float]]]]:
+        """
+        Returns the cached nodes of a key at the current version, with the query
+        embedding they were retrieved with, or None.
+
+        Args:
+            key (Tuple): The key made by `key`.
+
+        Returns:
+            Optional[Tuple[List[NodeWithScore], Optional[List[float]]]]: New
+                NodeWithScore objects and the embedding, None if it was not
+                stored; None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get((self._version, key))
+            if entry is not None and time.monotonic() - entry["created_at"] > self._ttl:
+                del self._entries[(self._version, key)]
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            self._entries.move_to_end((self._version, key))
+            self._counters["hits"] += 1
+
+        nodes = [NodeWithScore(node=node, score=score) for node, score in entry["nodes"]]
+        embedding = list(entry["embedding"]) if entry["embedding"] is not None else None
+
+        return nodes, embedding
+
+    def get(self, key: Tuple) -> Optional[List[NodeWithScore]]:
+        """
+        Returns the cached nodes of a key at the current version, or None.
+
+        Args:
+            key (Tuple): The key made by `key`.
+
+        Returns:
+            Optional[List[NodeWithScore]]: New NodeWithScore objects, or None on a miss.
+        """
+        entry = self.get_entry(key)
+
+        return entry[0] if entry is not None else None
+
+    def put(
+        self,
+        key: Tuple,
+        nodes: List[NodeWithScore],
+        version: int,
+        embedding: Optional[List[float]] = None
+    ) -> None:
+        """
+        Caches the nodes retrieved for a key.
+
+        Args:
+            key (Tuple): The key made by `key`.
+            nodes (List[NodeWithScore]): The retrieved nodes.
+            version (int): The version read before retrieving; results of an
+                           older version are not stored.
+            embedding (Optional[List[float]]): The query embedding the nodes
+                                               were retrieved with, if any.
+        """
+        with self._lock:
+            if version != self._version:
+                self._counters["stale_stores"] += 1
+                return
+
+            self._entries[(version, key)] = {
+                "nodes": tuple((node.node, node.score) for node in nodes),
+                "embedding": tuple(embedding) if embedding is not None else None,
+                "created_at": time.monotonic()
+            }
+            self._entries.move_to_end((version, key))
+            self._counters["stores"] += 1
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def bump_version(self) -> None:
+        """
+        Marks the knowledge base as changed, dropping every cached result.
+        """
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._counters["invalidations"] += 1
+
+
+retrieval_cache = RetrievalCache()
@@ -4,10 +4,12 @@ for managing a vector store using Weaviate and LlamaIndex.
 """
 
 import os
+import asyncio
 from typing import List, Optional
 from dotenv import load_dotenv
 import weaviate
-from llama_index.core import VectorStoreIndex, StorageContext
+from llama_index.core import VectorStoreIndex, StorageContext, Settings
+from llama_index.core.indices.utils import embed_nodes
 from llama_index.vector_stores.weaviate import WeaviateVectorStore
 from llama_index.core.schema import (
     Document,
@@ -23,6 +25,17 @@ from scrapegraphai.graphs import SmartScraperGraph
 from src.utils.utility import convert_value
 from src.prompt.loader_prompt import URL_SPLITER_PROMPT
 from src.utils.openai_call import get_major_name_from_link
+from src.services.logger import DSCLogger
+from src.storage.retrieval_cache import (
+    RetrievalCache,
+    retrieval_cache
+)
+from src.utils.token_budget import set_token_count
+from src.storage.local_index import (
+    LOCAL_INDEX_MODE,
+    LocalVectorIndex,
+    object_ids
+)
 
 load_dotenv()
 
@@ -35,6 +48,19 @@ MONGODB_NAME = convert_value(os.getenv("MONGODB_NAME"))
 OPENAI_MODEL_GRAPH = convert_value(os.getenv("OPENAI_MODEL_GRAPH"))
 OPENAI_EMBED_MODEL = convert_value(os.getenv("OPENAI_EMBED_MODEL"))
 CHUNK_SIZE = convert_value(os.getenv("CHUNK_SIZE"))
+# Seconds between two checks of the knowledge base for changes made by another
+# worker, 0 to disable.
+KNOWLEDGE_SYNC_INTERVAL = convert_value(os.getenv("KNOWLEDGE_SYNC_INTERVAL", "30"))
+
+LOG_LEVEL = convert_value(os.environ.get("LOG_LEVEL"))
+WRITE_LOG_TO_FILE = convert_value(os.environ.get("WRITE_LOG_TO_FILE"))
+FILE_NAME = convert_value(os.environ.get("FILE_NAME"))
+
+log = DSCLogger(
+    file_name=FILE_NAME,
+    write_to_file=WRITE_LOG_TO_FILE,
+    mode=LOG_LEVEL
+)
 
 
 class WeaviateDB:
@@ -51,15 +77,25 @@ class WeaviateDB:
         mongodb_url: str = MONGODB_URL,
         mongodb_name: str = MONGODB_NAME,
         documents: List[Document] = None,
+        local_index_mode: str = LOCAL_INDEX_MODE,
+        cache: RetrievalCache = retrieval_cache,
+        sync_interval: float = KNOWLEDGE_SYNC_INTERVAL,
     ):
         """
         Initializes the WeaviateDB class with the specified host, port
         and index name for the Weaviate instance,
         and optionally a list of documents.
+
+        Unless `local_index_mode` is "off", the knowledge base collection is
+        also mirrored in an in-process `LocalVectorIndex`. Every change of the
+        knowledge base bumps the version of `cache`; once `start` was awaited,
+        so do the changes made by another worker, found by reading the object
+        IDs of the collection every `sync_interval` seconds.
         """
         self._host = host
         self._port = port
         self._index_name = index_name
+        self._cache = cache
         self._suggestion_name = suggestion_name
         self._documents = documents
         self._mongodb_url = mongodb_url
@@ -95,6 +131,13 @@ class WeaviateDB:
         self._suggestion_index = VectorStoreIndex.from_vector_store(
             vector_store=self._suggestion_vector_store
         )
+        self._sync_interval = sync_interval
+        self._sync_task: asyncio.Task = None
+        self._known_ids = None
+        self._local_index = None
+        if local_index_mode != "off":
+            self._local_index = LocalVectorIndex()
+            self._local_index.load_from_weaviate(self._client, self._index_name)
 
     @property
     def index(self) -> VectorStoreIndex:
@@ -110,6 +153,69 @@ class WeaviateDB:
         """
         return self._index
 
+    @property
+    def local_index(self) -> Optional[LocalVectorIndex]:
+        """
+        The in-process mirror of the knowledge base, None if disabled.
+        """
+        return self._local_index
+
+    async def start(self) -> None:
+        """
+        Starts the periodic sync of the knowledge base on the running event loop.
+        """
+        if not self._sync_interval or self._sync_task is not None:
+            return
+
+        self._sync_task = asyncio.create_task(self._sync_knowledge_base())
+
+    async def stop(self) -> None:
+        """
+        Stops the periodic sync of the knowledge base.
+        """
+        if self._sync_task is None:
+            return
+
+        self._sync_task.cancel()
+        try:
+            await self._sync_task
+        except asyncio.CancelledError:
+            pass
+        self._sync_task = None
+
+    async def sync_knowledge_base(self) -> bool:
+        """
+        Bumps the knowledge base version if the collection changed since the
+        last check, reloading the local index if any.
+
+        Returns:
+            bool: Whether a change was found; the first check only records the IDs.
+        """
+        stored_ids = await asyncio.to_thread(object_ids, self._client, self._index_name)
+        changed = self._known_ids is not None and stored_ids != self._known_ids
+        self._known_ids = stored_ids
+
+        if self._local_index is not None:
+            reloaded = await asyncio.to_thread(
+                self._local_index.sync, self._client, self._index_name, stored_ids
+            )
+            changed = changed or reloaded
+        if changed:
+            self._cache.bump_version()
+
+        return changed
+
+    async def _sync_knowledge_base(self) -> None:
+        """
+        Checks the knowledge base for changes made by another worker, periodically.
+        """
+        while True:
+            try:
+                await self.sync_knowledge_base()
+            except Exception as e:
+                log.error(f"Failed to sync the knowledge base: {e}")
+            await asyncio.sleep(self._sync_interval)
+
     @property
     def client(self) -> weaviate:
         """
@@ -355,7 +461,8 @@ class WeaviateDB:
         nodes: List[TextNode]
     ) -> str:
         """
-        Adds a list of nodes into the vector store.
+        Adds a list of nodes into the vector store, storing the token count
+        of each node in its metadata first.
 
         Args:
             nodes (List[Node]): List of nodes to be added.
@@ -363,8 +470,28 @@ class WeaviateDB:
         Returns:
             None
         """
-        if nodes:
+        if not nodes:
+            return
+
+        for node in nodes:
+            set_token_count(node)
+
+        if self._local_index is None:
             self._index.insert_nodes(nodes=nodes)
+            self._cache.bump_version()
+            return
+
+        # Embedded once for both indexes; the copies keep the embeddings out
+        # of the nodes written to the docstore.
+        embeddings = embed_nodes(nodes, Settings.embed_model, show_progress=False)
+        embedded_nodes = []
+        for node in nodes:
+            embedded_node = node.copy()
+            embedded_node.embedding = embeddings[node.node_id]
+            embedded_nodes.append(embedded_node)
+        self._index.insert_nodes(nodes=embedded_nodes)
+        self._local_index.add(embedded_nodes)
+        self._cache.bump_version()
 
     def delete_nodes(
         self,
@@ -381,6 +508,9 @@ class WeaviateDB:
         """
         if ref_doc_id:
             self._index.delete_ref_doc(ref_doc_id=ref_doc_id)
+            if self._local_index is not None:
+                self._local_index.delete_ref_doc(ref_doc_id)
+            self._cache.bump_version()
 
     def insert_docstore(
         self,
@@ -479,7 +609,7 @@ class WeaviateDB:
             nodes = self.documents_to_nodes(documents=processed_documents)
             title = os.path.basename(file_name)
             vietnamese_title = await get_major_name_from_link(title)
-            print("Tiêu đề:", vietnamese_title.text)
+            log.info("Tiêu đề", title=vietnamese_title.text)
             # For each node add vietnamese_title in node.text
 
             for node in nodes:
@@ -506,13 +636,14 @@ class WeaviateDB:
                 and node.ref_doc_id not in ref_doc_ids
             ):
                 self.delete_nodes(ref_doc_id=node.ref_doc_id)
-                print(f"delete node with ref_doc_id {node.ref_doc_id} successfully ")
                 self.delete_docstore(ref_doc_id=node.ref_doc_id)
-                print(
-                    f"delete doc from docstore with ref_doc_id {node.ref_doc_id} successfully "
-                )
                 ref_doc_ids.append(node.ref_doc_id)
 
+        log.info(
+            f"Deleted {len(ref_doc_ids)} documents with public_id {public_id}",
+            ref_doc_ids=ref_doc_ids
+        )
+
     def delete_collection(
         self,
         collection_name: str = None
@@ -528,3 +659,6 @@ class WeaviateDB:
             None
         """
         self._client.collections.delete(name=collection_name)
+        if self._local_index is not None and collection_name == self._index_name:
+            self._local_index.clear()
+        self._cache.bump_version()
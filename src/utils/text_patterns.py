@@ -0,0 +1,358 @@
+"""
+Precompiled patterns and matchers used by the query preprocessing.
+
+Everything here is compiled once at import and shared by every
+PreprocessQuestion, instead of being rebuilt on each call.
+"""
+
+import re
+from bisect import (
+    bisect_left,
+    bisect_right
+)
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+# Words made of word characters, separated by single spaces.
+_WORDS = re.compile(r'\w+(?: \w+)*')
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+EMOJI_PATTERN = re.compile(
+    "["
+    u"\U0001F600-\U0001F64F"
+    u"\U0001F300-\U0001F5FF"
+    u"\U0001F680-\U0001F6FF"
+    u"\U0001F700-\U0001F77F"
+    u"\U0001F780-\U0001F7FF"
+    u"\U0001F800-\U0001F8FF"
+    u"\U0001F900-\U0001F9FF"
+    u"\U0001FA00-\U0001FA6F"
+    u"\U0001FA70-\U0001FAFF"
+    u"\U00002702-\U000027B0"
+    u"\U000024C2-\U0001F251"
+    "]+",
+    flags=re.UNICODE
+)
+
+EMOTICON_PATTERN = re.compile(r"(:|=|;)(\)+|\(+|D+|P+)")
+
+VIETNAMESE_CHARACTERS = r"[0-9a-zA-ZaăâbcdđeêghiklmnoôơpqrstuưvxyàằầbcdđèềghìklmnòồờpqrstùừvxỳáắấbcdđéếghíklmnóốớpqrstúứvxýảẳẩbcdđẻểghỉklmnỏổởpqrstủửvxỷạặậbcdđẹệghịklmnọộợpqrstụựvxỵãẵẫbcdđẽễghĩklmnõỗỡpqrstũữvxỹAĂÂBCDĐEÊGHIKLMNOÔƠPQRSTUƯVXYÀẰẦBCDĐÈỀGHÌKLMNÒỒỜPQRSTÙỪVXỲÁẮẤBCDĐÉẾGHÍKLMNÓỐỚPQRSTÚỨVXÝẠẶẬBCDĐẸỆGHỊKLMNỌỘỢPQRSTỤỰVXỴẢẲẨBCDĐẺỂGHỈKLMNỎỔỞPQRSTỦỬVXỶÃẴẪBCDĐẼỄGHĨKLMNÕỖỠPQRSTŨỮVXỸ,._]"
+
+# The character class above is nested in a second one, so the pattern closes at
+# the first "]": it matches a character outside the class, a whitespace and a
+# literal "]". It can only match a text containing "]".
+NON_VIETNAMESE_PATTERN = re.compile(rf'[^{VIETNAMESE_CHARACTERS}\s]')
+
+# Letters no other Latin-script language writes: ă, đ, ĩ, ũ, ơ, ư and the precomposed
+# vowels of the Latin Extended Additional block (U+1EA0-U+1EF9).
+VIETNAMESE_SPECIFIC_LETTERS = "ăđĩũơưĂĐĨŨƠƯ\u1ea0-\u1ef9"
+VIETNAMESE_WORD_PATTERN = re.compile(rf"[^\W\d_]*[{VIETNAMESE_SPECIFIC_LETTERS}]\w*")
+LETTER_WORD_PATTERN = re.compile(r"\w*[^\W\d_]\w*")
+
+SYMBOL_REPLACEMENTS = (
+    (">", " lớn hơn "),
+    ("<", " bé hơn "),
+    ("=", " bằng "),
+    ("$", " "),
+    ("#", " "),
+    ("^", " "),
+    ("/", " "),
+    ("!", " ")
+)
+
+
+def is_word_char(char: str) -> bool:
+    """
+    Whether a character matches `\\w` in a unicode `re` pattern.
+    """
+    return char.isalnum() or char == "_"
+
+
+def vietnamese_word_ratio(text: str) -> float:
+    """
+    The share of the words of a text that contain a letter specific to Vietnamese.
+    """
+    words = len(LETTER_WORD_PATTERN.findall(text))
+    if not words:
+        return 0.0
+
+    return len(VIETNAMESE_WORD_PATTERN.findall(text)) / words
+
+
+class SynonymMatcher:
+    """
+    Rewrites synonyms into their keyword, with the exact semantics of applying
+    `re.sub(r'\\b<synonym>\\b', keyword, text)` for every keyword and synonym of
+    the dictionary in order.
+
+    Replacements chain: the keyword written by one rule can be matched by a later
+    rule, and a short synonym applied early wins over a longer one applied later.
+    A plain longest-first alternation would therefore change the output. Instead,
+    one scan of the text over a trie of all synonyms finds which rules can fire,
+    only those rules are applied, in dictionary order, and the text is rescanned
+    only after a rule actually changed it.
+    """
+
+    _END = ""
+
+    def __init__(self, synonym_dict: Dict[str, List[str]]) -> None:
+        """
+        Compiles the rules of a synonym dictionary.
+
+        Args:
+            synonym_dict (Dict[str, List[str]]): Keywords mapped to their synonyms.
+        """
+        self.source = synonym_dict
+        self._rules: List[Tuple[re.Pattern, str]] = []
+        self._trie: Dict = {}
+        # Rules whose synonym does not start and end with a word character have
+        # different `\b` semantics; they are always applied, without the trie.
+        self._unindexed: List[int] = []
+
+        for keyword, synonyms in synonym_dict.items():
+            keyword = keyword.lower()
+            for synonym in synonyms:
+                synonym = synonym.strip().lower()
+                index = len(self._rules)
+                self._rules.append((
+                    re.compile(r'\b{}\b'.format(re.escape(synonym))),
+                    keyword
+                ))
+                if synonym and is_word_char(synonym[0]) and is_word_char(synonym[-1]):
+                    self._insert(synonym, index)
+                else:
+                    self._unindexed.append(index)
+
+    def _insert(self, synonym: str, index: int) -> None:
+        """
+        Adds a synonym to the trie, under the index of its rule.
+        """
+        node = self._trie
+        for char in synonym:
+            node = node.setdefault(char, {})
+        node.setdefault(self._END, []).append(index)
+
+    def _firing_rules(self, text: str, after: int = -1) -> List[int]:
+        """
+        Returns the indexes, in order, of the rules that match the text.
+
+        A synonym starting and ending with a word character matches `\\b...\\b`
+        exactly when it starts at the beginning of a word and ends at the end
+        of one, so the trie is only walked from word starts.
+        """
+        firing = set(index for index in self._unindexed if index > after)
+        length = len(text)
+
+        for start in range(length):
+            if not is_word_char(text[start]) or (start > 0 and is_word_char(text[start - 1])):
+                continue
+
+            node = self._trie
+            position = start
+            while position < length:
+                node = node.get(text[position])
+                if node is None:
+                    break
+                position += 1
+                indexes = node.get(self._END)
+                if indexes and (position == length or not is_word_char(text[position])):
+                    firing.update(index for index in indexes if index > after)
+
+        return sorted(firing)
+
+    def replace(self, text: str) -> str:
+        """
+        Replaces the synonyms of a lowercased text by their keyword.
+
+        Args:
+            text (str): The lowercased text.
+
+        Returns:
+            str: The text with synonyms replaced.
+        """
+        firing = self._firing_rules(text)
+
+        while firing:
+            index = firing.pop(0)
+            pattern, keyword = self._rules[index]
+            replaced = pattern.sub(keyword, text)
+            if replaced != text:
+                text = replaced
+                firing = self._firing_rules(text, after=index)
+
+        return text
+
+
+class FillerWordRemover:
+    """
+    Removes filler words with the exact semantics of applying
+    `re.sub(r'\\b<word>\\b', '', text)` for every word of the list in order.
+
+    A word containing an earlier word can never match, since that earlier word
+    is removed from every occurrence first, so it is dropped. When the remaining
+    words cannot partially overlap each other, removing them in order removes
+    the same spans as one leftmost alternation in list order, and a single
+    compiled pattern is used. Otherwise the words are applied one by one.
+    """
+
+    def __init__(self, filler_words: List[str]) -> None:
+        """
+        Compiles a list of filler words.
+
+        Args:
+            filler_words (List[str]): The filler words, in order.
+        """
+        self.source = filler_words
+        words = [word.strip().lower() for word in filler_words]
+        words = [word for word in words if word]
+        live = self._live_words(words)
+
+        if live is not None and self._disjoint(live):
+            self.pattern = re.compile(r'\b(?:{})\b'.format(
+                "|".join(re.escape(word) for word in live)))
+            self._patterns = None
+        else:
+            self.pattern = None
+            self._patterns = [
+                re.compile(r'\b{}\b'.format(re.escape(word))) for word in words
+            ]
+
+    @staticmethod
+    def _live_words(words: List[str]) -> Optional[List[str]]:
+        """
+        Drops the words that contain an earlier word, or returns None if a word
+        is not made of word characters separated by single spaces.
+        """
+        live = []
+        for index, word in enumerate(words):
+            if not _WORDS.fullmatch(word):
+                return None
+            if any(
+                re.search(r'\b{}\b'.format(re.escape(earlier)), word)
+                for earlier in words[:index]
+            ):
+                continue
+            live.append(word)
+
+        return live
+
+    @staticmethod
+    def _disjoint(words: List[str]) -> bool:
+        """
+        Whether no word ends with the first tokens of another (or of itself).
+        """
+        tokens = [tuple(word.split(" ")) for word in words]
+        for first in tokens:
+            for second in tokens:
+                for size in range(1, min(len(first), len(second))):
+                    if first[-size:] == second[:size]:
+                        return False
+
+        return True
+
+    def remove(self, text: str) -> str:
+        """
+        Removes the filler words of a lowercased text, leaving the spaces around them.
+
+        Args:
+            text (str): The lowercased text.
+
+        Returns:
+            str: The text without filler words.
+        """
+        if self.pattern is not None:
+            return self.pattern.sub('', text)
+
+        for pattern in self._patterns:
+            text = pattern.sub('', text)
+
+        return text
+
+
+def _ratio(matches: int, length: int) -> float:
+    """
+    The similarity ratio of `SequenceMatcher`, from a number of matching characters.
+    """
+    return 2.0 * matches / length if length else 1.0
+
+
+class ShortChatMatcher:
+    """
+    Finds the short chat most similar to a text, with the same result as computing
+    `SequenceMatcher(None, text, chat).ratio()` against every chat of the list.
+
+    The ratio is 2 * M / (len(text) + len(chat)), and the number of matching
+    characters M is at most the length of the shorter string and at most the
+    size of the intersection of their character multisets. The chats are indexed
+    by length, so only those of a compatible length are looked at, the multiset
+    bound discards most of the rest, and the exact ratio is only computed for the
+    few chats that can still reach the threshold.
+    """
+
+    def __init__(self, short_chats: List[str]) -> None:
+        """
+        Indexes a list of short chats.
+
+        Args:
+            short_chats (List[str]): The short chats, in order.
+        """
+        self.source = short_chats
+        entries = sorted(
+            (len(chat), index, chat, Counter(chat))
+            for index, chat in enumerate(short_chats)
+        )
+        self._lengths = [entry[0] for entry in entries]
+        self._entries = [entry[1:] for entry in entries]
+
+    def match(self, text: str, threshold: float) -> Tuple[Optional[str], float]:
+        """
+        Returns the first chat of the list with the highest ratio, if it reaches the threshold.
+
+        Args:
+            text (str): The normalized text.
+            threshold (float): The minimum similarity ratio.
+
+        Returns:
+            Tuple[Optional[str], float]: The best chat and its ratio, or (None, 0.0).
+        """
+        length = len(text)
+        # Lengths outside this window cannot reach the threshold; the window is
+        # widened by one on each side and the exact bound is checked below.
+        if threshold > 0:
+            low = bisect_left(self._lengths, length * threshold / (2 - threshold) - 1)
+            high = bisect_right(self._lengths, length * (2 - threshold) / threshold + 1)
+        else:
+            low, high = 0, len(self._lengths)
+
+        counts = None
+        best = None
+        best_index = len(self._lengths)
+        best_ratio = 0.0
+
+        for position in range(low, high):
+            chat_length = self._lengths[position]
+            index, chat, chat_counts = self._entries[position]
+            total = length + chat_length
+
+            if _ratio(min(length, chat_length), total) < threshold:
+                continue
+
+            if counts is None:
+                counts = Counter(text)
+            if _ratio(sum((counts & chat_counts).values()), total) < threshold:
+                continue
+
+            ratio = 1.0 if text == chat else SequenceMatcher(None, text, chat).ratio()
+            if ratio < threshold:
+                continue
+            if ratio > best_ratio or (ratio == best_ratio and index < best_index):
+                best, best_index, best_ratio = chat, index, ratio
+
+        return best, best_ratio
@@ -0,0 +1,138 @@
+"""
+This module fits retrieved nodes and chat history into a token budget.
+
+Token counts are computed once, when a node is ingested or a chat is stored,
+and kept with it (`token_count` in the node metadata and in the chat record),
+so assembling a context only adds numbers. Nodes and chats stored before the
+counts existed are encoded on demand, and memoized.
+"""
+
+import os
+from functools import lru_cache
+from typing import (
+    List,
+    Optional,
+    Sequence
+)
+from dotenv import load_dotenv
+import tiktoken
+from llama_index.core.schema import BaseNode
+
+from src.utils.utility import convert_value
+
+load_dotenv()
+
+# "greedy" keeps nodes in rank order until one does not fit; "knapsack" keeps
+# the subset with the highest total score that fits.
+CONTEXT_PACKING = convert_value(os.getenv("CONTEXT_PACKING", "greedy"))
+TOKEN_COUNT_KEY = "token_count"
+NODE_SEPARATOR = "\n" + "=" * 20 + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_encoding() -> tiktoken.Encoding:
+    """
+    The cl100k_base encoding, loaded on first use rather than at import.
+    """
+    return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    """
+    Counts the cl100k_base tokens of a text.
+    """
+    return len(get_encoding().encode(text))
+
+
+def render_node(node: BaseNode) -> str:
+    """
+    The text of a node as written into a context: its text, then its metadata.
+    """
+    metadata = {key: value for key, value in node.metadata.items() if key != TOKEN_COUNT_KEY}
+
+    return node.text + "\nmetadata:\n" + str(metadata)
+
+
+def set_token_count(node: BaseNode) -> None:
+    """
+    Stores the token count of the rendered node in its metadata.
+
+    The key is excluded from the embedded and LLM texts, so neither changes.
+    """
+    node.metadata = {**node.metadata, TOKEN_COUNT_KEY: count_tokens(render_node(node))}
+    for keys in ("excluded_embed_metadata_keys", "excluded_llm_metadata_keys"):
+        if TOKEN_COUNT_KEY not in getattr(node, keys):
+            setattr(node, keys, [*getattr(node, keys), TOKEN_COUNT_KEY])
+
+
+def node_token_count(node: BaseNode) -> int:
+    """
+    The token count of a rendered node, stored or computed.
+    """
+    count = node.metadata.get(TOKEN_COUNT_KEY)
+    if count is None:
+        return count_tokens(render_node(node))
+
+    return int(count)
+
+
+def history_record(position: int, query: str, answer: str) -> str:
+    """
+    A chat as written into the history prompt.
+
+    Positions are single tokens, so the token count of a record does not
+    depend on its position.
+    """
+    return f"question {position}: {query}\nanswer {position}: {answer}"
+
+
+def pack(
+    token_counts: Sequence[int],
+    scores: Sequence[Optional[float]],
+    max_tokens: int,
+    packing: str = CONTEXT_PACKING
+) -> List[int]:
+    """
+    Chooses the items that fit in a token budget.
+
+    Args:
+        token_counts (Sequence[int]): The token count of each item, in rank order.
+        scores (Sequence[Optional[float]]): Their relevance, at least 0 (lower
+                                            scores count as 0); None ranks by position.
+        max_tokens (int): The budget.
+        packing (str): "greedy" or "knapsack".
+
+    Returns:
+        List[int]: The positions of the chosen items, in rank order.
+    """
+    if packing == "greedy":
+        chosen, used = [], 0
+        for position, tokens in enumerate(token_counts):
+            if used + tokens > max_tokens:
+                break
+            chosen.append(position)
+            used += tokens
+        return chosen
+
+    if packing != "knapsack":
+        raise ValueError(f"Unknown context packing: {packing}")
+
+    # Best (score, positions) for each reachable total of tokens; few items
+    # are retrieved, so the reachable totals stay few.
+    best = {0: (0.0, ())}
+    for position, tokens in enumerate(token_counts):
+        score = scores[position]
+        value = 1.0 / (position + 1) if score is None else max(score, 0.0)
+        # Breaks ties by rank, so items worth nothing still fill the budget.
+        value += 1e-9 / (position + 1)
+        for used, (total, chosen) in list(best.items()):
+            if used + tokens > max_tokens:
+                continue
+            candidate = (total + value, chosen + (position,))
+            if used + tokens not in best or best[used + tokens][0] < candidate[0]:
+                best[used + tokens] = candidate
+
+    _, chosen = max(best.values(), key=lambda state: state[0])
+
+    return list(chosen)
@@ -0,0 +1,250 @@
+"""
+Ordering, discards, retries and shutdown of the batched Mongo writer.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo.errors import BulkWriteError  # noqa: E402
+
+from src.storage.batch_writer import (  # noqa: E402
+    DUPLICATE_KEY_ERROR,
+    BatchWriter
+)
+
+
+class FakeCollection:
+    """
+    A collection recording every `insert_many`. Each call can be held open
+    until `release` is set, and fails with the next error of `errors`, if any.
+    """
+
+    def __init__(self, errors=(), hold=False):
+        self.documents = []
+        self.calls = []
+        self.errors = list(errors)
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def ainsert_many_doc(self, documents, ordered):
+        self.calls.append(list(documents))
+        self.started.set()
+        await self.release.wait()
+
+        error = self.errors.pop(0) if self.errors else None
+        if error is None:
+            self.documents.extend(documents)
+            return
+        if isinstance(error, BulkWriteError):
+            failed = {e["index"] for e in error.details["writeErrors"]}
+            self.documents.extend(doc for idx, doc in enumerate(documents) if idx not in failed)
+        raise error
+
+
+def chat(room_id, index):
+    """
+    A chat document of a room.
+    """
+    return {"room_id": room_id, "query": f"q{index}"}
+
+
+def run(coroutine):
+    """
+    Runs a test coroutine on a fresh event loop.
+    """
+    return asyncio.run(coroutine)
+
+
+def test_put_is_refused_when_not_running():
+    writer = BatchWriter(collection=FakeCollection())
+
+    assert writer.put(chat("room", 0)) is False
+    assert writer.pending("room") == []
+
+
+def test_documents_are_written_in_order_in_batches():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BatchWriter(collection=collection, batch_size=3, flush_interval_ms=1)
+        await writer.start()
+        documents = [chat("room", index) for index in range(10)]
+        for document in documents:
+            assert writer.put(document)
+        await writer.stop()
+        return collection, writer, documents
+
+    collection, writer, documents = run(scenario())
+
+    assert collection.documents == documents
+    assert all(len(call) <= 3 for call in collection.calls)
+    assert writer.stats["written"] == 10
+    assert writer.pending("room") == []
+
+
+def test_pending_documents_until_written():
+    async def scenario():
+        collection = FakeCollection(hold=True)
+        writer = BatchWriter(collection=collection, flush_interval_ms=1)
+        await writer.start()
+        first, second, other = chat("room", 0), chat("room", 1), chat("other", 0)
+        for document in (first, second, other):
+            writer.put(document)
+
+        assert writer.pending("room") == [first, second]
+        assert writer.pending("other") == [other]
+        await collection.started.wait()
+        # Being written is not written yet.
+        assert writer.pending("room") == [first, second]
+
+        collection.release.set()
+        await writer.stop()
+        assert writer.pending("room") == []
+        assert writer.pending("other") == []
+
+    run(scenario())
+
+
+def test_discard_skips_queued_documents():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BatchWriter(collection=collection, flush_interval_ms=50)
+        await writer.start()
+        kept = chat("other", 0)
+        writer.put(chat("room", 0))
+        writer.put(kept)
+        writer.put(chat("room", 1))
+
+        assert await writer.discard("room") == 2
+        await writer.stop()
+        return collection, writer, kept
+
+    collection, writer, kept = run(scenario())
+
+    assert collection.documents == [kept]
+    assert writer.stats["discarded"] == 2
+    assert writer.pending("room") == []
+
+
+def test_discard_during_a_flush_waits_for_it():
+    async def scenario():
+        collection = FakeCollection(hold=True)
+        writer = BatchWriter(collection=collection, flush_interval_ms=1)
+        await writer.start()
+        in_flight = chat("room", 0)
+        writer.put(in_flight)
+        await collection.started.wait()
+        queued = chat("room", 1)
+        writer.put(queued)
+
+        discard = asyncio.create_task(writer.discard("room"))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # The flush lock is held by the write of `in_flight`.
+        assert not discard.done()
+
+        collection.release.set()
+        discarded = await discard
+        await writer.stop()
+        return collection, discarded, in_flight
+
+    collection, discarded, in_flight = run(scenario())
+
+    # Only the queued document could still be stopped.
+    assert discarded == 1
+    assert collection.documents == [in_flight]
+
+
+def test_failed_documents_of_a_discarded_room_are_not_retried():
+    async def scenario():
+        collection = FakeCollection(errors=[RuntimeError("down")], hold=True)
+        writer = BatchWriter(collection=collection, flush_interval_ms=1)
+        await writer.start()
+        writer.put(chat("room", 0))
+        await collection.started.wait()
+
+        discard = asyncio.create_task(writer.discard("room"))
+        collection.release.set()
+        await discard
+        await writer.stop()
+        return collection, writer
+
+    collection, writer = run(scenario())
+
+    assert len(collection.calls) == 1
+    assert collection.documents == []
+    assert writer.stats["dropped"] == 0
+
+
+def test_duplicate_keys_count_as_written_and_other_errors_are_retried():
+    async def scenario():
+        first, second, third = chat("room", 0), chat("room", 1), chat("room", 2)
+        error = BulkWriteError({"writeErrors": [
+            {"index": 0, "code": DUPLICATE_KEY_ERROR},
+            {"index": 1, "code": 121}
+        ]})
+        collection = FakeCollection(errors=[error])
+        writer = BatchWriter(collection=collection, flush_interval_ms=1)
+        await writer.start()
+        for document in (first, second, third):
+            writer.put(document)
+        while not writer.stats["failed_batches"]:
+            await asyncio.sleep(0.001)
+
+        # Still pending while it waits for its retry.
+        assert writer.pending("room") == [second]
+        await writer.stop()
+        return collection, writer, second
+
+    collection, writer, second = run(scenario())
+
+    assert collection.calls[1] == [second]
+    assert writer.stats["written"] == 3
+    assert writer.stats["dropped"] == 0
+    assert writer.pending("room") == []
+
+
+def test_stop_drains_the_queue_and_drops_after_one_retry():
+    async def scenario():
+        collection = FakeCollection(errors=[RuntimeError("down")] * 3)
+        writer = BatchWriter(collection=collection, batch_size=2, flush_interval_ms=1)
+        await writer.start()
+        documents = [chat("room", index) for index in range(2)]
+        for document in documents:
+            writer.put(document)
+        while not writer.stats["failed_batches"]:
+            await asyncio.sleep(0.001)
+
+        await writer.stop()
+        return collection, writer, documents
+
+    collection, writer, documents = run(scenario())
+
+    # The failed batch, then its single retry on shutdown.
+    assert collection.calls == [documents, documents]
+    assert writer.stats["dropped"] == 2
+    assert writer.stats["retrying"] == 0
+    assert writer.pending("room") == []
+    assert not writer.running
+
+
+def test_stop_flushes_documents_still_queued():
+    async def scenario():
+        collection = FakeCollection()
+        # A flush interval longer than the test: only `stop` can write them.
+        writer = BatchWriter(collection=collection, batch_size=2, flush_interval_ms=60000)
+        await writer.start()
+        documents = [chat("room", index) for index in range(5)]
+        for document in documents:
+            writer.put(document)
+        await writer.stop()
+        return collection, documents
+
+    collection, documents = run(scenario())
+
+    assert collection.documents == documents
+    assert [len(call) for call in collection.calls] == [2, 2, 1]
@@ -0,0 +1,70 @@
+"""
+Lookups, expiry and knowledge base versioning of `AnswerCache`.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from src.engines.cache_engine import AnswerCache  # noqa: E402
+from src.storage.retrieval_cache import RetrievalCache  # noqa: E402
+
+
+def run(coroutine):
+    """
+    Runs a coroutine to completion.
+    """
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def knowledge_base():
+    """
+    The holder of the knowledge base version, as bumped by `WeaviateDB`.
+    """
+    return RetrievalCache(max_size=8, ttl=60)
+
+
+def test_exact_hit(knowledge_base):
+    cache = AnswerCache(knowledge_base=knowledge_base)
+    run(cache.store("học phí là bao nhiêu", "10 triệu"))
+
+    assert run(cache.lookup("học phí là bao nhiêu")) == "10 triệu"
+    assert run(cache.lookup("điểm chuẩn")) is None
+    assert cache.stats["exact_hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_a_new_knowledge_base_version_drops_the_answers(knowledge_base):
+    cache = AnswerCache(knowledge_base=knowledge_base)
+    run(cache.store("học phí là bao nhiêu", "10 triệu"))
+
+    # Another worker changed the knowledge base, found by the periodic sync.
+    knowledge_base.bump_version()
+
+    assert run(cache.lookup("học phí là bao nhiêu")) is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_an_answer_computed_before_a_change_is_not_stored(knowledge_base):
+    cache = AnswerCache(knowledge_base=knowledge_base)
+    generation = cache.generation
+
+    knowledge_base.bump_version()
+    run(cache.store("học phí là bao nhiêu", "10 triệu", generation=generation))
+
+    assert run(cache.lookup("học phí là bao nhiêu")) is None
+
+
+def test_answers_expire(monkeypatch, knowledge_base):
+    now = [1000.0]
+    monkeypatch.setattr("src.engines.cache_engine.time.monotonic", lambda: now[0])
+    cache = AnswerCache(knowledge_base=knowledge_base, ttl=300)
+    run(cache.store("học phí là bao nhiêu", "10 triệu"))
+
+    now[0] += 299
+    assert run(cache.lookup("học phí là bao nhiêu")) == "10 triệu"
+    now[0] += 2
+    assert run(cache.lookup("học phí là bao nhiêu")) is None
+
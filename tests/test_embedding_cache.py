@@ -0,0 +1,119 @@
+"""
+LRU bounds and SQLite persistence of `EmbeddingCache`.
+"""
+
+import sqlite3
+
+import pytest
+
+import src.storage.embedding_cache as embedding_cache
+from src.storage.embedding_cache import (
+    EmbeddingCache,
+    normalize_query
+)
+
+MODEL = "text-embedding-3-small"
+
+
+def vector(seed):
+    """
+    An embedding that does not round-trip through float32.
+    """
+    return [seed / 3, -seed / 7, 0.1 + seed]
+
+
+@pytest.fixture
+def path(tmp_path):
+    """
+    A SQLite file in a directory that does not exist yet.
+    """
+    return str(tmp_path / "cache" / "embeddings.sqlite")
+
+
+def test_normalize_query():
+    assert normalize_query("  học   phí\n ngành khmt ") == "học phí ngành khmt"
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = EmbeddingCache(max_size=2, path=None)
+    cache.remember(MODEL, "a", vector(1))
+    cache.remember(MODEL, "b", vector(2))
+
+    assert cache.lookup(MODEL, "a") == vector(1)
+    cache.remember(MODEL, "c", vector(3))
+
+    assert cache.lookup(MODEL, "b") is None
+    assert cache.lookup(MODEL, "a") == vector(1)
+    assert cache.lookup(MODEL, "c") == vector(3)
+    assert cache.stats["size"] == 2
+    assert cache.stats["evictions"] == 1
+
+
+def test_keys_are_per_model_and_normalized():
+    cache = EmbeddingCache(max_size=8, path=None)
+    cache.put(MODEL, "  học   phí ", vector(1))
+
+    assert cache.get(MODEL, "học phí") == vector(1)
+    assert cache.get("other-model", "học phí") is None
+
+
+def test_lookup_does_not_count_misses_and_load_does():
+    cache = EmbeddingCache(max_size=8, path=None)
+
+    assert cache.lookup(MODEL, "a") is None
+    assert cache.stats["misses"] == 0
+    assert cache.load(MODEL, "a") is None
+    assert cache.stats["misses"] == 1
+    assert not cache.persistent
+
+
+def test_embeddings_are_read_back_from_the_file(path):
+    writer = EmbeddingCache(max_size=8, path=path)
+    writer.put(MODEL, "học phí", vector(1))
+    writer.close()
+
+    reader = EmbeddingCache(max_size=8, path=path)
+
+    assert reader.persistent
+    # Not in memory until `load` read it from the file.
+    assert reader.lookup(MODEL, "học phí") is None
+    assert reader.load(MODEL, "  học phí ") == vector(1)
+    assert reader.lookup(MODEL, "học phí") == vector(1)
+    assert reader.stats["disk_hits"] == 1
+    assert reader.stats["hits"] == 1
+    reader.close()
+
+
+def test_remember_does_not_write_the_file(path):
+    cache = EmbeddingCache(max_size=8, path=path)
+    cache.remember(MODEL, "a", vector(1))
+    cache.persist(MODEL, "b", vector(2))
+
+    reader = EmbeddingCache(max_size=8, path=path)
+
+    assert reader.load(MODEL, "a") is None
+    assert reader.load(MODEL, "b") == vector(2)
+    cache.close()
+    reader.close()
+
+
+def test_file_is_trimmed_to_its_newest_rows(path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "DISK_TRIM_INTERVAL", 5)
+    cache = EmbeddingCache(max_size=1, path=path, disk_max_size=3)
+    for index in range(10):
+        cache.persist(MODEL, f"q{index}", vector(index))
+    cache.close()
+
+    with sqlite3.connect(path) as connection:
+        queries = [row[0] for row in connection.execute("SELECT query FROM embeddings")]
+
+    assert sorted(queries) == ["q7", "q8", "q9"]
+
+
+def test_unusable_file_falls_back_to_memory(tmp_path):
+    # A directory where the file should be.
+    cache = EmbeddingCache(max_size=8, path=str(tmp_path))
+    cache.put(MODEL, "a", vector(1))
+
+    assert cache.get(MODEL, "a") == vector(1)
+    assert cache.load(MODEL, "b") is None
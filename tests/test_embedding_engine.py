@@ -0,0 +1,214 @@
+"""
+Caching, coalescing and the off-loop file access of `CachedEmbedding`.
+"""
+
+import asyncio
+from typing import (
+    List,
+    Optional
+)
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.base.embeddings.base import BaseEmbedding  # noqa: E402
+from llama_index.core.bridge.pydantic import PrivateAttr  # noqa: E402
+
+from src.engines.embedding_engine import CachedEmbedding  # noqa: E402
+from src.storage.embedding_cache import EmbeddingCache  # noqa: E402
+
+
+class StubEmbedding(BaseEmbedding):
+    """
+    An embedding model recording its query calls; the async ones wait for
+    `release` when it is set, and raise `error` when there is one.
+    """
+
+    _calls: List[str] = PrivateAttr()
+    _release: Optional[asyncio.Event] = PrivateAttr()
+    _error: Optional[Exception] = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(model_name="stub", **kwargs)
+        self._calls = []
+        self._release = None
+        self._error = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubEmbedding"
+
+    @staticmethod
+    def vector(text):
+        return [float(len(text)), sum(map(ord, text)) / 7, 0.1]
+
+    def _get_query_embedding(self, query):
+        self._calls.append(query)
+        return self.vector(query)
+
+    async def _aget_query_embedding(self, query):
+        self._calls.append(query)
+        if self._release is not None:
+            await self._release.wait()
+        if self._error is not None:
+            raise self._error
+        return self.vector(query)
+
+    def _get_text_embedding(self, text):
+        return self.vector(text)
+
+
+@pytest.fixture
+def stub():
+    return StubEmbedding()
+
+
+@pytest.fixture
+def to_thread(monkeypatch):
+    """
+    Records the functions `CachedEmbedding` runs in a thread.
+    """
+    calls = []
+    run = asyncio.to_thread
+
+    async def recording(func, *args, **kwargs):
+        calls.append(func.__name__)
+        return await run(func, *args, **kwargs)
+
+    monkeypatch.setattr("src.engines.embedding_engine.asyncio.to_thread", recording)
+
+    return calls
+
+
+async def settle():
+    """
+    Lets the tasks started so far run until they block.
+    """
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_sync_queries_are_embedded_once(stub):
+    embed_model = CachedEmbedding(stub, cache=EmbeddingCache(max_size=8, path=None))
+
+    first = embed_model.get_query_embedding("học phí")
+    second = embed_model.get_query_embedding("  học   phí ")
+
+    assert first == second == stub.vector("học phí")
+    assert stub._calls == ["học phí"]
+
+
+def test_text_embeddings_are_not_cached(stub):
+    cache = EmbeddingCache(max_size=8, path=None)
+    embed_model = CachedEmbedding(stub, cache=cache)
+
+    embed_model.get_text_embedding("học phí")
+
+    assert cache.lookup("stub", "học phí") is None
+
+
+def test_concurrent_misses_share_one_call(stub):
+    async def scenario():
+        embed_model = CachedEmbedding(stub, cache=EmbeddingCache(max_size=8, path=None))
+        stub._release = asyncio.Event()
+        tasks = [
+            asyncio.create_task(embed_model.aget_query_embedding(query))
+            for query in ["học phí", "học  phí", " học phí ", "học phí"]
+        ]
+        await settle()
+        stub._release.set()
+        return embed_model, await asyncio.gather(*tasks)
+
+    embed_model, embeddings = asyncio.run(scenario())
+
+    assert stub._calls == ["học phí"]
+    assert all(embedding == stub.vector("học phí") for embedding in embeddings)
+    assert embed_model.stats["coalesced"] == 3
+    assert embed_model.stats["misses"] == 1
+
+
+def test_waiters_get_the_error_of_the_shared_call(stub):
+    async def scenario():
+        embed_model = CachedEmbedding(stub, cache=EmbeddingCache(max_size=8, path=None))
+        stub._release = asyncio.Event()
+        stub._error = RuntimeError("rate limited")
+        tasks = [
+            asyncio.create_task(embed_model.aget_query_embedding("học phí")) for _ in range(3)
+        ]
+        await settle()
+        stub._release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Nothing was cached and nothing is left in flight: the next call retries.
+        stub._error = None
+        retried = await embed_model.aget_query_embedding("học phí")
+        return results, retried
+
+    results, retried = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == stub.vector("học phí")
+    assert len(stub._calls) == 2
+
+
+def test_waiters_call_again_when_the_caller_is_cancelled(stub):
+    async def scenario():
+        embed_model = CachedEmbedding(stub, cache=EmbeddingCache(max_size=8, path=None))
+        stub._release = asyncio.Event()
+        leader = asyncio.create_task(embed_model.aget_query_embedding("học phí"))
+        await settle()
+        waiter = asyncio.create_task(embed_model.aget_query_embedding("học phí"))
+        await settle()
+
+        leader.cancel()
+        await settle()
+        stub._release.set()
+        return await waiter, leader.cancelled()
+
+    embedding, cancelled = asyncio.run(scenario())
+
+    assert cancelled
+    assert embedding == StubEmbedding.vector("học phí")
+    assert stub._calls == ["học phí", "học phí"]
+
+
+def test_memory_only_cache_never_leaves_the_loop(stub, to_thread):
+    async def scenario():
+        embed_model = CachedEmbedding(stub, cache=EmbeddingCache(max_size=8, path=None))
+        await embed_model.aget_query_embedding("học phí")
+        await embed_model.aget_query_embedding("học phí")
+
+    asyncio.run(scenario())
+
+    assert to_thread == []
+    assert stub._calls == ["học phí"]
+
+
+def test_file_is_read_and_written_in_a_thread(stub, to_thread, tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+
+    async def scenario(cache):
+        embed_model = CachedEmbedding(stub, cache=cache)
+        first = await embed_model.aget_query_embedding("học phí")
+        # A hit of the in-memory LRU is served on the loop.
+        second = await embed_model.aget_query_embedding("học phí")
+        return first, second
+
+    cache = EmbeddingCache(max_size=8, path=path)
+    first, second = asyncio.run(scenario(cache))
+    cache.close()
+
+    assert first == second == stub.vector("học phí")
+    assert to_thread == ["load", "persist"]
+
+    # A fresh process reads it back from the file instead of calling the model.
+    to_thread.clear()
+    restarted = EmbeddingCache(max_size=8, path=path)
+    embedding, _ = asyncio.run(scenario(restarted))
+    restarted.close()
+
+    assert embedding == stub.vector("học phí")
+    assert to_thread == ["load"]
+    assert stub._calls == ["học phí"]
+    assert restarted.stats["disk_hits"] == 1
@@ -0,0 +1,65 @@
+"""
+Scheduling decisions of `GateScheduler`.
+"""
+
+import pytest
+
+from src.engines.gate_engine import GateScheduler
+
+GATES = ["language", "prompt_injection", "domain"]
+
+
+def warm_up(scheduler, costs, rejected, runs=3):
+    """
+    Records `runs` checks of every gate with the given costs and outcomes.
+    """
+    for _ in range(runs):
+        for gate in GATES:
+            scheduler.record(gate, costs[gate], rejected[gate])
+
+
+def test_never_runs_the_gates_in_order():
+    assert GateScheduler(GATES, speculation="never").schedule() == ([], GATES)
+
+
+def test_always_starts_every_gate_most_expensive_first():
+    scheduler = GateScheduler(GATES, speculation="always", warmup=3)
+    warm_up(scheduler, {"language": 1, "prompt_injection": 5, "domain": 20},
+            dict.fromkeys(GATES, False))
+
+    assert scheduler.schedule() == (["domain", "prompt_injection", "language"], [])
+
+
+def test_every_gate_starts_during_the_warmup():
+    scheduler = GateScheduler(GATES, warmup=100)
+    warm_up(scheduler, {"language": 1, "prompt_injection": 5, "domain": 20},
+            {"language": True, "prompt_injection": False, "domain": False})
+
+    started, deferred = scheduler.schedule()
+    assert sorted(started) == sorted(GATES) and deferred == []
+
+
+def test_adaptive_defers_a_gate_the_previous_ones_usually_make_useless():
+    scheduler = GateScheduler(GATES, warmup=3)
+    warm_up(scheduler, {"language": 10, "prompt_injection": 1, "domain": 50},
+            {"language": True, "prompt_injection": False, "domain": False})
+
+    started, deferred = scheduler.schedule()
+    assert started == ["language"]
+    assert deferred == ["prompt_injection", "domain"]
+    assert scheduler.stats["domain_rejection_rate"] == pytest.approx(0.0)
+    assert scheduler.stats["language_rejection_rate"] == pytest.approx(1.0)
+
+
+def test_adaptive_starts_gates_that_are_always_needed():
+    scheduler = GateScheduler(GATES, warmup=3)
+    warm_up(scheduler, {"language": 10, "prompt_injection": 1, "domain": 50},
+            dict.fromkeys(GATES, False))
+
+    assert scheduler.schedule() == (["domain", "language", "prompt_injection"], [])
+    assert scheduler.stats["domain_speculative"] == 1
+
+
+def test_unknown_speculation_mode():
+    with pytest.raises(ValueError):
+        GateScheduler(GATES, speculation="sometimes")
@@ -0,0 +1,131 @@
+"""
+Write-through and expiry of the room history cache.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("tiktoken")
+pytest.importorskip("llama_index.core")
+
+import src.repositories.chat_repository as chat_repository  # noqa: E402
+from src.storage.history_cache import HistoryCache  # noqa: E402
+
+
+class FakeChatCollection:
+    """
+    The chat collection, in memory, counting the reads of `get_last_chat`.
+    """
+
+    def __init__(self):
+        self.documents = []
+        self.reads = 0
+
+    def find_all_doc(self):
+        return []
+
+    async def ainsert_one_doc(self, document):
+        self.documents.append(document)
+
+    async def find_with_filter(self, filter_obj, sort_by, limit):
+        self.reads += 1
+        chats = [doc for doc in self.documents if doc["room_id"] == filter_obj["room_id"]]
+        return sorted(chats, key=lambda doc: doc["time"], reverse=True)[:limit]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A controllable `time.monotonic` of the history cache.
+    """
+    now = [1000.0]
+    monkeypatch.setattr("src.storage.history_cache.time.monotonic", lambda: now[0])
+
+    return now
+
+
+def make_repository(monkeypatch, history_cache):
+    """
+    A ChatRepository over the fake collection, writing directly (no batch writer).
+    """
+    monkeypatch.setattr(chat_repository, "CRUDChatCollection", FakeChatCollection)
+    monkeypatch.setattr(chat_repository, "count_tokens", len)
+
+    return chat_repository.ChatRepository(history_cache=history_cache)
+
+
+def fill(cache, room_id, chats):
+    """
+    Fills a room as `get_last_chat` does after reading Mongo.
+    """
+    cache.finish_fill(room_id=room_id, fill_id=cache.begin_fill(room_id), chats=chats)
+
+
+def test_single_process_rooms_do_not_expire(clock):
+    cache = HistoryCache(ttl=None)
+    fill(cache, "room", [{"query": "q1", "answer": "a1"}])
+
+    clock[0] += 3600
+
+    assert cache.get("room") == [{"query": "q1", "answer": "a1"}]
+
+
+def test_rooms_expire_after_the_ttl_when_set(clock):
+    cache = HistoryCache(ttl=30)
+    fill(cache, "room", [{"query": "q1", "answer": "a1"}])
+    cache.set_rendered("room", "history", "q1 a1")
+
+    clock[0] += 29
+    assert cache.get_rendered("room", "history") == "q1 a1"
+    clock[0] += 2
+    assert cache.get("room") is None
+    assert cache.get_rendered("room", "history") is None
+    assert cache.stats["expirations"] == 1
+
+
+def test_append_writes_through_newest_first():
+    cache = HistoryCache(ttl=None, history_length=2)
+    fill(cache, "room", [{"query": "q1", "answer": "a1"}])
+    cache.set_rendered("room", "history", "q1 a1")
+
+    cache.append("room", {"query": "q2", "answer": "a2"})
+    cache.append("room", {"query": "q3", "answer": "a3"})
+
+    assert [chat["query"] for chat in cache.get("room")] == ["q3", "q2"]
+    assert cache.get_rendered("room", "history") is None
+
+
+def test_steady_state_turns_read_mongo_once(monkeypatch, clock):
+    repository = make_repository(monkeypatch, HistoryCache(ttl=None))
+
+    async def conversation():
+        await repository.get_last_chat("room")
+        for turn in range(3):
+            await repository.add_chat_domains("room", f"q{turn}", f"a{turn}", [])
+            # Turns a few minutes apart, far beyond any TTL.
+            clock[0] += 300
+            chats = await repository.get_last_chat("room")
+        return chats
+
+    chats = asyncio.run(conversation())
+
+    assert [chat["query"] for chat in chats] == ["q2", "q1", "q0"]
+    assert repository.collection.reads == 1
+
+
+def test_multi_worker_rooms_are_read_again_after_the_ttl(monkeypatch, clock):
+    repository = make_repository(monkeypatch, HistoryCache(ttl=30))
+
+    async def conversation():
+        await repository.get_last_chat("room")
+        await repository.add_chat_domains("room", "q0", "a0", [])
+        await repository.get_last_chat("room")
+        clock[0] += 31
+        return await repository.get_last_chat("room")
+
+    chats = asyncio.run(conversation())
+
+    assert [chat["query"] for chat in chats] == ["q0"]
+    assert repository.collection.reads == 2
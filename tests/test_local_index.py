@@ -0,0 +1,163 @@
+"""
+Hybrid search, updates and sync of `LocalVectorIndex`.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.schema import (  # noqa: E402
+    NodeRelationship,
+    RelatedNodeInfo,
+    TextNode
+)
+from llama_index.core.vector_stores.utils import node_to_metadata_dict  # noqa: E402
+
+from src.storage.local_index import (  # noqa: E402
+    LocalVectorIndex,
+    normalize_scores,
+    tokenize
+)
+
+
+def make_node(node_id, text, embedding, ref_doc_id=None):
+    """
+    A text node with its embedding, optionally from a source document.
+    """
+    node = TextNode(id_=node_id, text=text, embedding=embedding)
+    if ref_doc_id:
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+
+    return node
+
+
+@pytest.fixture
+def index():
+    """
+    An index where the vector and the BM25 searches disagree on the best node.
+    """
+    index = LocalVectorIndex(candidates=10)
+    index.add([
+        # Closest to the query vector, but none of its words.
+        make_node("vector", "ký túc xá có máy lạnh", [1.0, 0.0, 0.0], "doc-1"),
+        # Every query word, far from the query vector.
+        make_node("keyword", "học phí thạc sĩ học phí", [0.0, 1.0, 0.0], "doc-2"),
+        # Good on both.
+        make_node("both", "học phí đại học", [0.8, 0.6, 0.0], "doc-2"),
+        make_node("neither", "điểm chuẩn năm nay", [0.0, 0.0, 1.0], "doc-3")
+    ])
+
+    return index
+
+
+def node_ids(results):
+    """
+    The IDs of the nodes of a search, in order.
+    """
+    return [node.node_id for node, _ in results]
+
+
+def test_tokenize_keeps_letters_and_digits():
+    assert tokenize("Học phí_2024, K19!") == ["học", "phí", "2024", "k19"]
+
+
+def test_normalize_scores():
+    assert normalize_scores(np.array([1.0, 3.0, 2.0])).tolist() == [0.0, 1.0, 0.5]
+    assert normalize_scores(np.array([2.0, 2.0])).tolist() == [1.0, 1.0]
+
+
+def test_vector_search_only(index):
+    assert node_ids(index.search("học phí", [1.0, 0.0, 0.0], 4, alpha=1.0)) == [
+        "vector", "both", "keyword", "neither"
+    ]
+
+
+def test_bm25_search_only(index):
+    results = index.search("học phí", [1.0, 0.0, 0.0], 4, alpha=0.0)
+
+    # Nodes without any query word are not returned.
+    assert node_ids(results) == ["keyword", "both"]
+    assert results[0][1] == pytest.approx(1.0)
+
+
+def test_hybrid_search_fuses_normalized_scores(index):
+    query, embedding, alpha = "học phí", [1.0, 0.0, 0.0], 0.3
+    ids = ["vector", "keyword", "both", "neither"]
+    similarities, bm25 = index.score_nodes(query, embedding, ids)
+    matched = bm25 > 0
+    expected = alpha * normalize_scores(similarities)
+    expected[matched] += (1 - alpha) * normalize_scores(bm25[matched])
+
+    results = index.search(query, embedding, 4, alpha=alpha)
+
+    assert node_ids(results) == [ids[i] for i in np.argsort(-expected, kind="stable")]
+    assert [score for _, score in results] == pytest.approx(sorted(expected, reverse=True))
+    # The keyword match outweighs the vector match when BM25 weighs more.
+    assert node_ids(results)[0] == "keyword"
+    assert node_ids(index.search(query, embedding, 1, alpha=0.7)) == ["vector"]
+
+
+def test_top_k(index):
+    assert len(index.search("học phí", [1.0, 0.0, 0.0], 2, alpha=0.5)) == 2
+
+
+def test_delete_ref_doc(index):
+    index.delete_ref_doc("doc-2")
+
+    assert len(index) == 2
+    assert node_ids(index.search("học phí", None, 4, alpha=0.0)) == []
+
+
+def test_add_replaces_a_node(index):
+    index.add([make_node("neither", "học phí học phí học phí", [0.0, 0.0, 1.0], "doc-3")])
+
+    assert len(index) == 4
+    assert node_ids(index.search("học phí", None, 1, alpha=0.0)) == ["neither"]
+
+
+def test_nodes_without_embedding_are_skipped():
+    index = LocalVectorIndex()
+    index.add([TextNode(id_="a", text="học phí")])
+
+    assert len(index) == 0
+    assert index.stats["skipped"] == 1
+
+
+def fake_client(nodes):
+    """
+    A client whose collection holds the given nodes, as `WeaviateVectorStore` writes them.
+    """
+    def iterator(include_vector=False, return_properties=None):
+        return [
+            SimpleNamespace(
+                uuid=node.node_id,
+                properties={**node_to_metadata_dict(node), "text": node.text},
+                vector={"default": node.embedding}
+            )
+            for node in nodes
+        ]
+
+    collection = SimpleNamespace(iterator=iterator)
+
+    return SimpleNamespace(collections=SimpleNamespace(get=lambda name: collection))
+
+
+def test_sync_reloads_when_another_process_changed_the_collection():
+    stored = [
+        make_node("a", "học phí", [1.0, 0.0]),
+        make_node("b", "ký túc xá", [0.0, 1.0])
+    ]
+    client = fake_client(stored)
+    index = LocalVectorIndex()
+    index.load_from_weaviate(client, "Knowledge")
+
+    assert index.sync(client, "Knowledge") is False
+
+    stored[1] = make_node("c", "điểm chuẩn", [0.0, 1.0])
+
+    assert index.sync(client, "Knowledge") is True
+    assert node_ids(index.search("điểm chuẩn", None, 2, alpha=0.0)) == ["c"]
+    assert index.stats["reloads"] == 1
@@ -0,0 +1,255 @@
+"""
+Budgeted reranking and the fusion scores of `FusionReranker`.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("torch")
+
+from llama_index.core import Settings  # noqa: E402
+from llama_index.core.base.embeddings.base import BaseEmbedding  # noqa: E402
+from llama_index.core.bridge.pydantic import PrivateAttr  # noqa: E402
+from llama_index.core.schema import (  # noqa: E402
+    NodeWithScore,
+    QueryBundle,
+    TextNode
+)
+
+import src.engines.rerank_engine as rerank_engine  # noqa: E402
+from src.engines.rerank_engine import (  # noqa: E402
+    BudgetedReranker,
+    FusionReranker
+)
+from src.storage.local_index import (  # noqa: E402
+    LocalVectorIndex,
+    normalize_scores
+)
+
+
+class FixedReranker(BudgetedReranker):
+    """
+    Scores each node with a given score, advancing a clock by `cost` per batch.
+    """
+
+    _scores: dict = PrivateAttr()
+    _clock: list = PrivateAttr()
+    _cost: float = PrivateAttr()
+    _batches: list = PrivateAttr()
+
+    def __init__(self, scores, clock=None, cost=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self._scores = scores
+        self._clock = clock
+        self._cost = cost
+        self._batches = []
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FixedReranker"
+
+    def _score(self, query_bundle, nodes):
+        self._batches.append([node.node.node_id for node in nodes])
+        if self._clock is not None:
+            self._clock[0] += self._cost
+        return [self._scores[node.node.node_id] for node in nodes]
+
+
+class CountingEmbedding(BaseEmbedding):
+    """
+    An embedding model counting its query calls.
+    """
+
+    _calls: list = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(model_name="counting", **kwargs)
+        self._calls = []
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CountingEmbedding"
+
+    def _get_query_embedding(self, query):
+        self._calls.append(query)
+        return [1.0, 0.0, 0.0]
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def retrieved(*node_ids, embeddings=None, texts=None):
+    """
+    Retrieved nodes with decreasing retrieval scores.
+    """
+    return [
+        NodeWithScore(
+            node=TextNode(
+                id_=node_id,
+                text=texts[rank] if texts else node_id,
+                embedding=embeddings[rank] if embeddings else None
+            ),
+            score=1.0 - 0.1 * rank
+        )
+        for rank, node_id in enumerate(node_ids)
+    ]
+
+
+def ids(nodes):
+    """
+    The IDs of reranked nodes, in order.
+    """
+    return [node.node.node_id for node in nodes]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A controllable `time.perf_counter` of the rerankers.
+    """
+    now = [100.0]
+    monkeypatch.setattr(rerank_engine.time, "perf_counter", lambda: now[0])
+
+    return now
+
+
+@pytest.fixture
+def embed_model(monkeypatch):
+    """
+    A counting `Settings.embed_model`.
+    """
+    model = CountingEmbedding()
+    monkeypatch.setattr(Settings, "_embed_model", model)
+
+    return model
+
+
+def test_nodes_are_sorted_by_score_and_cut_to_top_n(clock):
+    scores = {"a": 0.1, "b": 0.9, "c": 0.5, "d": 0.7, "e": 0.3}
+    reranker = FixedReranker(scores, top_n=3, batch_size=2, time_budget_ms=1000)
+
+    nodes = reranker.postprocess_nodes(retrieved("a", "b", "c", "d", "e"), query_str="q")
+
+    assert ids(nodes) == ["b", "d", "c"]
+    assert [node.score for node in nodes] == [0.9, 0.7, 0.5]
+    assert reranker._batches == [["a", "b"], ["c", "d"], ["e"]]
+    assert reranker.stats["scored"] == 5
+    assert reranker.stats["over_budget"] == 0
+
+
+def test_budget_stops_between_batches_and_keeps_the_rest_in_order(clock):
+    scores = {"a": 0.1, "b": 0.9, "c": 0.5, "d": 0.7, "e": 0.3, "f": 1.0}
+    reranker = FixedReranker(
+        scores, clock=clock, cost=0.06, top_n=6, batch_size=2, time_budget_ms=100
+    )
+
+    nodes = reranker.postprocess_nodes(retrieved("a", "b", "c", "d", "e", "f"), query_str="q")
+
+    # Two batches take 120 ms: "e" and "f" are not scored and keep their places.
+    assert reranker._batches == [["a", "b"], ["c", "d"]]
+    assert ids(nodes) == ["b", "d", "c", "a", "e", "f"]
+    assert [node.score for node in nodes[4:]] == pytest.approx([0.6, 0.5])
+    assert reranker.stats["scored"] == 4
+    assert reranker.stats["over_budget"] == 1
+
+
+def test_first_batch_is_always_scored(clock):
+    scores = {"a": 0.1, "b": 0.9, "c": 0.5}
+    reranker = FixedReranker(scores, clock=clock, cost=1.0, top_n=2, batch_size=2,
+                             time_budget_ms=0)
+
+    nodes = reranker.postprocess_nodes(retrieved("a", "b", "c"), query_str="q")
+
+    assert reranker._batches == [["a", "b"]]
+    assert ids(nodes) == ["b", "a"]
+
+
+def test_without_a_query_nodes_are_only_cut():
+    reranker = FixedReranker({}, top_n=2)
+
+    assert ids(reranker.postprocess_nodes(retrieved("a", "b", "c"))) == ["a", "b"]
+    assert reranker.stats["calls"] == 0
+
+
+@pytest.fixture
+def local_index():
+    """
+    An index where the vector and the BM25 scores disagree.
+    """
+    index = LocalVectorIndex(candidates=10)
+    index.add([
+        TextNode(id_="vector", text="ký túc xá có máy lạnh", embedding=[1.0, 0.0, 0.0]),
+        TextNode(id_="keyword", text="học phí thạc sĩ học phí", embedding=[0.0, 1.0, 0.0]),
+        TextNode(id_="both", text="học phí đại học", embedding=[0.8, 0.6, 0.0]),
+        TextNode(id_="neither", text="điểm chuẩn năm nay", embedding=[0.0, 0.0, 1.0])
+    ])
+
+    return index
+
+
+def test_fusion_uses_the_statistics_of_the_local_index(local_index, embed_model):
+    reranker = FusionReranker(local_index=local_index, alpha=0.5, top_n=4)
+    query = QueryBundle(query_str="học phí", embedding=[1.0, 0.0, 0.0])
+    node_ids = ["neither", "keyword", "vector", "both"]
+
+    nodes = reranker.postprocess_nodes(retrieved(*node_ids), query_bundle=query)
+
+    similarities, bm25 = local_index.score_nodes("học phí", [1.0, 0.0, 0.0], node_ids)
+    expected = 0.5 * normalize_scores(similarities) + 0.5 * normalize_scores(bm25)
+    assert ids(nodes)[0] == "both"
+    assert {node.node.node_id: node.score for node in nodes} \
+        == pytest.approx(dict(zip(node_ids, expected.tolist())))
+    assert embed_model._calls == []
+
+
+def test_fusion_falls_back_to_the_candidates_for_unknown_nodes(local_index, embed_model):
+    reranker = FusionReranker(local_index=local_index, alpha=1.0, top_n=2)
+    query = QueryBundle(query_str="học phí", embedding=[0.0, 1.0, 0.0])
+    # "new" is not in the local index yet: the node embeddings are used.
+    nodes = retrieved("vector", "new", embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0]])
+
+    assert ids(reranker.postprocess_nodes(nodes, query_bundle=query)) == ["new", "vector"]
+
+
+def test_fusion_with_candidate_statistics(embed_model):
+    reranker = FusionReranker(alpha=0.5, top_n=3)
+    query = QueryBundle(query_str="học phí", embedding=[1.0, 0.0, 0.0])
+    nodes = retrieved(
+        "vector", "keyword", "both",
+        embeddings=[[2.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.8, 0.6, 0.0]],
+        texts=["ký túc xá có máy lạnh", "học phí thạc sĩ học phí", "học phí đại học"]
+    )
+
+    scored = reranker.postprocess_nodes(nodes, query_bundle=query)
+
+    similarities = np.array([1.0, 0.0, 0.8])
+    bm25 = FusionReranker._candidate_bm25("học phí", nodes)
+    expected = 0.5 * normalize_scores(similarities) + 0.5 * normalize_scores(bm25)
+    assert bm25[0] == 0 and bm25[1] > bm25[2] > 0
+    assert ids(scored)[0] == "both"
+    assert {node.node.node_id: node.score for node in scored} \
+        == pytest.approx(dict(zip(["vector", "keyword", "both"], expected.tolist())))
+    assert embed_model._calls == []
+
+
+def test_fusion_without_node_embeddings_uses_the_retrieval_scores(embed_model):
+    reranker = FusionReranker(alpha=1.0, top_n=3)
+    query = QueryBundle(query_str="học phí", embedding=[1.0, 0.0, 0.0])
+
+    nodes = reranker.postprocess_nodes(retrieved("a", "b", "c"), query_bundle=query)
+
+    assert ids(nodes) == ["a", "b", "c"]
+    assert [node.score for node in nodes] == pytest.approx([1.0, 0.5, 0.0])
+
+
+def test_fusion_embeds_a_query_that_was_not_embedded(embed_model):
+    reranker = FusionReranker(alpha=0.5, top_n=2)
+    nodes = retrieved("a", "b", embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    reranker.postprocess_nodes(nodes, query_bundle=QueryBundle(query_str="học phí"))
+
+    assert embed_model._calls == ["học phí"]
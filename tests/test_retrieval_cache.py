@@ -0,0 +1,109 @@
+"""
+Versioning, expiry and eviction of `RetrievalCache`.
+"""
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.schema import (  # noqa: E402
+    NodeWithScore,
+    TextNode
+)
+
+from src.storage.retrieval_cache import RetrievalCache  # noqa: E402
+
+
+def retrieved(*texts):
+    """
+    Retrieved nodes with decreasing scores.
+    """
+    return [
+        NodeWithScore(node=TextNode(id_=text, text=text), score=1.0 - 0.1 * rank)
+        for rank, text in enumerate(texts)
+    ]
+
+
+def test_key_normalizes_the_query():
+    assert RetrievalCache.key("  học   phí ", 10, 0.65) == RetrievalCache.key("học phí", 10, 0.65)
+    assert RetrievalCache.key("học phí", 10, 0.65) != RetrievalCache.key("học phí", 5, 0.65)
+
+
+def test_hit_returns_new_nodes_with_the_stored_scores():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    key = cache.key("học phí", 10, 0.65)
+    cache.put(key, retrieved("a", "b"), cache.version)
+
+    first, second = cache.get(key), cache.get(key)
+
+    assert [(n.node.node_id, n.score) for n in first] == [("a", 1.0), ("b", 0.9)]
+    assert first[0] is not second[0]
+    assert cache.stats["hits"] == 2
+
+
+def test_bump_version_drops_every_result():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    key = cache.key("học phí", 10, 0.65)
+    cache.put(key, retrieved("a"), cache.version)
+
+    cache.bump_version()
+
+    assert cache.get(key) is None
+    assert cache.stats["size"] == 0
+    assert cache.stats["version"] == 1
+
+
+def test_results_of_an_older_version_are_not_stored():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    key = cache.key("học phí", 10, 0.65)
+    version = cache.version
+    # The knowledge base changes while the retrieval is running.
+    cache.bump_version()
+
+    cache.put(key, retrieved("stale"), version)
+
+    assert cache.get(key) is None
+    assert cache.stats["stale_stores"] == 1
+
+
+def test_results_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.storage.retrieval_cache.time.monotonic", lambda: now[0])
+    cache = RetrievalCache(max_size=8, ttl=30)
+    key = cache.key("học phí", 10, 0.65)
+    cache.put(key, retrieved("a"), cache.version)
+
+    now[0] += 29
+    assert cache.get(key) is not None
+    now[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats["expirations"] == 1
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = RetrievalCache(max_size=2, ttl=60)
+    keys = [cache.key(query, 10, 0.65) for query in ("a", "b", "c")]
+    cache.put(keys[0], retrieved("a"), cache.version)
+    cache.put(keys[1], retrieved("b"), cache.version)
+    cache.get(keys[0])
+
+    cache.put(keys[2], retrieved("c"), cache.version)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_entry_keeps_the_query_embedding():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    with_embedding, without = cache.key("học phí", 10, 0.65), cache.key("điểm chuẩn", 10, 0.65)
+    cache.put(with_embedding, retrieved("a"), cache.version, embedding=[0.1, 0.2])
+    cache.put(without, retrieved("b"), cache.version)
+
+    nodes, embedding = cache.get_entry(with_embedding)
+    embedding.append(0.3)
+
+    assert [n.node.node_id for n in nodes] == ["a"]
+    assert cache.get_entry(with_embedding)[1] == [0.1, 0.2]
+    assert cache.get_entry(without)[1] is None
+    assert cache.get_entry(cache.key("tuyển sinh", 10, 0.65)) is None
@@ -0,0 +1,187 @@
+"""
+The cached and reranking wrappers of the hybrid retrievers.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("torch")
+
+from llama_index.core import Settings  # noqa: E402
+from llama_index.core.base.embeddings.base import BaseEmbedding  # noqa: E402
+from llama_index.core.bridge.pydantic import PrivateAttr  # noqa: E402
+from llama_index.core.retrievers import BaseRetriever  # noqa: E402
+from llama_index.core.schema import (  # noqa: E402
+    NodeWithScore,
+    QueryBundle,
+    TextNode
+)
+
+from src.engines.rerank_engine import (  # noqa: E402
+    BudgetedReranker,
+    FusionReranker
+)
+from src.engines.retriever_engine import (  # noqa: E402
+    CachedRetriever,
+    RerankingRetriever
+)
+from src.storage.retrieval_cache import RetrievalCache  # noqa: E402
+
+EMBEDDING = [1.0, 0.0, 0.0]
+
+
+class FixedReranker(BudgetedReranker):
+    """
+    Scores each node with a given score.
+    """
+
+    _scores: dict = PrivateAttr()
+
+    def __init__(self, scores, **kwargs):
+        super().__init__(**kwargs)
+        self._scores = scores
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FixedReranker"
+
+    def _score(self, query_bundle, nodes):
+        return [self._scores[node.node.node_id] for node in nodes]
+
+
+class CountingEmbedding(BaseEmbedding):
+    """
+    An embedding model counting its query calls.
+    """
+
+    _calls: list = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(model_name="counting", **kwargs)
+        self._calls = []
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CountingEmbedding"
+
+    def _get_query_embedding(self, query):
+        self._calls.append(query)
+        return list(EMBEDDING)
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text):
+        return list(EMBEDDING)
+
+
+class StubRetriever(BaseRetriever):
+    """
+    Retrieves fixed nodes and, like the vector retrievers, embeds the query
+    on the bundle.
+    """
+
+    def __init__(self, nodes, embed=True):
+        super().__init__()
+        self.nodes = nodes
+        self.embed = embed
+        self.calls = 0
+
+    def _retrieve(self, query_bundle):
+        self.calls += 1
+        if self.embed and query_bundle.embedding is None:
+            query_bundle.embedding = list(EMBEDDING)
+        return [NodeWithScore(node=node.node, score=node.score) for node in self.nodes]
+
+    async def _aretrieve(self, query_bundle):
+        return self._retrieve(query_bundle)
+
+
+def nodes():
+    """
+    Retrieved nodes: the embedding of "b" is the closest to the query's.
+    """
+    return [
+        NodeWithScore(node=TextNode(id_="a", text="a", embedding=[0.0, 1.0, 0.0]), score=0.9),
+        NodeWithScore(node=TextNode(id_="b", text="b", embedding=[1.0, 0.0, 0.0]), score=0.8),
+        NodeWithScore(node=TextNode(id_="c", text="c", embedding=[0.6, 0.8, 0.0]), score=0.7)
+    ]
+
+
+def ids(nodes):
+    """
+    The IDs of retrieved nodes, in order.
+    """
+    return [node.node.node_id for node in nodes]
+
+
+@pytest.fixture
+def embed_model(monkeypatch):
+    """
+    A counting `Settings.embed_model`.
+    """
+    model = CountingEmbedding()
+    monkeypatch.setattr(Settings, "_embed_model", model)
+
+    return model
+
+
+def cached(retriever, cache):
+    """
+    The retriever behind a retrieval cache.
+    """
+    return CachedRetriever(retriever=retriever, cache=cache, similarity_top_k=10, alpha=0.65)
+
+
+def test_reranking_retriever_reranks_the_retrieved_nodes():
+    reranker = FixedReranker({"a": 0.1, "b": 0.9, "c": 0.5}, top_n=2)
+    retriever = RerankingRetriever(retriever=StubRetriever(nodes()), reranker=reranker)
+
+    assert ids(retriever.retrieve("học phí")) == ["b", "c"]
+    assert ids(asyncio.run(retriever.aretrieve("học phí"))) == ["b", "c"]
+    assert reranker.stats["calls"] == 2
+
+
+def test_cache_hit_gives_back_the_query_embedding():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    stub = StubRetriever(nodes())
+    retriever = cached(stub, cache)
+
+    retriever.retrieve("học phí")
+    query = QueryBundle(query_str="học phí")
+    hit = retriever.retrieve(query)
+
+    assert stub.calls == 1
+    assert ids(hit) == ["a", "b", "c"]
+    assert query.embedding == EMBEDDING
+
+
+def test_cache_hit_without_embedding_leaves_the_query_alone():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    retriever = cached(StubRetriever(nodes(), embed=False), cache)
+
+    retriever.retrieve("học phí")
+    query = QueryBundle(query_str="học phí")
+    retriever.retrieve(query)
+
+    assert query.embedding is None
+
+
+def test_fusion_does_not_embed_on_a_cache_hit(embed_model):
+    cache = RetrievalCache(max_size=8, ttl=60)
+    stub = StubRetriever(nodes())
+    retriever = RerankingRetriever(
+        retriever=cached(stub, cache),
+        reranker=FusionReranker(alpha=1.0, top_n=2)
+    )
+
+    async def retrieve_twice():
+        return await retriever.aretrieve("học phí"), await retriever.aretrieve("học phí")
+
+    miss, hit = asyncio.run(retrieve_twice())
+
+    assert stub.calls == 1
+    assert ids(miss) == ids(hit) == ["b", "c"]
+    assert embed_model._calls == []
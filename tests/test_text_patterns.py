@@ -0,0 +1,352 @@
+"""
+Parity of the text preprocessing of `PreprocessQuestion` with the original
+regex and SequenceMatcher loops, kept below as the reference.
+"""
+
+import os
+import re
+from difflib import SequenceMatcher
+
+import pytest
+
+import scripts.check_preprocess_parity as parity
+from src.prompt.preprocessing_prompt import (
+    FILLTER_WORDS,
+    RESPONSE_DICT,
+    SHORT_CHAT,
+    TERMS_DICT
+)
+from src.utils.text_patterns import (
+    FillerWordRemover,
+    ShortChatMatcher,
+    SynonymMatcher
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_EMOJI_PATTERN = re.compile(
+    "["
+    u"\U0001F600-\U0001F64F"
+    u"\U0001F300-\U0001F5FF"
+    u"\U0001F680-\U0001F6FF"
+    u"\U0001F700-\U0001F77F"
+    u"\U0001F780-\U0001F7FF"
+    u"\U0001F800-\U0001F8FF"
+    u"\U0001F900-\U0001F9FF"
+    u"\U0001FA00-\U0001FA6F"
+    u"\U0001FA70-\U0001FAFF"
+    u"\U00002702-\U000027B0"
+    u"\U000024C2-\U0001F251"
+    "]+",
+    flags=re.UNICODE
+)
+LEGACY_VIETNAMESE_CHARACTERS = r"[0-9a-zA-ZaăâbcdđeêghiklmnoôơpqrstuưvxyàằầbcdđèềghìklmnòồờpqrstùừvxỳáắấbcdđéếghíklmnóốớpqrstúứvxýảẳẩbcdđẻểghỉklmnỏổởpqrstủửvxỷạặậbcdđẹệghịklmnọộợpqrstụựvxỵãẵẫbcdđẽễghĩklmnõỗỡpqrstũữvxỹAĂÂBCDĐEÊGHIKLMNOÔƠPQRSTUƯVXYÀẰẦBCDĐÈỀGHÌKLMNÒỒỜPQRSTÙỪVXỲÁẮẤBCDĐÉẾGHÍKLMNÓỐỚPQRSTÚỨVXÝẠẶẬBCDĐẸỆGHỊKLMNỌỘỢPQRSTỤỰVXỴẢẲẨBCDĐẺỂGHỈKLMNỎỔỞPQRSTỦỬVXỶÃẴẪBCDĐẼỄGHĨKLMNÕỖỠPQRSTŨỮVXỸ,._]"
+LEGACY_SYMBOLS = {
+    ">": " lớn hơn ",
+    "<": " bé hơn ",
+    "=": " bằng ",
+    "$": " ",
+    "#": " ",
+    "^": " ",
+    "/": " ",
+    "!": " "
+}
+
+
+def legacy_replace_synonyms(text, synonym_dict):
+    """
+    The original `PreprocessQuestion.replace_synonyms`.
+    """
+    text = text.lower()
+
+    for keyword, synonyms in synonym_dict.items():
+        keyword = keyword.lower()
+        for synonym in synonyms:
+            synonym = synonym.strip().lower()
+            text = re.sub(r'\b{}\b'.format(re.escape(synonym)), keyword, text)
+
+    return text
+
+
+def legacy_remove_filler_words(text, filler_words):
+    """
+    The original `PreprocessQuestion.remove_filler_words`.
+    """
+    text = text.lower()
+
+    for word in filler_words:
+        pattern = r'\b{}\b'.format(re.escape(word.strip().lower()))
+        text = re.sub(pattern, '', text)
+
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def legacy_delete_non_vietnamese_characters(text):
+    """
+    The original `PreprocessQuestion.delete_non_vietnamese_characters`.
+    """
+    return re.sub(rf'[^{LEGACY_VIETNAMESE_CHARACTERS}\s]', '', text).strip()
+
+
+def legacy_replace_symbols(text):
+    """
+    The original `PreprocessQuestion.replace_symbols`.
+    """
+    for symbol, replacement in LEGACY_SYMBOLS.items():
+        text = text.replace(symbol, replacement)
+
+    return " ".join(text.split())
+
+
+def legacy_normalize_elonge_word(text):
+    """
+    The original `PreprocessQuestion.normalize_elonge_word`.
+    """
+    s_new = []
+
+    for word in text.split(' '):
+        word_new = ''
+        prev_char = ''
+        for char in word:
+            if char.isdigit() or char != prev_char:
+                word_new += char
+                prev_char = char
+        s_new.append(word_new)
+
+    return ' '.join(s_new)
+
+
+def legacy_clean_text(text, term_dict):
+    """
+    The original `PreprocessQuestion.clean_text`, made of the original steps.
+    """
+    text = re.sub(r'\s+', ' ', text)
+    text = legacy_delete_non_vietnamese_characters(text.lower())
+    text = legacy_remove_filler_words(text, FILLTER_WORDS)
+    text = LEGACY_EMOJI_PATTERN.sub(r'', text)
+    text = legacy_replace_synonyms(text, term_dict)
+    text = legacy_replace_symbols(text)
+
+    return legacy_normalize_elonge_word(text)
+
+
+def legacy_get_response(input_text, short_chats, response_dict, threshold=0.9):
+    """
+    The original `PreprocessQuestion.get_response`.
+    """
+    input_text = input_text.lower().strip()
+    best_match = None
+    best_ratio = 0.0
+
+    for chat in short_chats:
+        ratio = SequenceMatcher(None, input_text, chat).ratio()
+        if ratio > best_ratio and ratio >= threshold:
+            best_ratio = ratio
+            best_match = chat
+
+    if best_match and best_match in response_dict:
+        return response_dict[best_match]
+
+    return "Mình chưa hiểu rõ ý bạn lắm."
+
+
+def legacy_detect_short_chat(text_input):
+    """
+    The original `PreprocessQuestion.detect_short_chat`, which only told whether
+    the text is a short chat; the backend then called `get_response`.
+    """
+    normalized_text = text_input.lower().strip()
+    has_emoji = bool(LEGACY_EMOJI_PATTERN.search(normalized_text))
+    matches_pattern = any(SequenceMatcher(None, normalized_text, pattern).ratio() >= 0.85
+                          for pattern in SHORT_CHAT)
+
+    if has_emoji:
+        is_short_chat = matches_pattern or normalized_text == ''
+    else:
+        is_short_chat = matches_pattern
+
+    return legacy_get_response(text_input, SHORT_CHAT, RESPONSE_DICT) if is_short_chat else None
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    """
+    The sample queries and a few hundred synthetic queries; the handbook lines
+    are left to `scripts.check_preprocess_parity`, the legacy loops are slow on them.
+    """
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(parity, "HANDBOOKS", "")
+
+    return parity.load_corpus(synthetic=300, seed=0)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    """
+    A `PreprocessQuestion` without models; the text steps do not use them.
+    """
+    preprocess_engine = pytest.importorskip("src.engines.preprocess_engine")
+
+    return preprocess_engine.PreprocessQuestion(
+        domain_clf_model=None,
+        lang_detect_model=None,
+        tonemark_model=None,
+        tonemark_tokenizer=None,
+        prompt_injection_model=None,
+        device_type="cpu",
+        label_list=[],
+        batching=False
+    )
+
+
+def test_clean_text_matches_legacy_steps(corpus, engine):
+    for text in corpus:
+        assert engine.clean_text(text, TERMS_DICT) == legacy_clean_text(text, TERMS_DICT), text
+
+
+def test_detect_short_chat_matches_legacy_scan(corpus, engine):
+    for text in corpus + ["xin chào 😀", "😀", "cảm ơn ạ 👍🏻"]:
+        assert engine.detect_short_chat(text) == legacy_detect_short_chat(text), text
+
+
+def test_get_response_matches_legacy_scan(corpus, engine):
+    for text in corpus:
+        assert engine.get_response(text, SHORT_CHAT, RESPONSE_DICT) \
+            == legacy_get_response(text, SHORT_CHAT, RESPONSE_DICT), text
+
+
+def test_replace_synonyms_matches_legacy_loop(corpus, engine):
+    # Another dictionary than TERMS_DICT gets its own matcher.
+    terms = {"khoa học máy tính": ["khmt", "cs"], "ký túc xá": ["ktx"]}
+
+    for text in corpus:
+        assert engine.replace_synonyms(text, TERMS_DICT) \
+            == legacy_replace_synonyms(text, TERMS_DICT), text
+        assert engine.replace_synonyms(text, terms) == legacy_replace_synonyms(text, terms), text
+
+
+def test_synonym_matcher_replaces_whole_words_only():
+    matcher = SynonymMatcher({"khoa học máy tính": ["khmt"], "công nghệ thông tin": ["cntt"]})
+
+    assert matcher.replace("ngành khmt và cntt") == "ngành khoa học máy tính và công nghệ thông tin"
+    assert matcher.replace("khmtx cntt2") == "khmtx cntt2"
+
+
+def test_get_response_matches_legacy_scan_on_other_chats(corpus, engine):
+    # Other short chats than SHORT_CHAT get their own matcher.
+    chats = ["chào bạn", "cảm ơn nhé", "tạm biệt", "ok"]
+    responses = {"chào bạn": "chào", "tạm biệt": "bye"}
+
+    for text in corpus + chats + ["chao ban", "cam on nhe", "tam biet ban"]:
+        for threshold in (0.85, 0.9):
+            assert engine.get_response(text, chats, responses, threshold) \
+                == legacy_get_response(text, chats, responses, threshold), text
+
+
+def test_detect_short_chat_scans_once(engine, monkeypatch):
+    calls = []
+    match = engine._short_chat_matcher.match
+    monkeypatch.setattr(
+        engine._short_chat_matcher, "match",
+        lambda *args, **kwargs: calls.append(args) or match(*args, **kwargs)
+    )
+
+    assert engine.detect_short_chat("xin chào") == legacy_detect_short_chat("xin chào")
+    assert engine.detect_short_chat("học phí bao nhiêu") is None
+    assert len(calls) == 2
+
+
+def test_short_chat_matcher_threshold():
+    matcher = ShortChatMatcher(["xin chào"])
+
+    assert matcher.match("xin chào", threshold=0.85) == ("xin chào", 1.0)
+    assert matcher.match("học phí bao nhiêu", threshold=0.85)[0] is None
+
+
+def remove_filler_words(remover, text):
+    """
+    `FillerWordRemover.remove` as `PreprocessQuestion.remove_filler_words` applies it.
+    """
+    return " ".join(remover.remove(text.lower()).split())
+
+
+def test_filler_word_remover_single_pattern(corpus):
+    remover = FillerWordRemover(FILLTER_WORDS)
+
+    assert remover.pattern is not None
+    for text in corpus:
+        assert remove_filler_words(remover, text) \
+            == legacy_remove_filler_words(text, FILLTER_WORDS), text
+
+
+def test_filler_word_remover_drops_words_containing_earlier_ones():
+    words = ["ạ", "dạ ạ", "nhé"]
+    remover = FillerWordRemover(words)
+
+    assert remover.pattern.pattern == r"\b(?:ạ|nhé)\b"
+    for text in ["dạ ạ em hỏi nhé", "dạ ạ", "ạ ạ nhé nhé"]:
+        assert remove_filler_words(remover, text) == legacy_remove_filler_words(text, words)
+
+
+@pytest.mark.parametrize("words", [
+    # "em" ends the first word and starts the second.
+    ["em hỏi", "cho em"],
+    ["cho em", "em hỏi", "hỏi"],
+    # Not only word characters.
+    ["ok!", "ạ"],
+    ["ạ", "c++"]
+])
+def test_filler_word_remover_falls_back_to_one_pattern_per_word(corpus, words):
+    remover = FillerWordRemover(words)
+
+    assert remover.pattern is None
+    for text in corpus + ["cho em hỏi", "cho em em hỏi ạ", "ok! ạ", "c++ ạ ok!"]:
+        assert remove_filler_words(remover, text) == legacy_remove_filler_words(text, words), text
+
+
+def test_filler_word_remover_overlap_removes_in_list_order():
+    # A single alternation would remove "cho em", the leftmost match.
+    assert FillerWordRemover(["em hỏi", "cho em"]).remove("cho em hỏi") == "cho "
+
+
+class ForbiddenPattern:
+    """
+    Stands for a compiled pattern that must not be run.
+    """
+
+    def sub(self, *args):
+        raise AssertionError("the pattern ran on a text without ']'")
+
+
+@pytest.mark.parametrize("text", [
+    "  học phí ngành khmt 2024?  ",
+    "điểm chuẩn 😀 > 25 #uit @ [x)",
+    "ký túc xá (ktx) có máy lạnh không ạ!",
+    "\tcảm ơn ạ 👍🏻\n",
+    ""
+])
+def test_delete_non_vietnamese_characters_without_bracket(engine, monkeypatch, text):
+    # The original class only matches before a "]", so the text is only stripped.
+    monkeypatch.setattr(
+        "src.engines.preprocess_engine.NON_VIETNAMESE_PATTERN", ForbiddenPattern()
+    )
+
+    assert engine.delete_non_vietnamese_characters(text) == text.strip()
+    assert legacy_delete_non_vietnamese_characters(text) == text.strip()
+
+
+@pytest.mark.parametrize("text", [
+    "học phí @ ] bao nhiêu",
+    "điểm chuẩn 😀 ] năm 2024",
+    "[ktx] có máy lạnh không]",
+    "@\t]$\n]",
+    "  ]  "
+])
+def test_delete_non_vietnamese_characters_with_bracket(engine, text):
+    assert engine.delete_non_vietnamese_characters(text) \
+        == legacy_delete_non_vietnamese_characters(text), text
+
+
+def test_delete_non_vietnamese_characters_matches_legacy(corpus, engine):
+    for text in corpus:
+        assert engine.delete_non_vietnamese_characters(text) \
+            == legacy_delete_non_vietnamese_characters(text), text
@@ -0,0 +1,66 @@
+"""
+Choice of the nodes that fit in a context by `pack`.
+"""
+
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip("tiktoken")
+pytest.importorskip("llama_index.core")
+
+from src.utils.token_budget import pack  # noqa: E402
+
+
+def best_total(token_counts, scores, max_tokens):
+    """
+    The highest total score of a subset that fits, by enumerating every subset.
+    """
+    best = 0.0
+    for size in range(len(token_counts) + 1):
+        for subset in itertools.combinations(range(len(token_counts)), size):
+            if sum(token_counts[i] for i in subset) <= max_tokens:
+                best = max(best, sum(max(scores[i], 0.0) for i in subset))
+
+    return best
+
+
+def test_greedy_stops_at_the_first_node_that_does_not_fit():
+    assert pack([300, 500, 100, 50], [0.9, 0.8, 0.7, 0.6], 700, packing="greedy") == [0]
+    assert pack([300, 300, 100], [0.9, 0.8, 0.7], 700, packing="greedy") == [0, 1, 2]
+    assert pack([800], [0.9], 700, packing="greedy") == []
+
+
+def test_knapsack_skips_a_node_that_does_not_fit():
+    assert pack([300, 500, 100, 50], [0.9, 0.8, 0.7, 0.6], 700, packing="knapsack") == [0, 2, 3]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_knapsack_is_optimal(seed):
+    rng = random.Random(seed)
+    count = rng.randint(1, 9)
+    token_counts = [rng.randint(1, 400) for _ in range(count)]
+    scores = [rng.uniform(-0.2, 1.0) for _ in range(count)]
+    max_tokens = rng.randint(0, 1200)
+
+    chosen = pack(token_counts, scores, max_tokens, packing="knapsack")
+
+    assert chosen == sorted(chosen)
+    assert sum(token_counts[i] for i in chosen) <= max_tokens
+    assert sum(max(scores[i], 0.0) for i in chosen) == pytest.approx(
+        best_total(token_counts, scores, max_tokens), abs=1e-6
+    )
+
+
+def test_knapsack_without_scores_prefers_the_first_ranks():
+    assert pack([100, 100, 100], [None, None, None], 200, packing="knapsack") == [0, 1]
+
+
+def test_knapsack_fills_the_budget_with_nodes_worth_nothing():
+    assert pack([100, 100], [-3.0, -5.0], 200, packing="knapsack") == [0, 1]
+
+
+def test_unknown_packing():
+    with pytest.raises(ValueError):
+        pack([1], [1.0], 10, packing="fifo")